@@ -0,0 +1,577 @@
+'''
+Asyncio engine core that hosts many concurrent matches against subprocess bots in one process.
+
+Game rules, logging and response decoding are shared with engine.py. Bot
+sockets, bot stdout and the game clocks are all driven by one event loop. Each
+response is stamped with the time the kernel received it, so a bot is charged
+only for the time between our write and its reply, never for time the loop
+spends serving other matches before it reads the reply.
+
+With --multitable, every bot whose commands.json lists "multitable" under
+"protocol" is started once and plays all of its matches over one connection.
+Each message to it starts with a G clause naming the table (one seat of one
+match), its responses carry the same tag, and a tagged Q closes a table. A
+multi-table bot answers tables in the order their messages arrive, so a
+table is charged only from the moment the bot finished its previous reply.
+
+Usage: python async_engine.py BOT [BOT ...] [--challenger BOT] [--seeds N] [--concurrency N] [--multitable]
+'''
+import argparse
+import asyncio
+import os
+import socket
+import struct
+import time
+
+from build_cache import is_built, snapshot, mark_built, build_env, lock_build, unlock_build, launcher_missing
+from config import BUILD_TIMEOUT, CONNECT_TIMEOUT, GAME_LOG_FILENAME
+from deals import DealSchedule
+from engine import (Player, Game, OutputCapture, RoundState, TerminalState, CheckAction, FoldAction, STATUS,
+                    LAUNCHER_MISSING, config_env, default_config)
+from latency import write_latency_report
+from tournament import MatchResult, bot_name, schedule, summarize
+
+# one lock per bot directory, held by the match on this loop that is building it
+BUILD_LOCKS = {}
+# Linux's socket option for receive timestamps, which the socket module does not name
+SO_TIMESTAMPNS = getattr(socket, 'SO_TIMESTAMPNS', 35)
+TIMESTAMP_SPACE = socket.CMSG_SPACE(struct.calcsize('qq'))
+
+
+class BotProtocol():
+    '''
+    Collects newline-terminated responses from one pokerbot's socket, stamped with their arrival time.
+    The kernel stamps every read with the time its bytes arrived; without such stamps, the read time is used.
+    '''
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.loop = asyncio.get_running_loop()
+        self.buffer = b''
+        self.outgoing = b''
+        self.closed = False
+        self.responses = asyncio.Queue()
+        self.last_arrival_time = 0.
+        sock.setblocking(False)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+        except OSError:
+            pass
+        self.loop.add_reader(sock.fileno(), self.read_ready)
+
+    def read_ready(self):
+        '''
+        Reads what the pokerbot has sent, dating it back to its arrival by the kernel's timestamp.
+        '''
+        try:
+            data, ancillary, _, _ = self.sock.recvmsg(65536, TIMESTAMP_SPACE)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data, ancillary = b'', []
+        if not data:
+            self.close()
+            self.connection_lost()
+            return
+        read_time = time.perf_counter()
+        arrival_time = read_time
+        for level, kind, value in ancillary:
+            if level == socket.SOL_SOCKET and kind == SO_TIMESTAMPNS:
+                seconds, nanoseconds = struct.unpack('qq', value[:struct.calcsize('qq')])
+                arrival_time = read_time - max(0., time.time() - seconds - nanoseconds / 1e9)
+        self.data_received(data, arrival_time)
+
+    def write(self, data):
+        '''
+        Sends bytes to the pokerbot, holding back whatever the socket cannot take yet.
+        '''
+        if self.closed:
+            return
+        if not self.outgoing:
+            try:
+                data = data[self.sock.send(data):]
+            except (BlockingIOError, InterruptedError):
+                pass
+            except OSError:
+                return
+            if data:
+                self.loop.add_writer(self.sock.fileno(), self.write_ready)
+        self.outgoing += data
+
+    def write_ready(self):
+        '''
+        Sends held back bytes once the socket can take them.
+        '''
+        try:
+            self.outgoing = self.outgoing[self.sock.send(self.outgoing):]
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            self.outgoing = b''
+        if not self.outgoing:
+            self.loop.remove_writer(self.sock.fileno())
+
+    def close(self):
+        '''
+        Sends any held back bytes and closes the socket.
+        '''
+        if self.closed:
+            return
+        self.closed = True
+        self.loop.remove_reader(self.sock.fileno())
+        if self.outgoing:
+            self.loop.remove_writer(self.sock.fileno())
+            try:
+                self.sock.settimeout(CONNECT_TIMEOUT)
+                self.sock.sendall(self.outgoing)
+            except OSError:
+                pass
+        self.sock.close()
+
+    def data_received(self, data, arrival_time):
+        '''
+        Splits the received bytes into responses.
+        '''
+        self.buffer += data
+        while b'\n' in self.buffer:
+            line, self.buffer = self.buffer.split(b'\n', 1)
+            # the pokerbot was busy with our earlier messages until its previous reply arrived
+            self.handle_line(line.decode(errors='replace').strip(), arrival_time, self.last_arrival_time)
+            self.last_arrival_time = arrival_time
+
+    def handle_line(self, line, arrival_time, ready_time):
+        '''
+        Queues one response together with its arrival time and the time the pokerbot became free.
+        '''
+        self.responses.put_nowait((line, arrival_time, ready_time))
+
+    def connection_lost(self):
+        '''
+        Queues None as the response to any query waiting on the closed connection.
+        '''
+        self.responses.put_nowait((None, time.perf_counter(), 0.))
+
+
+class TableProtocol(BotProtocol):
+    '''
+    Routes the tagged responses of a multi-table pokerbot to the queue of their table.
+    '''
+
+    def __init__(self, sock):
+        super().__init__(sock)
+        self.tables = {}
+
+    def handle_line(self, line, arrival_time, ready_time):
+        tag, _, clause = line.partition(' ')
+        if tag in self.tables:
+            self.tables[tag].put_nowait((clause, arrival_time, ready_time))
+
+    def connection_lost(self):
+        for responses in self.tables.values():
+            responses.put_nowait((None, time.perf_counter(), 0.))
+
+
+class AsyncPlayer(Player):
+    '''
+    Handles subprocess and socket interactions with one player's pokerbot on the event loop.
+    '''
+    protocol_class = BotProtocol
+
+    def __init__(self, name, path, log_dir, config=None):
+        super().__init__(name, path, config)
+        self.log_dir = log_dir
+        self.output = OutputCapture(os.path.join(log_dir, name + '.txt'))
+        self.protocol = None
+        self.responses = None
+        self.capture_task = None
+
+    async def capture_output(self, stream):
+        '''
+        Pumps the pokerbot's stdout into its output capture without blocking the loop.
+        '''
+        while True:
+            data = await stream.read(65536)
+            if not data:
+                break
+            self.output.put(data)
+
+    async def build(self):
+        '''
+        Loads the commands file and builds the pokerbot, unless its sources are unchanged since its last build.
+        '''
+        self.load_commands()
+        if self.commands is not None and len(self.commands['build']) > 0:
+            # matches on this loop take turns through an asyncio lock, so the blocking file lock never stalls it
+            async with BUILD_LOCKS.setdefault(self.path, asyncio.Lock()):
+                handle = await asyncio.get_running_loop().run_in_executor(None, lock_build, self.path)
+                try:
+                    await self.build_locked()
+                finally:
+                    unlock_build(handle)
+
+    async def build_locked(self):
+        '''
+        Builds the pokerbot while holding its build lock, unless its sources are unchanged since its last build.
+        '''
+        digest = self.build_digest()
+        if digest is not None and is_built(self.path, digest):
+            print(self.name, 'build is up to date')
+            return
+        before = snapshot(self.path) if digest is not None else None
+        try:
+            proc = await asyncio.create_subprocess_exec(*self.commands['build'],
+                                                        stdout=asyncio.subprocess.PIPE,
+                                                        stderr=asyncio.subprocess.STDOUT,
+                                                        cwd=self.path, env=build_env(self.path))
+            try:
+                outs, _ = await asyncio.wait_for(proc.communicate(), BUILD_TIMEOUT)
+                self.output.put(outs)
+                if digest is not None and proc.returncode == 0:
+                    mark_built(self.path, digest, before)
+                if launcher_missing(self.path):
+                    print(self.name, LAUNCHER_MISSING)
+            except asyncio.TimeoutError:
+                error_message = 'Timed out waiting for ' + self.name + ' to build'
+                print(error_message)
+                proc.kill()
+                await proc.wait()
+                self.output.put(error_message.encode())
+        except (TypeError, ValueError):
+            print(self.name, 'build command misformatted')
+        except OSError:
+            print(self.name, 'build failed - check "build" in commands.json')
+
+    async def run(self):
+        '''
+        Runs the pokerbot and waits for its socket connection.
+        '''
+        if self.commands is not None and len(self.commands['run']) > 0:
+            loop = asyncio.get_running_loop()
+            try:
+                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server_socket:
+                    server_socket.bind(('', 0))
+                    server_socket.listen()
+                    server_socket.setblocking(False)
+                    port = server_socket.getsockname()[1]
+                    proc = await asyncio.create_subprocess_exec(*self.commands['run'], str(port),
+                                                                stdout=asyncio.subprocess.PIPE,
+                                                                stderr=asyncio.subprocess.STDOUT,
+                                                                cwd=self.path,
+                                                                env=dict(os.environ, **config_env(self.config)))
+                    self.bot_subprocess = proc
+                    self.capture_task = asyncio.create_task(self.capture_output(proc.stdout))
+                    client_socket, _ = await asyncio.wait_for(loop.sock_accept(server_socket), CONNECT_TIMEOUT)
+                self.protocol = self.protocol_class(client_socket)
+                self.responses = self.protocol.responses
+                print(self.name, 'connected successfully')
+            except (TypeError, ValueError):
+                print(self.name, 'run command misformatted')
+            except OSError:
+                print(self.name, 'run failed - check "run" in commands.json')
+            except asyncio.TimeoutError:
+                print('Timed out waiting for', self.name, 'to connect')
+
+    async def stop(self):
+        '''
+        Closes the socket connection and stops the pokerbot.
+        '''
+        if self.protocol is not None:
+            self.send(' '.join(self.pending_clauses + ['Q']) + '\n')
+            self.protocol.close()
+        if self.bot_subprocess is not None:
+            try:
+                await asyncio.wait_for(self.bot_subprocess.wait(), CONNECT_TIMEOUT)
+            except asyncio.TimeoutError:
+                print('Timed out waiting for', self.name, 'to quit')
+                self.bot_subprocess.kill()
+                await self.bot_subprocess.wait()
+            await self.capture_task
+        self.close_output()
+
+    def send(self, message):
+        '''
+        Writes one message to the pokerbot.
+        '''
+        self.protocol.write(message.encode())
+
+    def response_timeout(self):
+        '''
+        Returns how long to wait for one response.
+        '''
+        return min(self.game_clock, CONNECT_TIMEOUT) if self.config.enforce_game_clock else CONNECT_TIMEOUT
+
+    async def query(self, round_state, player_message, game_log):
+        '''
+        Requests one action from the pokerbot over the socket connection.
+        At the end of the round, we request a CheckAction from the pokerbot.
+        '''
+        legal_actions = round_state.legal_actions() if isinstance(round_state, RoundState) else {CheckAction}
+        if self.protocol is not None and self.game_clock > 0.:
+            player_message[0] = 'T{:.3f}'.format(self.game_clock)
+            message = ' '.join(player_message) + '\n'
+            del player_message[1:]  # do not send redundant action history
+            timeout = self.response_timeout()
+            start_time = time.perf_counter()
+            self.send(message)
+            try:
+                clause, end_time, ready_time = await asyncio.wait_for(self.responses.get(), timeout)
+            except asyncio.TimeoutError:
+                clause, end_time, ready_time = '', None, None
+            if clause is None:
+                error_message = self.name + ' disconnected'
+                game_log.append(error_message)
+                print(error_message)
+                self.game_clock = 0.
+                self.protocol = None
+                return CheckAction() if CheckAction in legal_actions else FoldAction()
+            if end_time is None:
+                self.game_clock = 0.
+            else:
+                # the kernel's clock and ours may disagree by microseconds
+                elapsed = max(0., end_time - max(start_time, ready_time))
+                self.record_latency(round_state, legal_actions, clause, elapsed)
+                if self.config.enforce_game_clock:
+                    self.game_clock -= elapsed
+            if self.game_clock <= 0.:
+                error_message = self.name + ' ran out of time'
+                game_log.append(error_message)
+                print(error_message)
+                self.game_clock = 0.
+            else:
+                action = self.decode(clause, round_state, legal_actions, game_log)
+                if action is not None:
+                    return action
+        return CheckAction() if CheckAction in legal_actions else FoldAction()
+
+
+class SharedBot(AsyncPlayer):
+    '''
+    One warm multi-table pokerbot process whose connection is shared by many TablePlayers.
+    It is launched with the game parameters of config.py, and only hosts matches that use them.
+    '''
+    protocol_class = TableProtocol
+
+    def __init__(self, path, log_dir):
+        super().__init__(bot_name(path), path, log_dir)
+        self.next_table = 0
+
+    def open_table(self):
+        '''
+        Allocates a new table tag and the queue its responses are routed to.
+        '''
+        tag = 'G' + str(self.next_table)
+        self.next_table += 1
+        self.protocol.tables[tag] = asyncio.Queue()
+        return tag, self.protocol.tables[tag]
+
+    def close_table(self, tag, pending_clauses=[]):
+        '''
+        Ends the game at one table, after delivering any clauses still pending there.
+        '''
+        if self.protocol is not None and tag in self.protocol.tables:
+            del self.protocol.tables[tag]
+            self.protocol.write(' '.join([tag] + pending_clauses + ['Q\n']).encode())
+
+
+class TablePlayer(AsyncPlayer):
+    '''
+    Plays one seat of one match through a table of a SharedBot.
+    '''
+
+    def __init__(self, name, shared_bot, log_dir, config=None):
+        super().__init__(name, shared_bot.path, log_dir, config)
+        self.shared_bot = shared_bot
+        self.tag = None
+
+    async def build(self):
+        '''
+        The shared pokerbot is built once, before any of its tables open.
+        '''
+
+    async def run(self):
+        '''
+        Opens a table on the shared pokerbot.
+        '''
+        if self.shared_bot.protocol is not None:
+            self.commands = self.shared_bot.commands
+            self.protocol = self.shared_bot.protocol
+            self.tag, self.responses = self.shared_bot.open_table()
+
+    async def stop(self):
+        '''
+        Closes the table. The shared pokerbot's output is logged when it stops.
+        '''
+        if self.tag is not None:
+            self.shared_bot.close_table(self.tag, self.pending_clauses)
+
+    def send(self, message):
+        '''
+        Writes one message to the shared pokerbot, tagged with our table.
+        '''
+        self.protocol.write((self.tag + ' ' + message).encode())
+
+    def response_timeout(self):
+        '''
+        Returns how long to wait for one response: the player's own allowance, after the other tables queued ahead of ours.
+        '''
+        return CONNECT_TIMEOUT * (len(self.protocol.tables) - 1) + super().response_timeout()
+
+
+class AsyncGame(Game):
+    '''
+    Manages logging and the high-level game procedure for one match on the event loop.
+    Without a MatchConfig, the match uses config.py's settings and the given deal seed.
+    '''
+
+    def __init__(self, log_dir, deal_seed=None, config=None):
+        super().__init__(os.path.join(log_dir, GAME_LOG_FILENAME + '.txt'),
+                         config if config is not None else default_config(deal_seed=deal_seed))
+        self.log_dir = log_dir
+
+    async def run_round(self, players, deal=None):
+        '''
+        Runs one round of poker.
+        '''
+        round_state = self.new_round(deal)
+        small_blind = round_state.button % 2
+
+        while not isinstance(round_state, TerminalState):
+            self.log_round_state(players, round_state)
+            active = round_state.button % 2
+            player = players[active]
+            action = await player.query(round_state, self.player_messages[active], self.log)
+            bet_override = (round_state.pips == [0, 0])
+            self.log_action(player.name, action, bet_override)
+            round_state = round_state.proceed(action)
+        self.log_terminal_state(players, round_state)
+        for player, player_message, delta, idx in zip(players, self.player_messages, round_state.deltas, range(2)):
+            if player.pipelines():
+                player.pending_clauses = player_message[1:]
+            else:
+                await player.query(round_state, player_message, self.log)
+            if idx == small_blind:
+                player.sb_bankroll += delta
+            else:
+                player.bb_bankroll += delta
+            player.bankroll += delta
+            player.deltas.append(delta)
+            player.output.sync()
+
+    async def run(self, path_1, path_2, shared_bots={}):
+        '''
+        Runs one game of poker between the pokerbots at the given paths.
+        Pokerbots found in shared_bots play through a table of their shared process,
+        if it was launched with this match's game parameters.
+        '''
+        config = self.config
+        shared = lambda path: path in shared_bots and config_env(shared_bots[path].config) == config_env(config)
+        players = [
+            TablePlayer(name, shared_bots[path], self.log_dir, config) if shared(path)
+            else AsyncPlayer(name, path, self.log_dir, config)
+            for name, path in [(config.player_1_name, path_1), (config.player_2_name, path_2)]
+        ]
+        await asyncio.gather(*(player.build() for player in players))
+        await asyncio.gather(*(player.run() for player in players))
+        deal_schedule = DealSchedule(config.deal_seed, config.num_rounds) if config.deal_seed is not None else None
+        play_start = time.perf_counter()
+        try:
+            for round_num in range(1, config.num_rounds + 1):
+                if self.log.enabled:
+                    self.log.write('')
+                    self.log.write('Round #' + str(round_num) + STATUS(players))
+                await self.run_round(players, deal_schedule.deal(round_num) if deal_schedule is not None else None)
+                players = players[::-1]
+            self.play_time = time.perf_counter() - play_start
+            self.log.write('')
+            self.log.write('Final' + STATUS(players))
+            if self.log.binary is not None:
+                self.log.binary.final(players)
+        finally:
+            self.log.close()
+            if self.latency_filename is not None:
+                write_latency_report(self.latency_filename, players)
+        await asyncio.gather(*(player.stop() for player in players))
+        return players
+
+
+async def start_shared_bots(paths, log_dir):
+    '''
+    Builds and starts one shared process for every multi-table pokerbot among the paths.
+    '''
+    shared_bots = {}
+    for path in sorted(set(paths)):
+        shared_bot = SharedBot(path, log_dir)
+        shared_bot.load_commands()
+        if shared_bot.commands is not None and 'multitable' in shared_bot.commands.get('protocol', []):
+            shared_bots[path] = shared_bot
+    await asyncio.gather(*(shared_bot.build() for shared_bot in shared_bots.values()))
+    await asyncio.gather(*(shared_bot.run() for shared_bot in shared_bots.values()))
+    return shared_bots
+
+
+async def run_matches(specs, concurrency, multitable=False):
+    '''
+    Plays the scheduled matches, at most concurrency of them at a time.
+    With multitable, pokerbots that support it play all their matches from one process.
+    '''
+    semaphore = asyncio.Semaphore(concurrency)
+    shared_bots = {}
+    if multitable:
+        log_dir = os.path.dirname(specs[0].log_dir)
+        os.makedirs(log_dir, exist_ok=True)
+        shared_bots = await start_shared_bots([path for spec in specs for path in (spec.bot_a, spec.bot_b)], log_dir)
+
+    async def play(spec):
+        async with semaphore:
+            os.makedirs(spec.log_dir, exist_ok=True)
+            game = AsyncGame(spec.log_dir, config=default_config(deal_seed=spec.seed, **dict(spec.variant)))
+            players = await game.run(spec.bot_a, spec.bot_b, shared_bots)
+            names = {game.config.player_1_name: spec.bot_a, game.config.player_2_name: spec.bot_b}
+            result = MatchResult(spec, {names[player.name]: player.bankroll for player in players},
+                                 {names[player.name]: player.deltas for player in players})
+            print('Match {} done: {}'.format(spec.index, ', '.join(
+                '{} ({})'.format(bot_name(bot), bankroll) for bot, bankroll in result.bankrolls.items())))
+            return result
+
+    results = await asyncio.gather(*(play(spec) for spec in specs))
+    await asyncio.gather(*(shared_bot.stop() for shared_bot in shared_bots.values()))
+    return results
+
+
+def parse_args():
+    '''
+    Parses the bots to play and how many matches to host at once.
+    '''
+    parser = argparse.ArgumentParser(prog='python3 async_engine.py')
+    parser.add_argument('bots', nargs='+', help='Bot directories or .zip bundles')
+    parser.add_argument('--challenger', type=str, default=None, help='Only play this bot against the rest of the field')
+    parser.add_argument('--seeds', type=int, default=1, help='Number of seeded matches per pairing, defaults to 1')
+    parser.add_argument('--first-seed', type=int, default=0, help='First seed, defaults to 0')
+    parser.add_argument('--duplicate', action='store_true', help='Replay every deal schedule with the seats exchanged')
+    parser.add_argument('--concurrency', type=int, default=32, help='Matches hosted at once, defaults to 32')
+    parser.add_argument('--multitable', action='store_true', help='Share one process per multi-table bot')
+    parser.add_argument('--out', type=str, default='matches', help='Directory for per-match logs')
+    return parser.parse_args()
+
+
+def main():
+    '''
+    Hosts the scheduled matches from the command line and prints the merged bankrolls.
+    '''
+    args = parse_args()
+    bots = [os.path.abspath(bot) for bot in args.bots]
+    challenger = os.path.abspath(args.challenger) if args.challenger is not None else None
+    if challenger is not None and challenger not in bots:
+        bots.append(challenger)
+    seeds = range(args.first_seed, args.first_seed + args.seeds)
+    specs = schedule(bots, seeds, os.path.abspath(args.out), challenger, args.duplicate)
+    results = asyncio.run(run_matches(specs, args.concurrency, args.multitable))
+    summary = summarize(results)
+    print()
+    for entry in sorted(summary['bots'].values(), key=lambda entry: -entry['bankroll']):
+        print('{}: {} over {} matches ({:.1f} per match)'.format(entry['name'], entry['bankroll'], entry['matches'],
+                                                                 entry['mean']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,443 @@
+'''
+Lockstep batch simulator: plays thousands of independent matches at once with numpy.
+
+Every table is one row of a set of arrays holding the RoundState fields. Each
+step, every unfinished table advances by one action under the engine's rules.
+Deals, hole-card swaps and showdown scores are computed for all tables in one
+vectorized batch. Policies receive the active tables as arrays of observations
+and answer with arrays of actions, so a vectorized strategy costs a handful of
+numpy calls per step, however many tables there are.
+
+Ordinary skeleton bots play through BotPolicy. It keeps one bot instance per
+table and feeds it the same clauses the engine would send, which is slower but
+needs no changes to the bot. For sweeps, port the bot's decision rule to a
+batch policy with an act(observation) method, like CheckCallPolicy.
+
+The game parameters come from a MatchConfig, config.py's settings by default,
+so sweep variants simulate under the parameters they set.
+
+Usage: python batch_sim.py POLICY POLICY [--tables N] [--rounds N] [--seed N]
+where a POLICY is 'checkcall' or a Python bot directory or .zip bundle.
+'''
+from collections import namedtuple
+from contextlib import redirect_stdout
+import argparse
+import os
+import numpy as np
+
+from deals import CARDS, RETURNED_CARDS
+
+FOLD, CALL, CHECK, RAISE = 0, 1, 2, 3
+CODES = 'FCKR'
+
+Observation = namedtuple('Observation', ['tables', 'seat', 'round_num', 'street', 'button', 'pips', 'stacks',
+                                         'hands', 'board', 'board_size', 'legal', 'min_raise', 'max_raise',
+                                         'messages'])
+
+
+def match_config(config=None):
+    '''
+    Returns the given MatchConfig, or one of config.py's settings without one.
+    '''
+    if config is not None:
+        return config
+    from engine import default_config
+    return default_config()
+
+
+def top_ranks(mask, count):
+    '''
+    Returns the highest count ranks where mask is set, per row, highest first, padded with -1.
+    '''
+    ranks = np.where(mask, np.arange(13), -1)
+    return -np.sort(-ranks, axis=1)[:, :count]
+
+
+def straight_high(present):
+    '''
+    Returns the top rank of the best straight among the present ranks, per row, or -1.
+    '''
+    # column 0 is the ace playing low, column r + 1 is rank r
+    extended = np.concatenate([present[:, 12:13], present], axis=1)
+    high = np.full(len(present), -1)
+    for top in range(3, 13):
+        high = np.where(extended[:, top - 3:top + 2].all(axis=1), top, high)
+    return high
+
+
+def evaluate(cards):
+    '''
+    Scores seven-card hands given as rows of card codes. A higher score is a better hand
+    and equal scores split, so scores compare like eval7.evaluate.
+    '''
+    rows = np.arange(len(cards))[:, None]
+    ranks, suits = cards % 13, cards // 13
+    suited = np.zeros((len(cards), 4, 13), dtype=bool)
+    suited[rows, suits, ranks] = True
+    counts = np.zeros((len(cards), 13), dtype=np.int8)
+    np.add.at(counts, (np.broadcast_to(rows, ranks.shape), ranks), 1)
+    present = counts > 0
+    suit_counts = suited.sum(axis=2)
+    has_flush = suit_counts.max(axis=1) >= 5
+    flush_ranks = suited[rows[:, 0], suit_counts.argmax(axis=1)]
+    rank_range = np.arange(13)
+
+    straight = straight_high(present)
+    straight_flush = np.where(has_flush, straight_high(flush_ranks), -1)
+    quads = top_ranks(counts >= 4, 1)[:, 0]
+    trips = top_ranks(counts >= 3, 1)[:, 0]
+    pairs = top_ranks(counts >= 2, 2)
+    full_pair = top_ranks((counts >= 2) & (rank_range != trips[:, None]), 1)[:, 0]
+    singles = top_ranks(counts == 1, 5)
+
+    # (category, tie-break ranks) per hand class, best class first
+    pad = np.full((len(cards), 1), -1)
+    classes = [
+        (straight_flush >= 0, 8, [straight_flush[:, None]]),
+        (quads >= 0, 7, [quads[:, None], top_ranks(present & (rank_range != quads[:, None]), 1)]),
+        ((trips >= 0) & (full_pair >= 0), 6, [trips[:, None], full_pair[:, None]]),
+        (has_flush, 5, [top_ranks(flush_ranks, 5)]),
+        (straight >= 0, 4, [straight[:, None]]),
+        (trips >= 0, 3, [trips[:, None], singles[:, :2]]),
+        (pairs[:, 1] >= 0, 2, [pairs, top_ranks(present & (rank_range != pairs[:, :1]) & (rank_range != pairs[:, 1:]), 1)]),
+        (pairs[:, 0] >= 0, 1, [pairs[:, :1], singles[:, :3]]),
+        (np.ones(len(cards), dtype=bool), 0, [singles]),
+    ]
+    scores = np.zeros(len(cards), dtype=np.int64)
+    decided = np.zeros(len(cards), dtype=bool)
+    for condition, category, tie_breaks in classes:
+        tie_break = np.concatenate(tie_breaks + [pad] * 5, axis=1)[:, :5] + 1
+        score = category << 20 | (tie_break << np.array([16, 12, 8, 4, 0])).sum(axis=1)
+        chosen = condition & ~decided
+        scores[chosen] = score[chosen]
+        decided |= chosen
+    return scores
+
+
+class BatchTables():
+    '''
+    One round of poker at each of many tables, as arrays of RoundState fields with one row per table.
+    Every table plays under the game parameters of the given MatchConfig, config.py's without one.
+    '''
+
+    def __init__(self, num_tables, rng, clauses=False, config=None):
+        self.num_tables = num_tables
+        self.rng = rng
+        self.config = match_config(config)
+        self.deck = np.zeros((num_tables, 52 + RETURNED_CARDS), dtype=np.int16)
+        self.cursor = np.zeros(num_tables, dtype=np.int64)
+        self.end = np.zeros(num_tables, dtype=np.int64)
+        self.hands = np.zeros((num_tables, 4), dtype=np.int16)  # both cards of seat 0, then of seat 1
+        self.board = np.zeros((num_tables, 5), dtype=np.int16)
+        self.board_size = np.zeros(num_tables, dtype=np.int64)
+        self.button = np.zeros(num_tables, dtype=np.int64)
+        self.street = np.zeros(num_tables, dtype=np.int64)
+        self.pips = np.zeros((num_tables, 2), dtype=np.int64)
+        self.stacks = np.zeros((num_tables, 2), dtype=np.int64)
+        self.done = np.zeros(num_tables, dtype=bool)
+        self.at_showdown = np.zeros(num_tables, dtype=bool)
+        self.deltas = np.zeros(num_tables, dtype=np.int64)  # seat 0's delta, seat 1 gets the negative
+        # the protocol clauses each seat has yet to receive, kept only for clause-driven policies
+        self.messages = [[[] for _ in range(num_tables)] for _ in range(2)] if clauses else None
+
+    def deal(self):
+        '''
+        Shuffles a new deck at every table and posts the blinds.
+        '''
+        self.deck[:, :52] = self.rng.random((self.num_tables, 52)).argsort(axis=1)
+        self.hands[:] = self.deck[:, :4]
+        self.cursor[:] = 4
+        self.end[:] = 52
+        self.board_size[:] = 0
+        self.button[:] = 0
+        self.street[:] = 0
+        config = self.config
+        self.pips[:] = (config.small_blind, config.big_blind)
+        self.stacks[:] = (config.starting_stack - config.small_blind, config.starting_stack - config.big_blind)
+        self.done[:] = False
+        self.at_showdown[:] = False
+        self.deltas[:] = 0
+        if self.messages is not None:
+            for seat in range(2):
+                for table in range(self.num_tables):
+                    self.messages[seat][table] = ['T{:.3f}'.format(config.starting_game_clock), 'P' + str(seat),
+                                                  'H' + self.cards(self.hands[table, 2 * seat:2 * seat + 2])]
+
+    def cards(self, codes):
+        '''
+        Formats card codes the way the engine sends them.
+        '''
+        return ','.join(CARDS[code] for code in codes)
+
+    def legal(self, rows):
+        '''
+        Returns the legal actions of the active player at each of the given tables,
+        as a boolean array indexed by action code, and the raise bounds.
+        '''
+        index = np.arange(len(rows))
+        active = self.button[rows] % 2
+        pips, stacks = self.pips[rows], self.stacks[rows]
+        my_pip, my_stack = pips[index, active], stacks[index, active]
+        continue_cost = pips[index, 1 - active] - my_pip
+        free = continue_cost == 0
+        legal = np.zeros((len(rows), 4), dtype=bool)
+        legal[:, CHECK] = free
+        legal[:, FOLD] = legal[:, CALL] = ~free
+        # raising is only allowed if both players can afford it
+        legal[:, RAISE] = np.where(free, (stacks[:, 0] != 0) & (stacks[:, 1] != 0),
+                                   (continue_cost != my_stack) & (stacks[index, 1 - active] != 0))
+        max_contribution = np.minimum(my_stack, stacks[index, 1 - active] + continue_cost)
+        min_contribution = np.minimum(max_contribution,
+                                      continue_cost + np.maximum(continue_cost, self.config.big_blind))
+        return legal, my_pip + min_contribution, my_pip + max_contribution
+
+    def observe(self, rows, seat, round_num, legal, min_raise, max_raise):
+        '''
+        Packs the view of the given seat at the given tables, taking its pending clauses if they are kept.
+        '''
+        messages = None
+        if self.messages is not None:
+            messages = [self.messages[seat][table] for table in rows]
+            for table in rows:
+                self.messages[seat][table] = []
+        return Observation(rows, seat, round_num, self.street[rows], self.button[rows], self.pips[rows],
+                           self.stacks[rows], self.hands[rows, 2 * seat:2 * seat + 2], self.board[rows],
+                           self.board_size[rows], legal, min_raise, max_raise, messages)
+
+    def apply(self, rows, actions, amounts, legal, min_raise, max_raise):
+        '''
+        Advances each of the given tables by its active player's action.
+        Illegal actions become a check, or a fold if checking is illegal, as in the engine.
+        '''
+        index = np.arange(len(rows))
+        valid = legal[index, actions] & ((actions != RAISE) | ((amounts >= min_raise) & (amounts <= max_raise)))
+        actions = np.where(valid, actions, np.where(legal[:, CHECK], CHECK, FOLD))
+        active = self.button[rows] % 2
+        if self.messages is not None:
+            for table, action, amount in zip(rows, actions, amounts):
+                code = CODES[action] + (str(amount) if action == RAISE else '')
+                self.messages[0][table].append(code)
+                self.messages[1][table].append(code)
+
+        starting_stack, big_blind = self.config.starting_stack, self.config.big_blind
+        folds = actions == FOLD
+        tables = rows[folds]
+        self.deltas[tables] = np.where(active[folds] == 0, self.stacks[tables, 0] - starting_stack,
+                                       starting_stack - self.stacks[tables, 1])
+        self.done[tables] = True
+
+        # sb calls bb
+        limps = (actions == CALL) & (self.button[rows] == 0)
+        tables = rows[limps]
+        self.pips[tables] = big_blind
+        self.stacks[tables] = starting_stack - big_blind
+        self.button[tables] = 1
+
+        # calls and raises move chips; calls then close the street
+        calls = (actions == CALL) & ~limps
+        raises = actions == RAISE
+        moves = calls | raises
+        tables, movers = rows[moves], active[moves]
+        target = np.where(raises[moves], amounts[moves], self.pips[tables, 1 - movers])
+        self.stacks[tables, movers] -= target - self.pips[tables, movers]
+        self.pips[tables, movers] = target
+        self.button[tables] += 1
+
+        checks = actions == CHECK
+        street_over = checks & (((self.street[rows] == 0) & (self.button[rows] > 0)) | (self.button[rows] > 1))
+        self.button[rows[checks & ~street_over]] += 1
+        self.proceed_street(rows[calls | street_over])
+
+    def proceed_street(self, rows):
+        '''
+        Resets the players' pips and deals the next street at each of the given tables,
+        swapping hole cards on the flop and turn. Tables past the river go to showdown.
+        '''
+        river = self.street[rows] == 5
+        self.done[rows[river]] = True
+        self.at_showdown[rows[river]] = True
+        rows = rows[~river]
+        streets = self.street[rows]
+        swapping = rows[(streets == 0) | (streets == 3)]
+        percent = np.where(self.street[swapping] == 0, self.config.flop_percent, self.config.turn_percent)
+        swaps = self.rng.random((len(swapping), 4)) < percent[:, None]
+        for i in range(4):  # in order, each swap deals the top card and returns the old one to the bottom
+            tables = swapping[swaps[:, i]]
+            new_cards = self.deck[tables, self.cursor[tables]]
+            self.cursor[tables] += 1
+            self.deck[tables, self.end[tables]] = self.hands[tables, i]
+            self.end[tables] += 1
+            self.hands[tables, i] = new_cards
+        dealt = np.where(streets == 0, 3, 1)
+        for j in range(3):
+            tables = rows[dealt > j]
+            self.board[tables, self.board_size[tables]] = self.deck[tables, self.cursor[tables]]
+            self.cursor[tables] += 1
+            self.board_size[tables] += 1
+        self.street[rows] = np.where(streets == 0, 3, streets + 1)
+        self.button[rows] = 1
+        self.pips[rows] = 0
+        if self.messages is not None:
+            for table in rows:
+                board = 'B' + self.cards(self.board[table, :self.board_size[table]])
+                for seat in range(2):
+                    self.messages[seat][table].append(board)
+                    if self.street[table] < 5:
+                        self.messages[seat][table].append('U' + self.cards(self.hands[table, 2 * seat:2 * seat + 2]))
+
+    def showdown(self):
+        '''
+        Scores every table that reached showdown in one batch and computes its payoffs.
+        '''
+        tables = np.flatnonzero(self.at_showdown)
+        boards = self.board[tables]
+        scores = evaluate(np.concatenate([np.concatenate([boards, self.hands[tables, :2]], axis=1),
+                                          np.concatenate([boards, self.hands[tables, 2:]], axis=1)]))
+        score0, score1 = scores[:len(tables)], scores[len(tables):]
+        stacks = self.stacks[tables]
+        starting_stack = self.config.starting_stack
+        self.deltas[tables] = np.where(score0 > score1, starting_stack - stacks[:, 1],
+                                       np.where(score0 < score1, stacks[:, 0] - starting_stack,
+                                                (stacks[:, 0] - stacks[:, 1]) // 2))  # split the pot
+        if self.messages is not None:
+            for table in tables:
+                self.messages[0][table].append('O' + self.cards(self.hands[table, 2:]))
+                self.messages[1][table].append('O' + self.cards(self.hands[table, :2]))
+            for table in range(self.num_tables):
+                self.messages[0][table].append('D' + str(self.deltas[table]))
+                self.messages[1][table].append('D' + str(-self.deltas[table]))
+
+
+class CheckCallPolicy():
+    '''
+    Checks when it can and calls otherwise, like the skeleton bots.
+    '''
+    clauses = False
+
+    def act(self, observation):
+        actions = np.where(observation.legal[:, CHECK], CHECK, CALL)
+        return actions, np.zeros(len(actions), dtype=np.int64)
+
+
+class BotPolicy():
+    '''
+    Plays a Python skeleton bot at every table, one instance per table, through the engine's clauses.
+    Each BotPolicy holds its own instances, so give each side of a match its own BotPolicy.
+    The bot is loaded with the MatchConfig's game parameters in its environment, as the engine launches it.
+    '''
+    clauses = True
+
+    def __init__(self, path, num_tables, config=None):
+        import engine
+        path = os.path.abspath(engine.resolve_bot(path))
+        config = match_config(config)
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            player_module, states, actions = engine.load_bot(path, engine.config_env(config))
+            cwd = os.getcwd()
+            os.chdir(path)
+            try:
+                self.views = []
+                for _ in range(num_tables):
+                    # a LocalPlayer replays clauses through the bot's skeleton exactly as headless matches do
+                    view = engine.LocalPlayer(os.path.basename(path), path, config)
+                    view.pokerbot = player_module.Player()
+                    view.states, view.actions = states, actions
+                    view.game_state = states.GameState(0, 0., 1)
+                    self.views.append(view)
+            finally:
+                os.chdir(cwd)
+
+    def act(self, observation):
+        actions = np.empty(len(observation.tables), dtype=np.int64)
+        amounts = np.zeros(len(observation.tables), dtype=np.int64)
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            for row, (table, clauses) in enumerate(zip(observation.tables, observation.messages)):
+                view = self.views[table]
+                view.receive(clauses)
+                code = view.respond()
+                actions[row] = CODES.index(code[0])
+                amounts[row] = int(code[1:]) if code[0] == 'R' else 0
+        return actions, amounts
+
+    def end_round(self, seat, messages):
+        '''
+        Delivers the end-of-round clauses of one seat at every table.
+        '''
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            for view, clauses in zip(self.views, messages):
+                view.receive(clauses)
+
+
+def simulate(policy_a, policy_b, num_tables, num_rounds, seed=None, config=None):
+    '''
+    Plays num_tables independent matches of num_rounds rounds in lockstep, exchanging seats
+    every round as the engine does, under the game parameters of the MatchConfig.
+    Returns policy_a's deltas as a num_rounds x num_tables array.
+    '''
+    rng = np.random.default_rng(seed)
+    tables = BatchTables(num_tables, rng, policy_a.clauses or policy_b.clauses, config)
+    results = np.zeros((num_rounds, num_tables), dtype=np.int64)
+    for round_num in range(1, num_rounds + 1):
+        seated = [policy_a, policy_b] if round_num % 2 == 1 else [policy_b, policy_a]
+        tables.deal()
+        while True:
+            rows = np.flatnonzero(~tables.done)
+            if len(rows) == 0:
+                break
+            legal, min_raise, max_raise = tables.legal(rows)
+            active = tables.button[rows] % 2
+            actions = np.zeros(len(rows), dtype=np.int64)
+            amounts = np.zeros(len(rows), dtype=np.int64)
+            for seat, policy in enumerate(seated):
+                chosen = np.flatnonzero(active == seat)
+                if len(chosen) > 0:
+                    observation = tables.observe(rows[chosen], seat, round_num, legal[chosen],
+                                                 min_raise[chosen], max_raise[chosen])
+                    actions[chosen], amounts[chosen] = policy.act(observation)
+            tables.apply(rows, actions, amounts, legal, min_raise, max_raise)
+        tables.showdown()
+        for seat, policy in enumerate(seated):
+            if tables.messages is not None:
+                if policy.clauses:
+                    policy.end_round(seat, tables.messages[seat])
+                tables.messages[seat] = [[] for _ in range(num_tables)]
+        results[round_num - 1] = tables.deltas if seated[0] is policy_a else -tables.deltas
+    return results
+
+
+def make_policy(name, num_tables, config=None):
+    '''
+    Returns the batch policy for 'checkcall', or a BotPolicy for a bot directory playing under the MatchConfig.
+    '''
+    if name == 'checkcall':
+        return CheckCallPolicy()
+    return BotPolicy(name, num_tables, config)
+
+
+def parse_args():
+    '''
+    Parses the two policies and the size of the simulation.
+    '''
+    parser = argparse.ArgumentParser(prog='python3 batch_sim.py')
+    parser.add_argument('policies', nargs=2, help="'checkcall' or a Python bot directory or .zip, for each side")
+    parser.add_argument('--tables', type=int, default=4096, help='Matches played in lockstep, defaults to 4096')
+    parser.add_argument('--rounds', type=int, default=1000, help='Rounds per match, defaults to 1000')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed')
+    return parser.parse_args()
+
+
+def main():
+    '''
+    Simulates the two policies against each other and prints the first one's results.
+    '''
+    args = parse_args()
+    policy_a, policy_b = (make_policy(name, args.tables) for name in args.policies)
+    results = simulate(policy_a, policy_b, args.tables, args.rounds, args.seed)
+    totals = results.sum(axis=0)
+    error = 1.96 * totals.std(ddof=1) / np.sqrt(len(totals)) if len(totals) > 1 else float('nan')
+    print('{} hands: {} wins {:.3f} per hand, {:.1f} +- {:.1f} per {}-round match'.format(
+        results.size, args.policies[0], results.mean(), totals.mean(), error, args.rounds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+'''
+Measures the engine-to-bot round-trip time of every transport.
+
+Each query sends a bare T clause, which a skeleton bot answers with a check
+without consulting the strategy, so the timings are almost pure protocol
+overhead: socket write, wakeup, parse, response and read.
+
+Usage: python bench_transport.py [BOT] [--queries N] [--transports tcp unix ...]
+'''
+import argparse
+import os
+import tempfile
+import time
+import engine
+from latency import percentile
+
+TRANSPORTS = ['tcp', 'tcp_nodelay', 'unix', 'socketpair']
+
+
+def measure(path, transport, queries):
+    '''
+    Starts the bot over one transport and times queries round trips.
+    Returns the sorted round-trip times in seconds, or None if the bot cannot use the transport.
+    '''
+    engine.TRANSPORT = transport
+    player = engine.Player('A', path)
+    player.build()
+    if player.transport() != transport:
+        return None
+    player.run()
+    if player.socketfile is None:
+        return None
+    samples = []
+    for _ in range(queries):
+        start_time = time.perf_counter()
+        player.socketfile.write('T30.000\n')
+        player.socketfile.flush()
+        player.socketfile.readline()
+        samples.append(time.perf_counter() - start_time)
+    player.stop()
+    return sorted(samples)
+
+
+def parse_args():
+    '''
+    Parses the bot to benchmark and the transports to compare.
+    '''
+    parser = argparse.ArgumentParser(prog='python3 bench_transport.py')
+    parser.add_argument('bot', nargs='?', default='./python_skeleton', help='Bot directory, defaults to ./python_skeleton')
+    parser.add_argument('--queries', type=int, default=10000, help='Round trips per transport, defaults to 10000')
+    parser.add_argument('--transports', nargs='+', default=TRANSPORTS, choices=TRANSPORTS, help='Transports to compare')
+    return parser.parse_args()
+
+
+def main():
+    '''
+    Prints per-query round-trip statistics for each transport.
+    '''
+    args = parse_args()
+    bot = os.path.abspath(args.bot)
+    # keep the bot log written by Player.stop out of the working directory
+    os.chdir(tempfile.mkdtemp(prefix='bench-transport-'))
+    print('{:<12} {:>10} {:>10} {:>10} {:>10}'.format('transport', 'mean us', 'p50 us', 'p99 us', 'max us'))
+    for transport in args.transports:
+        samples = measure(bot, transport, args.queries)
+        if samples is None:
+            print('{:<12} {:>10}'.format(transport, 'unsupported'))
+            continue
+        print('{:<12} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f}'.format(
+            transport, 1e6 * sum(samples) / len(samples), 1e6 * percentile(samples, 0.5),
+            1e6 * percentile(samples, 0.99), 1e6 * samples[-1]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,396 @@
+'''
+Engine throughput benchmark against trivial stub bots.
+
+The stubs are the Python and C++ skeletons with a one-line strategy, always
+check, always call or a random legal action, generated afresh from the
+skeletons for every run. Each case plays a stub against itself for --rounds
+rounds in a freshly spawned process. The engine times the round loop itself,
+so the figures below do not depend on bot startup:
+
+rounds_per_sec, queries_per_sec  rounds and decisions played per second
+query_*_us                       engine-measured round trip of a decision
+engine_us_per_round              time per round outside the decisions' round trips
+startup_s                        launching, connecting and stopping both bots
+engine_rss_mb, bot_rss_mb        peak resident memory of the engine and of its largest bot process
+
+Every case plays under the same settings whatever config.py says: plain TCP
+without pipelined acks, an enforced game clock, the full text gamelog and no
+other reports, so runs stay comparable across commits and configurations.
+Results are written as JSON with a stable layout, to diff across commits.
+An engine is one entry of ENGINES, a function that plays a MatchConfig and returns the players
+and the seconds the engine spent playing the rounds.
+
+Usage: python benchmark.py [--engines engine headless async] [--stubs py_check cpp_random ...] [--rounds N]
+'''
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from threading import Event, Thread
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+
+from build_cache import source_hash, is_built, snapshot, mark_built, build_env
+from latency import percentile
+
+PYTHON_STUB = """'''
+Benchmark stub pokerbot.
+'''
+import random
+
+from skeleton.actions import FoldAction, CallAction, CheckAction, RaiseAction
+from skeleton.bot import Bot
+from skeleton.runner import parse_args, run_bot
+
+
+class Player(Bot):
+    '''
+    A pokerbot that spends no time deciding.
+    '''
+
+    def __init__(self):
+        self.rng = random.Random(0)
+
+    def handle_new_round(self, game_state, round_state, active):
+        pass
+
+    def handle_round_over(self, game_state, terminal_state, active):
+        pass
+
+    def get_action(self, game_state, round_state, active):
+        legal_actions = round_state.legal_actions()
+STRATEGY
+
+
+if __name__ == '__main__':
+    run_bot(Player(), parse_args())
+"""
+CPP_STUB = """#include <algorithm>
+#include <random>
+#include <vector>
+
+#include <skeleton/actions.h>
+#include <skeleton/constants.h>
+#include <skeleton/runner.h>
+#include <skeleton/states.h>
+
+using namespace pokerbots::skeleton;
+
+// A pokerbot that spends no time deciding.
+struct Bot {
+  std::mt19937 rng{0};
+
+  void handleNewRound(GameInfoPtr gameState, RoundStatePtr roundState, int active) {}
+
+  void handleRoundOver(GameInfoPtr gameState, TerminalStatePtr terminalState, int active) {}
+
+  Action getAction(GameInfoPtr gameState, RoundStatePtr roundState, int active) {
+    auto legalActions = roundState->legalActions();
+STRATEGY
+  }
+};
+
+int main(int argc, char *argv[]) {
+  auto connection = parseArgs(argc, argv);
+  runBot<Bot>(connection);
+  return 0;
+}
+"""
+STRATEGIES = {
+    'py_check': """        return CheckAction() if CheckAction in legal_actions else FoldAction()""",
+    'py_call': """        return CallAction() if CallAction in legal_actions else CheckAction()""",
+    'py_random': """        action = self.rng.choice(sorted(legal_actions, key=lambda action: action.__name__))
+        if action is RaiseAction:
+            return RaiseAction(self.rng.randint(*round_state.raise_bounds()))
+        return action()""",
+    'cpp_check': """    if (legalActions.count(Action::Type::CHECK)) {
+      return {Action::Type::CHECK};
+    }
+    return {Action::Type::FOLD};""",
+    'cpp_call': """    if (legalActions.count(Action::Type::CALL)) {
+      return {Action::Type::CALL};
+    }
+    return {Action::Type::CHECK};""",
+    'cpp_random': """    std::vector<Action::Type> types(legalActions.begin(), legalActions.end());
+    std::sort(types.begin(), types.end());
+    auto type = types[std::uniform_int_distribution<size_t>(0, types.size() - 1)(rng)];
+    if (type == Action::Type::RAISE) {
+      auto bounds = roundState->raiseBounds();
+      return {type, std::uniform_int_distribution<int>(bounds[0], bounds[1])(rng)};
+    }
+    return {type};""",
+}
+
+
+def run_engine(config):
+    '''
+    Plays the match on the socket engine, over plain TCP.
+    '''
+    import engine
+    engine.HEADLESS = False
+    engine.TRANSPORT = 'tcp'
+    game = engine.Game(config=config)
+    return game.run(), game.play_time
+
+
+def run_headless(config):
+    '''
+    Plays the match on the engine with the Python bots inside the engine process.
+    '''
+    import engine
+    engine.HEADLESS = True
+    engine.TRANSPORT = 'tcp'
+    game = engine.Game(config=config)
+    return game.run(), game.play_time
+
+
+def run_async(config):
+    '''
+    Plays the match on the asyncio engine, which always connects over TCP.
+    '''
+    import async_engine
+    import engine
+    engine.HEADLESS = False
+    engine.TRANSPORT = 'tcp'
+    game = async_engine.AsyncGame(os.getcwd(), config=config)
+    return asyncio.run(game.run(config.player_1_path, config.player_2_path)), game.play_time
+
+
+ENGINES = {'engine': run_engine, 'headless': run_headless, 'async': run_async}
+# engine settings every case runs under, whatever config.py says; prebuilt stubs rely on BUILD_CACHE
+# each engine above also sets HEADLESS and TRANSPORT for its own case
+SETTINGS = {
+    'HEADLESS': False,
+    'TRANSPORT': 'tcp',
+    'PIPELINE_ACKS': False,
+    'ENFORCE_GAME_CLOCK': True,
+    'GAME_LOG_VERBOSITY': 'full',
+    'BINARY_LOG': False,
+    'LATENCY_REPORT': False,
+    'CHECKPOINT_ROUNDS': 0,
+    'PIN_CPUS': None,
+    'BUILD_CACHE': True,
+    'WARM_POOL': False,
+}
+# engines that can only run Python bots
+PYTHON_ONLY = {'headless'}
+
+
+def make_stub(stub, skeleton, stub_dir):
+    '''
+    Writes a stub bot into stub_dir from its skeleton, over any earlier copy so that its build is kept.
+    Returns the stub's directory.
+    '''
+    path = os.path.join(stub_dir, stub)
+    shutil.copytree(skeleton, path, ignore=shutil.ignore_patterns('build', '__pycache__', '.build_stamp'),
+                    dirs_exist_ok=True)
+    template, filename = (PYTHON_STUB, 'player.py') if stub.startswith('py_') else (CPP_STUB, 'src/main.cpp')
+    with open(os.path.join(path, filename), 'w') as source_file:
+        source_file.write(template.replace('STRATEGY', STRATEGIES[stub]))
+    return path
+
+
+def prebuild(path):
+    '''
+    Builds a stub ahead of its matches, without the engine's build timeout, and stamps it so the engine skips the build.
+    Returns whether the stub is built.
+    '''
+    with open(os.path.join(path, 'commands.json'), 'r') as json_file:
+        command = json.load(json_file)['build']
+    if not command:
+        return True
+    digest = source_hash(path, command)
+    if is_built(path, digest):
+        return True
+    before = snapshot(path)
+    proc = subprocess.run(command, cwd=path, env=build_env(path), stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    if proc.returncode != 0:
+        print(proc.stdout.decode(errors='replace')[-2000:])
+        return False
+    mark_built(path, digest, before)
+    return True
+
+
+def descendants(pid):
+    '''
+    Returns the ids of every process descended from pid, read from /proc.
+    '''
+    parents = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open('/proc/{}/stat'.format(entry), 'r') as stat_file:
+                    # the command name may hold spaces, so the fields are counted from its closing parenthesis
+                    parents.setdefault(int(stat_file.read().rpartition(')')[2].split()[1]), []).append(int(entry))
+            except (OSError, IndexError, ValueError):
+                pass
+    found = []
+    pending = [pid]
+    while pending:
+        children = parents.get(pending.pop(), [])
+        found += children
+        pending += children
+    return found
+
+
+def peak_rss_kb(pid):
+    '''
+    Returns the peak resident memory of a process since it started its program, in kilobytes.
+    '''
+    try:
+        with open('/proc/{}/status'.format(pid), 'r') as status_file:
+            for line in status_file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+class BotMemory():
+    '''
+    Samples the peak resident memory of the engine's child processes while a case runs.
+    Memory counters inherited through fork would show the engine's own memory, so each bot is read from /proc.
+    '''
+
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.peak_kb = 0
+        self.done = Event()
+        self.thread = Thread(target=self.sample, daemon=True)
+
+    def sample(self):
+        '''
+        Records the largest child process's peak until stopped.
+        '''
+        while not self.done.wait(self.interval):
+            for pid in descendants(os.getpid()):
+                self.peak_kb = max(self.peak_kb, peak_rss_kb(pid))
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.done.set()
+        self.thread.join()
+
+
+def run_case(engine_name, path, rounds, log_dir):
+    '''
+    Times a match of the given rounds between two copies of a stub. Runs in a spawned process.
+    '''
+    import engine
+    for name, value in SETTINGS.items():
+        setattr(engine, name, value)
+    os.makedirs(log_dir, exist_ok=True)
+    os.chdir(log_dir)
+    config = engine.default_config(player_1_path=path, player_2_path=path, num_rounds=rounds, deal_seed=0)
+    with open('engine.txt', 'w') as engine_output, redirect_stdout(engine_output), BotMemory() as bot_memory:
+        start_time = time.perf_counter()
+        players, playing = ENGINES[engine_name](config)
+        total = time.perf_counter() - start_time
+    samples = sorted(sample for player in players for group in player.latency.samples.values() for sample in group)
+    startup = total - playing
+    playing = max(playing, 1e-9)
+    return {
+        'rounds_per_sec': round(rounds / playing, 1),
+        'queries_per_sec': round(len(samples) / playing, 1),
+        'queries': len(samples),
+        'query_mean_us': round(1e6 * sum(samples) / len(samples), 2) if samples else None,
+        'query_p50_us': round(1e6 * percentile(samples, 0.5), 2) if samples else None,
+        'query_p99_us': round(1e6 * percentile(samples, 0.99), 2) if samples else None,
+        'engine_us_per_round': round(1e6 * (playing - sum(samples)) / rounds, 2),
+        'startup_s': round(startup, 4),
+        # ru_maxrss is in kilobytes on Linux
+        'engine_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'bot_rss_mb': round(bot_memory.peak_kb / 1024, 1),
+    }
+
+
+def measure(engine_name, path, rounds, log_dir, repeat):
+    '''
+    Runs one case repeat times, each in a freshly spawned process, and returns the run with the median throughput.
+    '''
+    runs = []
+    for attempt in range(repeat):
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+            runs.append(pool.submit(run_case, engine_name, path, rounds,
+                                    os.path.join(log_dir, str(attempt))).result())
+    runs.sort(key=lambda run: run['rounds_per_sec'])
+    return runs[len(runs) // 2]
+
+
+def commit():
+    '''
+    Returns the git commit of the engine, or None outside a git checkout.
+    '''
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args():
+    '''
+    Parses the engines and stubs to benchmark.
+    '''
+    root = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(prog='python3 benchmark.py')
+    parser.add_argument('--engines', nargs='+', default=list(ENGINES), choices=list(ENGINES), help='Engines to measure')
+    parser.add_argument('--stubs', nargs='+', default=list(STRATEGIES), choices=list(STRATEGIES), help='Stub bots to play')
+    parser.add_argument('--rounds', type=int, default=1000, help='Rounds per match, defaults to 1000')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per case, the median is reported, defaults to 3')
+    parser.add_argument('--python-skeleton', type=str, default=os.path.join(root, 'python_skeleton'),
+                        help='Skeleton the Python stubs are made from')
+    parser.add_argument('--cpp-skeleton', type=str, default=os.path.join(root, 'cpp_skeleton'),
+                        help='Skeleton the C++ stubs are made from')
+    parser.add_argument('--work', type=str, default=None, help='Directory for the stubs and logs, defaults to a new temporary one')
+    parser.add_argument('--out', type=str, default='benchmark.json', help='JSON file to write, defaults to benchmark.json')
+    return parser.parse_args()
+
+
+def main():
+    '''
+    Runs every engine against every stub and writes the results.
+    '''
+    args = parse_args()
+    work = os.path.abspath(args.work) if args.work is not None else tempfile.mkdtemp(prefix='benchmark-')
+    stubs = {}
+    for stub in args.stubs:
+        skeleton = args.python_skeleton if stub.startswith('py_') else args.cpp_skeleton
+        path = make_stub(stub, os.path.abspath(skeleton), os.path.join(work, 'stubs'))
+        if prebuild(path):
+            stubs[stub] = path
+        else:
+            print(stub, 'failed to build, skipping it')
+    results = []
+    print('{:<9} {:<11} {:>10} {:>11} {:>10} {:>10} {:>10} {:>9} {:>8} {:>8}'.format(
+        'engine', 'stub', 'rounds/s', 'queries/s', 'query us', 'p99 us', 'engine us', 'startup', 'rss MB', 'bot MB'))
+    for engine_name in args.engines:
+        for stub, path in stubs.items():
+            if engine_name in PYTHON_ONLY and not stub.startswith('py_'):
+                continue
+            result = measure(engine_name, path, args.rounds, os.path.join(work, 'logs', engine_name, stub), args.repeat)
+            results.append(dict({'engine': engine_name, 'stub': stub}, **result))
+            print('{:<9} {:<11} {:>10.0f} {:>11.0f} {:>10} {:>10} {:>10.1f} {:>9.3f} {:>8.1f} {:>8.1f}'.format(
+                engine_name, stub, result['rounds_per_sec'], result['queries_per_sec'], result['query_mean_us'],
+                result['query_p99_us'], result['engine_us_per_round'], result['startup_s'], result['engine_rss_mb'],
+                result['bot_rss_mb']))
+    with open(args.out, 'w') as out_file:
+        json.dump({'commit': commit(), 'python': platform.python_version(), 'platform': platform.platform(),
+                   'cpus': os.cpu_count(), 'rounds': args.rounds, 'repeat': args.repeat, 'results': results},
+                  out_file, indent=4, sort_keys=True)
+    print('Wrote', args.out, '- stubs and logs are in', work)
+
+
+if __name__ == '__main__':
+    main()
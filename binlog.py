@@ -0,0 +1,317 @@
+'''
+Compact binary game log, and a converter back to the gamelog.txt text format.
+
+The file is a sequence of records, each a kind byte and a uint32 payload
+length followed by the payload, so it can be appended to while a match runs
+and scanned in place through mmap. A HEADER record opens every game and holds
+the format version, the blinds and player names; one ROUND record per round
+holds the seating, starting bankrolls, hole cards and the round's events; a
+FINAL record closes the game. Cards are single bytes indexing deals.CARDS.
+
+Round events are an opcode byte and its operands:
+0x00-0x0f action: low 3 bits fold/call/check/raise/bet, bit 3 the acting seat, raise and bet add a uint32 amount
+0x10 street: card count, board cards, and both players' uint32 contributions to the pot
+0x11 hands: both players' hole cards after the swap
+0x12 showdown
+0x13 award: both players' int32 deltas
+0x14 text: uint16 length and a utf-8 line, such as a player error
+
+Version 1 logs, whose blinds, amounts, contributions and deltas are 16-bit, still render.
+
+Usage: python binlog.py gamelog.bin [-o gamelog.txt]
+'''
+import argparse
+import mmap
+import struct
+import sys
+
+from deals import CARDS, CARD_CODES
+
+MAGIC = b'PBBL'
+VERSION = 2
+HEADER, ROUND, FINAL = 0, 1, 2
+ACTIONS = 'FCKRB'
+STREET, HANDS, SHOWDOWN, AWARD, TEXT = 0x10, 0x11, 0x12, 0x13, 0x14
+STREET_NAMES = ['Flop', 'Turn', 'River']
+
+RECORD = struct.Struct('<BI')
+ROUND_START = struct.Struct('<IBii4B')
+FINAL_RECORD = struct.Struct('<Bii')
+# per version: the formats of the blinds, a raise or bet amount, the contributions and the deltas
+FORMATS = {
+    1: (struct.Struct('<HH'), struct.Struct('<H'), struct.Struct('<HH'), struct.Struct('<hh')),
+    2: (struct.Struct('<II'), struct.Struct('<I'), struct.Struct('<II'), struct.Struct('<ii')),
+}
+BLINDS, AMOUNT, CONTRIBUTIONS, DELTAS = FORMATS[VERSION]
+
+
+def encode_cards(cards):
+    '''
+    Packs cards, given as anything whose str() is like 'As', into bytes.
+    '''
+    return bytes(CARD_CODES[str(card)] for card in cards)
+
+
+def decode_cards(data):
+    '''
+    Unpacks card bytes into card strings.
+    '''
+    return [CARDS[code] for code in data]
+
+
+class BinaryLogWriter():
+    '''
+    Writes one game as binary records. A round's record is written when the next round starts.
+    Given the offset of a checkpoint, the log is cut back to it and continued after round_num.
+    '''
+
+    def __init__(self, filename, name_1, name_2, small_blind, big_blind, offset=None, round_num=0):
+        self.names = [name_1, name_2]
+        self.round_num = round_num
+        self.seats = None
+        self.round = None
+        if offset is not None:
+            self.log_file = open(filename, 'r+b')
+            self.log_file.truncate(offset)
+            self.log_file.seek(offset)
+            return
+        self.log_file = open(filename, 'wb')
+        header = bytes([VERSION]) + BLINDS.pack(small_blind, big_blind)
+        for name in self.names:
+            encoded = name.encode()
+            header += bytes([len(encoded)]) + encoded
+        self.write_record(HEADER, MAGIC + header)
+
+    def write_record(self, kind, payload):
+        '''
+        Appends one framed record to the file.
+        '''
+        self.log_file.write(RECORD.pack(kind, len(payload)))
+        self.log_file.write(payload)
+
+    def flush_round(self):
+        '''
+        Writes the round in progress, if there is one.
+        '''
+        if self.round is not None:
+            self.write_record(ROUND, bytes(self.round))
+            self.round = None
+
+    def start_round(self, players, hands):
+        '''
+        Opens the record of a new round, given the players in seat order and their hole cards.
+        '''
+        self.flush_round()
+        self.round_num += 1
+        self.seats = {player.name: seat for seat, player in enumerate(players)}
+        cards = encode_cards(hands[0] + hands[1])
+        self.round = bytearray(ROUND_START.pack(self.round_num, self.names.index(players[0].name),
+                                                players[0].bankroll, players[1].bankroll, *cards))
+
+    def action(self, name, code, bet_override):
+        '''
+        Records an action, given in its protocol code such as 'K' or 'R10'.
+        '''
+        kind = 'B' if code[0] == 'R' and bet_override else code[0]
+        self.round.append(ACTIONS.index(kind) | self.seats[name] << 3)
+        if kind in 'RB':
+            self.round += AMOUNT.pack(int(code[1:]))
+
+    def street(self, board, contributions, hands=None):
+        '''
+        Records a new street, and the hole cards after its swap if there was one.
+        '''
+        self.round.append(STREET)
+        self.round.append(len(board))
+        self.round += encode_cards(board) + CONTRIBUTIONS.pack(*contributions)
+        if hands is not None:
+            self.round.append(HANDS)
+            self.round += encode_cards(hands[0] + hands[1])
+
+    def end_round(self, showdown, deltas):
+        '''
+        Records the showdown, if any, and the award.
+        '''
+        if showdown:
+            self.round.append(SHOWDOWN)
+        self.round.append(AWARD)
+        self.round += DELTAS.pack(*deltas)
+
+    def checkpoint(self):
+        '''
+        Writes any round in progress and returns the offset the log can be resumed from.
+        '''
+        self.flush_round()
+        self.log_file.flush()
+        return self.log_file.tell()
+
+    def text(self, line):
+        '''
+        Records a free text line. Outside a round it is dropped.
+        '''
+        if self.round is not None:
+            encoded = line.encode()[:65535]
+            self.round.append(TEXT)
+            self.round += struct.pack('<H', len(encoded)) + encoded
+
+    def final(self, players):
+        '''
+        Records the final bankrolls, given the players in seat order.
+        '''
+        self.flush_round()
+        self.write_record(FINAL, FINAL_RECORD.pack(self.names.index(players[0].name),
+                                                   players[0].bankroll, players[1].bankroll))
+
+    def close(self):
+        '''
+        Writes any round in progress and closes the file.
+        '''
+        self.flush_round()
+        self.log_file.close()
+
+
+def records(buffer):
+    '''
+    Yields the kind and payload of every record in a buffer, without copying.
+    '''
+    view = memoryview(buffer)
+    offset = 0
+    while offset + RECORD.size <= len(view):
+        kind, length = RECORD.unpack_from(view, offset)
+        offset += RECORD.size
+        yield kind, view[offset:offset + length]
+        offset += length
+
+
+def open_log(filename):
+    '''
+    Maps a binary log into memory, returning a read-only buffer.
+    '''
+    with open(filename, 'rb') as log_file:
+        if log_file.seek(0, 2) == 0:
+            return b''
+        return mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def render_header(payload):
+    '''
+    Decodes a HEADER record into the format version, the blinds and player names.
+    '''
+    if bytes(payload[:4]) != MAGIC:
+        raise ValueError('not a binary game log')
+    version = payload[4]
+    if version not in FORMATS:
+        raise ValueError('unsupported binary game log version {}'.format(version))
+    blinds = FORMATS[version][0]
+    small_blind, big_blind = blinds.unpack_from(payload, 5)
+    names = []
+    offset = 5 + blinds.size
+    for _ in range(2):
+        length = payload[offset]
+        names.append(bytes(payload[offset + 1:offset + 1 + length]).decode())
+        offset += 1 + length
+    return version, small_blind, big_blind, names
+
+
+def render_round(payload, small_blind, big_blind, names, version=VERSION):
+    '''
+    Renders a ROUND record of the given format version as the lines gamelog.txt would hold for it.
+    '''
+    _, amount_format, contributions_format, deltas_format = FORMATS[version]
+    round_num, first, bankroll_1, bankroll_2, *cards = ROUND_START.unpack_from(payload)
+    seated = [names[first], names[1 - first]]
+    hands = [decode_cards(cards[:2]), decode_cards(cards[2:])]
+    lines = ['', 'Round #{}, {} ({}), {} ({})'.format(round_num, seated[0], bankroll_1, seated[1], bankroll_2),
+             '{} posts the blind of {}'.format(seated[0], small_blind),
+             '{} posts the blind of {}'.format(seated[1], big_blind),
+             '{} dealt [{}]'.format(seated[0], ' '.join(hands[0])),
+             '{} dealt [{}]'.format(seated[1], ' '.join(hands[1]))]
+    offset = ROUND_START.size
+    while offset < len(payload):
+        opcode = payload[offset]
+        offset += 1
+        if opcode < STREET:
+            name = seated[opcode >> 3]
+            kind = ACTIONS[opcode & 7]
+            if kind == 'F':
+                lines.append(name + ' folds')
+            elif kind == 'C':
+                lines.append(name + ' calls')
+            elif kind == 'K':
+                lines.append(name + ' checks')
+            else:
+                amount, = amount_format.unpack_from(payload, offset)
+                offset += amount_format.size
+                lines.append(name + (' bets ' if kind == 'B' else ' raises to ') + str(amount))
+        elif opcode == STREET:
+            count = payload[offset]
+            board = decode_cards(payload[offset + 1:offset + 1 + count])
+            contribution_1, contribution_2 = contributions_format.unpack_from(payload, offset + 1 + count)
+            offset += 1 + count + contributions_format.size
+            lines.append('{} [{}], {} ({}), {} ({})'.format(STREET_NAMES[count - 3], ' '.join(board),
+                                                           seated[0], contribution_1, seated[1], contribution_2))
+        elif opcode == HANDS:
+            hands = [decode_cards(payload[offset:offset + 2]), decode_cards(payload[offset + 2:offset + 4])]
+            offset += 4
+            lines.append("{}'s hand: [{}]".format(seated[0], ' '.join(hands[0])))
+            lines.append("{}'s hand: [{}]".format(seated[1], ' '.join(hands[1])))
+        elif opcode == SHOWDOWN:
+            lines.append('{} shows [{}]'.format(seated[0], ' '.join(hands[0])))
+            lines.append('{} shows [{}]'.format(seated[1], ' '.join(hands[1])))
+        elif opcode == AWARD:
+            delta_1, delta_2 = deltas_format.unpack_from(payload, offset)
+            offset += deltas_format.size
+            lines.append('{} awarded {}'.format(seated[0], delta_1))
+            lines.append('{} awarded {}'.format(seated[1], delta_2))
+        elif opcode == TEXT:
+            length, = struct.unpack_from('<H', payload, offset)
+            lines.append(bytes(payload[offset + 2:offset + 2 + length]).decode(errors='replace'))
+            offset += 2 + length
+        else:
+            raise ValueError('unknown opcode {:#x} in round {}'.format(opcode, round_num))
+    return lines
+
+
+def render(buffer):
+    '''
+    Yields the gamelog.txt lines of every game in a binary log.
+    '''
+    version, small_blind, big_blind, names = VERSION, 0, 0, ['A', 'B']
+    for kind, payload in records(buffer):
+        if kind == HEADER:
+            version, small_blind, big_blind, names = render_header(payload)
+            yield '6.176 MIT Pokerbots - ' + names[0] + ' vs ' + names[1]
+        elif kind == ROUND:
+            yield from render_round(payload, small_blind, big_blind, names, version)
+        elif kind == FINAL:
+            first, bankroll_1, bankroll_2 = FINAL_RECORD.unpack_from(payload)
+            yield ''
+            yield 'Final, {} ({}), {} ({})'.format(names[first], bankroll_1, names[1 - first], bankroll_2)
+
+
+def parse_args():
+    '''
+    Parses the binary log to convert and where to write the text.
+    '''
+    parser = argparse.ArgumentParser(prog='python3 binlog.py')
+    parser.add_argument('log', help='Binary game log')
+    parser.add_argument('-o', '--output', type=str, default=None, help='Text file to write, defaults to stdout')
+    return parser.parse_args()
+
+
+def main():
+    '''
+    Renders a binary game log in the gamelog.txt format.
+    '''
+    args = parse_args()
+    output = open(args.output, 'w') if args.output is not None else sys.stdout
+    separator = ''
+    for line in render(open_log(args.log)):
+        output.write(separator + line)
+        separator = '\n'
+    if args.output is not None:
+        output.close()
+
+
+if __name__ == '__main__':
+    main()
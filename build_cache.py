@@ -0,0 +1,218 @@
+'''
+Build cache for pokerbots with a build step in commands.json.
+
+Two layers keep repeated matches from recompiling:
+
+A build stamp in each bot directory records the hash of the bot's sources and
+build command, and the files its last build produced. While the sources are
+unchanged and those outputs still exist, the engine skips the build.
+
+An object cache, shared by every bot, holds compiled C and C++ objects keyed
+by their preprocessed source and code generation flags. CMake builds use it as
+their compiler launcher, so bot copies that differ only in src/main.cpp compile
+OMPEval and the skeleton once between them. Paths inside the bot directory are
+mapped to '.' in __FILE__, so the copies' objects are identical. CMake reads the
+launcher from the environment only when it first configures a build directory,
+so bots configured before the cache existed must pass it on their cmake command
+line, as the C++ skeleton's build.sh does, or delete build/CMakeCache.txt.
+
+Engines building the same bot at once, such as tournament workers, take turns
+under an exclusive lock on the bot directory.
+
+Usage as a compiler launcher: python build_cache.py COMPILER ARGS...
+'''
+from contextlib import contextmanager
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from config import BUILD_CACHE_DIR
+
+STAMP_FILENAME = '.build_stamp'
+# directories that hold build outputs or caches, never sources
+SKIPPED_DIRS = {'build', '__pycache__', '.git'}
+# flags that change the generated code without showing in the preprocessed source
+CODEGEN_FLAGS = ('-O', '-f', '-m', '-g', '-std', '-W', '-pthread')
+
+
+def cache_dir():
+    '''
+    Returns the absolute object cache directory. Relative settings are taken from the engine's directory.
+    '''
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.expanduser(BUILD_CACHE_DIR))
+
+
+def list_files(path, skipped=()):
+    '''
+    Returns the relative paths of the files under path, sorted, leaving out build output directories.
+    '''
+    files = []
+    for root, dirs, names in os.walk(path):
+        dirs[:] = [name for name in dirs if name not in SKIPPED_DIRS]
+        for name in names:
+            relative = os.path.relpath(os.path.join(root, name), path)
+            if relative != STAMP_FILENAME and relative not in skipped:
+                files.append(relative)
+    return sorted(files)
+
+
+def read_stamp(path):
+    '''
+    Returns the bot's build stamp, or None if it has none.
+    '''
+    try:
+        with open(os.path.join(path, STAMP_FILENAME), 'r') as stamp_file:
+            return json.load(stamp_file)
+    except (OSError, ValueError):
+        return None
+
+
+def source_hash(path, command):
+    '''
+    Hashes the build command and every source file of the bot, leaving out what its last build produced.
+    '''
+    stamp = read_stamp(path)
+    outputs = set(stamp['outputs']) if stamp is not None else set()
+    digest = hashlib.sha256(json.dumps(command).encode())
+    for relative in list_files(path, outputs):
+        digest.update(relative.encode() + b'\0')
+        with open(os.path.join(path, relative), 'rb') as source_file:
+            digest.update(hashlib.sha256(source_file.read()).digest())
+    return digest.hexdigest()
+
+
+def is_built(path, digest):
+    '''
+    Returns whether the bot's last build was of these sources and its outputs are all still there.
+    '''
+    stamp = read_stamp(path)
+    return (stamp is not None and stamp['hash'] == digest and
+            all(os.path.exists(os.path.join(path, output)) for output in stamp['outputs']))
+
+
+def snapshot(path):
+    '''
+    Returns the modification time of every file in the bot directory, build outputs included.
+    '''
+    times = {}
+    for root, _, names in os.walk(path):
+        for name in names:
+            filename = os.path.join(root, name)
+            times[os.path.relpath(filename, path)] = os.stat(filename).st_mtime_ns
+    return times
+
+
+def mark_built(path, digest, before):
+    '''
+    Records a successful build of the hashed sources, with the files it created or changed since the snapshot.
+    '''
+    after = snapshot(path)
+    outputs = sorted(name for name, mtime in after.items() if name != STAMP_FILENAME and before.get(name) != mtime)
+    with open(os.path.join(path, STAMP_FILENAME), 'w') as stamp_file:
+        json.dump({'hash': digest, 'outputs': outputs}, stamp_file)
+
+
+def lock_build(path):
+    '''
+    Blocks until this process holds the bot directory's build lock, and returns the descriptor holding it.
+    '''
+    handle = os.open(path, os.O_RDONLY)
+    fcntl.flock(handle, fcntl.LOCK_EX)
+    return handle
+
+
+def unlock_build(handle):
+    '''
+    Releases a build lock taken by lock_build.
+    '''
+    os.close(handle)
+
+
+@contextmanager
+def build_lock(path):
+    '''
+    Holds the bot directory's build lock, so concurrent engines never check or build the bot at the same time.
+    '''
+    handle = lock_build(path)
+    try:
+        yield
+    finally:
+        unlock_build(handle)
+
+
+def launcher():
+    '''
+    Returns the CMake compiler launcher that runs compiles through the object cache.
+    '''
+    return sys.executable + ';' + os.path.abspath(__file__)
+
+
+def launcher_missing(path):
+    '''
+    Returns whether the bot's CMake build directory was configured without this object cache as its launcher.
+    '''
+    try:
+        with open(os.path.join(path, 'build', 'CMakeCache.txt'), 'r') as cmake_cache:
+            entries = [line.strip() for line in cmake_cache if line.startswith('CMAKE_CXX_COMPILER_LAUNCHER:')]
+    except OSError:
+        return False
+    return BUILD_CACHE_DIR is not None and not any(entry.endswith('=' + launcher()) for entry in entries)
+
+
+def build_env(path):
+    '''
+    Returns the environment for a bot's build command, with this module as the CMake compiler launcher.
+    '''
+    env = dict(os.environ)
+    if BUILD_CACHE_DIR is not None:
+        env.setdefault('CMAKE_C_COMPILER_LAUNCHER', launcher())
+        env.setdefault('CMAKE_CXX_COMPILER_LAUNCHER', launcher())
+        env['POKERBOTS_BOT_DIR'] = os.path.abspath(path)
+    return env
+
+
+def compile_cached(command):
+    '''
+    Runs one compiler command through the object cache and returns its exit status.
+    Only single-source compiles to an object file are cached; links and everything else run as is.
+    '''
+    if (BUILD_CACHE_DIR is None or '-c' not in command or '-o' not in command or
+            command.index('-o') + 1 >= len(command)):
+        return subprocess.call(command)
+    bot_dir = os.environ.get('POKERBOTS_BOT_DIR')
+    if bot_dir is not None:
+        command = command[:1] + ['-fmacro-prefix-map={}=.'.format(bot_dir)] + command[1:]
+    output = command[command.index('-o') + 1]
+    # the preprocessed source also carries the include files and macros, and -MD still writes the depfile
+    preprocess = [arg for arg in command if arg != '-c']
+    preprocess[preprocess.index('-o') + 1] = '-'
+    proc = subprocess.run(preprocess + ['-E', '-P'], stdout=subprocess.PIPE)
+    if proc.returncode != 0:
+        return subprocess.call(command)
+    digest = hashlib.sha256(os.path.basename(command[0]).encode())
+    for arg in command[1:]:
+        if arg.startswith(CODEGEN_FLAGS) and not arg.startswith('-fmacro-prefix-map'):
+            digest.update(arg.encode() + b'\0')
+    digest.update(proc.stdout)
+    cached = os.path.join(cache_dir(), digest.hexdigest() + '.o')
+    if os.path.exists(cached):
+        shutil.copyfile(cached, output)
+        return 0
+    status = subprocess.call(command)
+    if status == 0:
+        os.makedirs(cache_dir(), exist_ok=True)
+        # publish atomically, so concurrent builds never see a partial object
+        handle, temporary = tempfile.mkstemp(dir=cache_dir(), suffix='.tmp')
+        os.close(handle)
+        shutil.copyfile(output, temporary)
+        os.replace(temporary, cached)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(compile_cached(sys.argv[1:]))
@@ -0,0 +1,83 @@
+'''
+Runs bots straight from their .zip bundles.
+
+A bot path ending in .zip is extracted once into BOT_CACHE_DIR, under a
+directory named for the bundle and the hash of its contents, and the bot
+directory inside it (the one holding commands.json) is used in its place.
+Later runs find the extraction, and its build stamp, already there, so every
+version of a bot is extracted and built at most once.
+'''
+import hashlib
+import os
+import shutil
+import tempfile
+import zipfile
+
+from config import BOT_CACHE_DIR
+
+# extractions already resolved by this process, by bundle path, size and modification time
+RESOLVED = {}
+
+
+def cache_dir():
+    '''
+    Returns the absolute extraction cache directory. Relative settings are taken from the engine's directory.
+    '''
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.expanduser(BOT_CACHE_DIR))
+
+
+def bundle_hash(path):
+    '''
+    Returns the hash of a bundle's bytes.
+    '''
+    digest = hashlib.sha256()
+    with open(path, 'rb') as bundle_file:
+        for block in iter(lambda: bundle_file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def find_bot_dir(root):
+    '''
+    Returns the shallowest directory under root holding a commands.json, or root if there is none.
+    '''
+    found = []
+    for directory, dirs, names in os.walk(root):
+        dirs[:] = [name for name in dirs if name != '__MACOSX']
+        if 'commands.json' in names:
+            found.append(directory)
+    return min(found, key=lambda directory: directory.count(os.sep)) if found else root
+
+
+def extract(path, target):
+    '''
+    Extracts a bundle to target, atomically, so concurrent runs never see a partial extraction.
+    '''
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    temporary = tempfile.mkdtemp(dir=os.path.dirname(target), prefix='.extract-')
+    try:
+        with zipfile.ZipFile(path) as bundle:
+            bundle.extractall(temporary)
+        os.rename(temporary, target)
+    except OSError:
+        if not os.path.isdir(target):  # unless another run extracted it first
+            raise
+    finally:
+        shutil.rmtree(temporary, ignore_errors=True)
+
+
+def resolve_bot(path):
+    '''
+    Returns the bot directory for a bot path, extracting it first if it is a .zip bundle.
+    '''
+    if not path.endswith('.zip') or not os.path.isfile(path):
+        return path
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in RESOLVED:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        target = os.path.join(cache_dir(), '{}-{}'.format(stem, bundle_hash(path)[:16]))
+        if not os.path.isdir(target):
+            extract(path, target)
+        RESOLVED[key] = find_bot_dir(target)
+    return RESOLVED[key]
@@ -5,15 +5,54 @@ PLAYER_1_PATH = './ourbot_v1'
 # NO TRAILING SLASHES ARE ALLOWED IN PATHS
 PLAYER_2_NAME = 'B'
 PLAYER_2_PATH = './ourbot_v1_not_scared'
+# A PLAYER PATH MAY ALSO BE A .zip BUNDLE, EXTRACTED ONCE INTO BOT_CACHE_DIR, RELATIVE TO THE ENGINE
+BOT_CACHE_DIR = '.bot_cache'
+# league.py CACHES EVERY MATCH RESULT HERE, BY THE CONTENTS OF BOTH BOTS, RELATIVE TO THE ENGINE
+LEAGUE_CACHE_DIR = '.league_cache'
 # GAME PROGRESS IS RECORDED HERE
 GAME_LOG_FILENAME = 'gamelog'
+# GAME_LOG_VERBOSITY IS 'full', 'summary' (ROUND RESULTS AND ERRORS ONLY) OR 'none'
+GAME_LOG_VERBOSITY = 'full'
+# BINARY_LOG ALSO WRITES A COMPACT GAMELOG.BIN, RENDER IT AS TEXT WITH binlog.py
+BINARY_LOG = False
+# LATENCY_REPORT WRITES EACH PLAYER'S RESPONSE TIME PERCENTILES TO GAMELOG.LATENCY.JSON
+LATENCY_REPORT = False
+# CHECKPOINT_ROUNDS SAVES THE MATCH TO GAMELOG.CHECKPOINT.JSON EVERY SO MANY ROUNDS, 0 TO DISABLE
+# RUN python engine.py --resume TO CONTINUE A KILLED OR CRASHED MATCH FROM ITS LAST CHECKPOINT
+# RESTARTED BOTS ARE TOLD THE ROUND AND BANKROLL THEY RESUME AT, BUT ANY OTHER MEMORY OF EARLIER ROUNDS IS LOST
+# A RESUMED MATCH APPENDS TO THE BOTS' OUTPUT FILES, AND CANNOT RUN WITH WARM_POOL
+CHECKPOINT_ROUNDS = 0
+# PIN_CPUS PINS THE ENGINE TO THE FIRST CPU LISTED AND EACH BOT TO ONE OF THE NEXT, E.G. [1, 2, 3]
+# PINNED MATCHES ALSO RECORD EACH BOT'S CPU TIME PER QUERY IN THE LATENCY REPORT, NONE TO DISABLE
+PIN_CPUS = None
+# QUERIES WHOSE CPU AND WALL TIMES DIFFER BY OVER A MILLISECOND AND THIS FRACTION OF THE WALL TIME ARE FLAGGED
+CPU_DIVERGENCE = 0.5
 # PLAYER_LOG_SIZE_LIMIT IS IN BYTES
 PLAYER_LOG_SIZE_LIMIT = 524288
 # STARTING_GAME_CLOCK AND TIMEOUTS ARE IN SECONDS
 ENFORCE_GAME_CLOCK = True
 STARTING_GAME_CLOCK = 30.
 BUILD_TIMEOUT = 10.
+# BUILD_CACHE SKIPS A BOT'S BUILD WHILE ITS SOURCES ARE UNCHANGED SINCE ITS LAST BUILD
+BUILD_CACHE = False
+# COMPILED OBJECTS ARE SHARED ACROSS BOTS THROUGH THIS DIRECTORY, RELATIVE TO THE ENGINE, E.G. '.build_cache', NONE TO DISABLE
+BUILD_CACHE_DIR = None
 CONNECT_TIMEOUT = 10.
+# TRANSPORT IS ONE OF 'tcp', 'tcp_nodelay', 'unix' OR 'socketpair'
+# BOTS WITHOUT 'unix' OR 'socketpair' IN THEIR commands.json PROTOCOL FALL BACK TO 'tcp'
+TRANSPORT = 'tcp'
+# BOTS WITH 'pipeline' IN THEIR commands.json PROTOCOL GET THEIR END-OF-ROUND CLAUSES
+# WITH THE NEXT ROUND'S FIRST MESSAGE INSTEAD OF ACKING EVERY ROUND
+PIPELINE_ACKS = False
+# WARM_POOL KEEPS BOTS WITH 'newgame' IN THEIR commands.json PROTOCOL RUNNING BETWEEN THE MATCHES
+# OF ONE ENGINE PROCESS, SUCH AS A TOURNAMENT WORKER, INSTEAD OF REBUILDING AND RELAUNCHING THEM
+WARM_POOL = False
+# HEADLESS RUNS PYTHON BOTS INSIDE THE ENGINE PROCESS, WITHOUT SOCKETS
+# USE ONLY FOR TUNING - CERTIFICATION RUNS MUST USE THE SOCKET ENGINE
+HEADLESS = False
+# DEAL_SEED FIXES EVERY DEAL AND SWAP OF THE MATCH, NONE SHUFFLES FRESH EACH ROUND
+# REPLAY THE SAME SEED WITH THE PLAYERS EXCHANGED FOR DUPLICATE POKER
+DEAL_SEED = None
 # THE GAME VARIANT FIXES THE PARAMETERS BELOW
 # CHANGE ONLY FOR TRAINING OR EXPERIMENTATION
 FLOP_PERCENT = 0.1
@@ -1,14 +1,25 @@
 #pragma once
 
 #include <array>
+#include <cstdlib>
 #include <string>
 #include <utility>
 
 namespace pokerbots::skeleton {
 
-inline constexpr int NUM_ROUNDS = 1000;
-inline constexpr int STARTING_STACK = 200;
-inline constexpr int BIG_BLIND = 2;
-inline constexpr int SMALL_BLIND = 1;
+// the engine passes the match's game parameters if they differ from the standard variant
+inline int envInt(char const *name, int fallback) {
+  char const *value = std::getenv(name);
+  return value != nullptr ? std::atoi(value) : fallback;
+}
+
+inline const int NUM_ROUNDS = envInt("POKERBOTS_NUM_ROUNDS", 1000);
+inline const int STARTING_STACK = envInt("POKERBOTS_STARTING_STACK", 200);
+inline const int BIG_BLIND = envInt("POKERBOTS_BIG_BLIND", 2);
+inline const int SMALL_BLIND = envInt("POKERBOTS_SMALL_BLIND", 1);
+
+// a match resumed from a checkpoint restarts its pokerbots at the round and bankroll it picks up from
+inline const int FIRST_ROUND = envInt("POKERBOTS_FIRST_ROUND", 1);
+inline const int FIRST_BANKROLL = envInt("POKERBOTS_FIRST_BANKROLL", 0);
 
 } // namespace pokerbots::skeleton
@@ -1,6 +1,7 @@
 #pragma once
 
 #include <charconv>
+#include <functional>
 #include <iostream>
 #include <optional>
 #include <string>
@@ -8,6 +9,7 @@
 
 #include <boost/algorithm/string.hpp>
 #include <boost/asio/ip/tcp.hpp>
+#include <boost/asio/local/stream_protocol.hpp>
 
 #include <fmt/format.h>
 #include <fmt/ostream.h>
@@ -21,8 +23,9 @@ namespace pokerbots::skeleton {
 
 template <typename BotType> class Runner {
 private:
-  BotType pokerbot;
-  boost::asio::ip::tcp::iostream &stream;
+  std::optional<BotType> pokerbot;
+  std::function<void()> newBot;
+  std::iostream &stream;
 
   template <typename Action> void send(Action const& action) {
     std::string code;
@@ -42,13 +45,19 @@ private:
 
 public:
   template <typename... Args>
-  Runner(boost::asio::ip::tcp::iostream &stream, Args... args)
-      : pokerbot(std::forward<Args>(args)...), stream(stream) {}
-
-  ~Runner() { stream.close(); }
+  Runner(std::iostream &stream, Args... args)
+      : stream(stream) {
+    newBot = [this, args...]() { pokerbot.emplace(args...); };
+    newBot();
+  }
 
+  /*
+    Plays the engine's games until Q or until the engine disconnects. A message
+    ending in N ends the game without a response, and the next message starts a
+    new game with a freshly constructed bot.
+  */
   void run() {
-    GameInfoPtr gameInfo = std::make_shared<GameInfo>(0, 0.0, 1);
+    GameInfoPtr gameInfo = std::make_shared<GameInfo>(FIRST_BANKROLL, 0.0, FIRST_ROUND);
     StatePtr roundState = std::make_shared<RoundState>(
         0, 0, std::array<int, 2>{0, 0}, std::array<int, 2>{0, 0},
         std::array<std::array<std::string, 2>, 2>{}, std::array<std::string, 5>{},
@@ -57,6 +66,10 @@ public:
     bool roundFlag = true;
     while (true) {
       auto packet = receive();
+      if (!stream) {
+        return;
+      }
+      bool newGame = false;
       for (const auto &clause : packet) {
         auto leftover = clause.substr(1);
         switch (clause[0]) {
@@ -82,7 +95,7 @@ public:
             roundState = std::make_shared<RoundState>(
                 0, 0, std::move(pips), std::move(stacks), std::move(hands), std::move(deck), nullptr);
             if (roundFlag) {
-              pokerbot.handleNewRound(
+              pokerbot->handleNewRound(
                   gameInfo,
                   std::static_pointer_cast<const RoundState>(roundState), active);
               roundFlag = false;
@@ -154,7 +167,7 @@ public:
                     ->previousState);
             gameInfo = std::make_shared<GameInfo>(
                 gameInfo->bankroll + delta, gameInfo->gameClock, gameInfo->roundNum);
-            pokerbot.handleRoundOver(
+            pokerbot->handleRoundOver(
                 gameInfo,
                 std::static_pointer_cast<const TerminalState>(roundState),
                 active);
@@ -163,6 +176,14 @@ public:
             roundFlag = true;
             break;
           }
+          case 'N': {
+            newBot();
+            gameInfo = std::make_shared<GameInfo>(0, 0.0, 1);
+            active = 0;
+            roundFlag = true;
+            newGame = true;
+            break;
+          }
           case 'Q': {
             return;
           }
@@ -171,52 +192,100 @@ public:
           }
         }
       }
+      if (newGame) {
+        continue;
+      }
       if (roundFlag) {
         send(Action {Action::Type::CHECK});
       } else {
-        auto action = pokerbot.getAction(gameInfo, std::static_pointer_cast<const RoundState>(roundState), active);
+        auto action = pokerbot->getAction(gameInfo, std::static_pointer_cast<const RoundState>(roundState), active);
         send(action);
       }
     }
   }
 };
 
-template <typename BotType, typename... Args>
-void runBot(std::string &host, std::string &port, Args... args) {
-  boost::asio::ip::tcp::iostream stream;
-  stream.connect(host, port);
-  // set TCP_NODELAY on the stream
-  boost::asio::ip::tcp::no_delay option(true);
-  stream.rdbuf()->set_option(option);
-  if (!stream) {
-    fmt::print(std::cerr, FMT_STRING("Unable to connect to {}:{}"), host, port);
-    return;
+/*
+  Where to reach the engine: a TCP host and port, a Unix domain socket path,
+  or a socket descriptor inherited from the engine (fd >= 0).
+*/
+struct Connection {
+  std::string host = "localhost";
+  std::string port;
+  std::string unixPath;
+  int fd = -1;
+};
+
+template <typename BotType, typename Stream, typename... Args>
+void runOnStream(Stream &stream, Args... args) {
+  {
+    auto r = Runner<BotType>(stream, std::forward<Args>(args)...);
+    r.run();
   }
+  stream.close();
+}
 
-  auto r = Runner<BotType>(stream, std::forward<Args>(args)...);
-  r.run();
+template <typename BotType, typename... Args>
+void runBot(Connection const& connection, Args... args) {
+  if (connection.fd >= 0) {
+    boost::asio::local::stream_protocol::iostream stream;
+    stream.socket().assign(boost::asio::local::stream_protocol(), connection.fd);
+    runOnStream<BotType>(stream, std::forward<Args>(args)...);
+  } else if (!connection.unixPath.empty()) {
+    boost::asio::local::stream_protocol::iostream stream;
+    stream.connect(boost::asio::local::stream_protocol::endpoint(connection.unixPath));
+    if (!stream) {
+      fmt::print(std::cerr, FMT_STRING("Unable to connect to {}"), connection.unixPath);
+      return;
+    }
+    runOnStream<BotType>(stream, std::forward<Args>(args)...);
+  } else {
+    boost::asio::ip::tcp::iostream stream;
+    stream.connect(connection.host, connection.port);
+    if (!stream) {
+      fmt::print(std::cerr, FMT_STRING("Unable to connect to {}:{}"), connection.host, connection.port);
+      return;
+    }
+    // the engine asks for TCP_NODELAY only under its tcp_nodelay transport
+    if (envInt("POKERBOTS_TCP_NODELAY", 0) == 1) {
+      boost::asio::ip::tcp::no_delay option(true);
+      stream.rdbuf()->set_option(option);
+    }
+    runOnStream<BotType>(stream, std::forward<Args>(args)...);
+  }
 }
 
-inline std::array<std::string, 2> parseArgs(int argc, char *argv[]) {
-  std::string host = "localhost";
-  int port;
+inline Connection parseArgs(int argc, char *argv[]) {
+  Connection connection;
 
   bool host_flag = false;
+  bool unix_flag = false;
+  bool fd_flag = false;
   for (int i = 1; i < argc; i++) {
     std::string arg(argv[i]);
     if ((arg == "-h") | (arg == "--host")) {
       host_flag = true;
+    } else if (arg == "--unix") {
+      unix_flag = true;
+    } else if (arg == "--fd") {
+      fd_flag = true;
     } else if (arg == "--port") {
       // nothing to do
     } else if (host_flag) {
-      host = arg;
+      connection.host = arg;
       host_flag = false;
+    } else if (unix_flag) {
+      connection.unixPath = arg;
+      unix_flag = false;
+    } else if (fd_flag) {
+      connection.fd = std::stoi(arg);
+      fd_flag = false;
     } else {
-      port = std::stoi(arg);
+      connection.port = std::to_string(std::stoi(arg));
     }
   }
 
-  return {host, std::to_string(port)};
+  return connection;
 }
 
 } // namespace pokerbots::skeleton
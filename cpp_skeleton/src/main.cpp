@@ -73,7 +73,7 @@ struct Bot {
   Main program for running a C++ pokerbot.
 */
 int main(int argc, char *argv[]) {
-  auto [host, port] = parseArgs(argc, argv);
-  runBot<Bot>(host, port);
+  auto connection = parseArgs(argc, argv);
+  runBot<Bot>(connection);
   return 0;
 }
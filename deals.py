@@ -0,0 +1,240 @@
+'''
+Seeded, pre-generated deal schedules for reproducible and duplicate matches.
+
+A Deal fixes everything the cards can do in one round: the deck order (hole
+cards first, then swap replacements and board cards in the order the engine
+deals them) and the uniform rolls that decide each hole-card swap on the flop
+and on the turn. Whatever the bots do, the same Deal produces the same hands,
+swaps and board, so a schedule can be replayed with the seats exchanged.
+
+IntDeck and swap_mask implement the engine's deck and hole-card swaps on
+int-coded cards (indices into CARDS). Run this file to check that swap_mask
+draws swaps with exactly the probabilities of the per-card random.random()
+rolls it replaces, that IntDeck swaps cards like eval7.Deck, and that the
+engine's rounds deal nine distinct cards down to the river.
+'''
+from array import array
+from collections import namedtuple
+import argparse
+import random
+
+RANKS = '23456789TJQKA'
+SUITS = 'cdhs'
+CARDS = [rank + suit for suit in SUITS for rank in RANKS]
+CARD_CODES = {card: code for code, card in enumerate(CARDS)}
+
+# random.random() is a uniform 53-bit integer scaled by 2**-53, so a roll below p
+# is a 53-bit draw below p * 2**53, and one getrandbits call can make all four
+ROLL_BITS = 53
+ROLL_MASK = (1 << ROLL_BITS) - 1
+ROLL_SCALE = float(1 << ROLL_BITS)
+# at most four hole cards are returned to the deck on each of the flop and the turn
+RETURNED_CARDS = 8
+
+Deal = namedtuple('Deal', ['cards', 'flop_rolls', 'turn_rolls'])
+
+
+def generate_deal(rng):
+    '''
+    Draws one round's deck order and swap rolls from the given random.Random.
+    '''
+    cards = list(CARDS)
+    rng.shuffle(cards)
+    flop_rolls = tuple(rng.random() for _ in range(4))
+    turn_rolls = tuple(rng.random() for _ in range(4))
+    return Deal(cards, flop_rolls, turn_rolls)
+
+
+def swap_mask(percent, rng=random, rolls=None):
+    '''
+    Returns which of the four hole cards swap on a street, as bit i for hole card i
+    (player i // 2, card i % 2). Uses the scheduled rolls if given, otherwise
+    draws all four rolls with one getrandbits call.
+    '''
+    mask = 0
+    if rolls is not None:
+        for i in range(4):
+            if rolls[i] < percent:
+                mask |= 1 << i
+        return mask
+    bits = rng.getrandbits(4 * ROLL_BITS)
+    threshold = percent * ROLL_SCALE
+    for i in range(4):
+        if bits & ROLL_MASK < threshold:
+            mask |= 1 << i
+        bits >>= ROLL_BITS
+    return mask
+
+
+class IntDeck():
+    '''
+    A deck of int-coded cards: a preshuffled array dealt from a cursor, followed by
+    a region where swapped-out hole cards are returned, as eval7.Deck appends them.
+    A round never deals far enough to reach the returned cards.
+    '''
+    __slots__ = ['cards', 'cursor', 'end']
+
+    def __init__(self, order):
+        self.cards = array('B', order)
+        self.cards.extend(bytes(RETURNED_CARDS))
+        self.cursor = 0
+        self.end = len(order)
+
+    @classmethod
+    def shuffled(cls, rng=random):
+        '''
+        Returns a freshly shuffled deck.
+        '''
+        order = list(range(len(CARDS)))
+        rng.shuffle(order)
+        return cls(order)
+
+    def copy(self):
+        '''
+        Returns an independent copy of this deck.
+        '''
+        deck = IntDeck.__new__(IntDeck)
+        deck.cards = self.cards[:]
+        deck.cursor = self.cursor
+        deck.end = self.end
+        return deck
+
+    def fork(self):
+        '''
+        Returns a deck that deals on from this one's position without copying the cards.
+        Dealing never reads the returned region, so cards a fork puts back cannot change what another fork deals.
+        '''
+        deck = IntDeck.__new__(IntDeck)
+        deck.cards = self.cards
+        deck.cursor = self.cursor
+        deck.end = self.end
+        return deck
+
+    def deal(self):
+        '''
+        Deals the next card.
+        '''
+        card = self.cards[self.cursor]
+        self.cursor += 1
+        return card
+
+    def put(self, card):
+        '''
+        Returns a card to the bottom of the deck.
+        '''
+        self.cards[self.end] = card
+        self.end += 1
+
+
+class DealSchedule():
+    '''
+    The deals for every round of a match, generated up front from one seed.
+    '''
+
+    def __init__(self, seed, num_rounds):
+        self.seed = seed
+        rng = random.Random(seed)
+        self.deals = [generate_deal(rng) for _ in range(num_rounds)]
+
+    def __len__(self):
+        return len(self.deals)
+
+    def deal(self, round_num):
+        '''
+        Returns the Deal for a round, numbered from 1 like the engine's rounds.
+        '''
+        return self.deals[round_num - 1]
+
+
+def swap_chi_square(percent, trials, rng=random):
+    '''
+    Tests swap_mask against the exact distribution of four independent swaps with probability percent.
+    Masks of three or four swaps are pooled so every cell expects enough draws.
+    Returns the chi-square statistic and its degrees of freedom.
+    '''
+    counts = [0] * 16
+    for _ in range(trials):
+        counts[swap_mask(percent, rng)] += 1
+    cells = {}
+    for mask in range(16):
+        swaps = bin(mask).count('1')
+        probability = percent ** swaps * (1 - percent) ** (4 - swaps)
+        key = mask if swaps < 3 else 'pooled'
+        observed, expected = cells.get(key, (0, 0.))
+        cells[key] = (observed + counts[mask], expected + probability * trials)
+    statistic = sum((observed - expected) ** 2 / expected for observed, expected in cells.values())
+    return statistic, len(cells) - 1
+
+
+def check_deck(trials, rng=random):
+    '''
+    Checks IntDeck swaps against eval7.Deck semantics, replayed on a plain list:
+    each swap deals the top card and appends the old hole card to the bottom.
+    Returns the number of mismatching trials.
+    '''
+    mismatches = 0
+    for _ in range(trials):
+        order = list(range(len(CARDS)))
+        rng.shuffle(order)
+        deck, reference = IntDeck(order), list(order)
+        hands, reference_hands = [deck.deal() for _ in range(4)], reference[:4]
+        del reference[:4]
+        for street in range(2):
+            mask = rng.randrange(16)
+            for i in range(4):
+                if mask >> i & 1:
+                    card = deck.deal()
+                    deck.put(hands[i])
+                    hands[i] = card
+                    reference.append(reference_hands[i])
+                    reference_hands[i] = reference.pop(0)
+            board, reference_board = [deck.deal() for _ in range(3 - 2 * street)], reference[:3 - 2 * street]
+            del reference[:3 - 2 * street]
+            if hands != reference_hands or board != reference_board:
+                mismatches += 1
+                break
+        else:
+            if list(deck.cards[deck.cursor:deck.end]) != reference:
+                mismatches += 1
+    return mismatches
+
+
+def check_rounds(trials, rng=random):
+    '''
+    Plays scheduled deals to the river on the engine's RoundState, with frequent swaps.
+    A round is bad if its hands and board are not nine distinct cards, or if
+    replaying the turn from the flop's state deals a different turn card.
+    Returns the number of bad rounds.
+    '''
+    from engine import CallAction, CheckAction, EVAL_CARDS, RoundState, default_config
+    config = default_config(flop_percent=0.5, turn_percent=0.5)
+    bad = 0
+    for _ in range(trials):
+        deal = generate_deal(rng)
+        deck = IntDeck([CARD_CODES[card] for card in deal.cards])
+        hands = [[EVAL_CARDS[deck.deal()] for _ in range(2)] for _ in range(2)]
+        stacks = [config.starting_stack - config.small_blind, config.starting_stack - config.big_blind]
+        state = RoundState(0, 0, [config.small_blind, config.big_blind], stacks, hands, ([], deck, deal), None, config)
+        flop = state.proceed(CallAction()).proceed(CheckAction())
+        turn = flop.proceed(CheckAction()).proceed(CheckAction())
+        river = turn.proceed(CheckAction()).proceed(CheckAction())
+        cards = [str(card) for card in river.hands[0] + river.hands[1] + river.deck[0]]
+        replayed = flop.proceed(CheckAction()).proceed(CheckAction())
+        if len(set(cards)) != 9 or replayed.deck[0] != turn.deck[0]:
+            bad += 1
+    return bad
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python3 deals.py')
+    parser.add_argument('--trials', type=int, default=200000, help='Swap masks drawn per swap probability')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed')
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    critical = 31.26  # 0.1% critical value of the chi-square distribution with 11 degrees of freedom
+    for percent in (0.1, 0.05):
+        statistic, dof = swap_chi_square(percent, args.trials, rng)
+        verdict = 'ok' if statistic < critical else 'MISMATCH'
+        print('swap_mask p={}: chi-square {:.2f} on {} dof ({})'.format(percent, statistic, dof, verdict))
+    print('IntDeck mismatches against eval7.Deck semantics:', check_deck(args.trials // 10, rng))
+    print('Rounds dealing repeated cards:', check_rounds(args.trials // 100, rng))
@@ -2,13 +2,19 @@
 6.176 MIT POKERBOTS GAME ENGINE
 DO NOT REMOVE, RENAME, OR EDIT THIS FILE
 '''
-from collections import namedtuple
-from threading import Thread
-from queue import Queue
+from collections import namedtuple, deque
+from contextlib import redirect_stdout
+from threading import Thread, Lock
+import importlib
+import argparse
+import atexit
+import traceback
 import time
 import json
 import subprocess
 import socket
+import shutil
+import tempfile
 import eval7
 import sys
 import os
@@ -16,6 +22,12 @@ import random
 
 sys.path.append(os.getcwd())
 from config import *
+from deals import CARDS, CARD_CODES, DealSchedule, IntDeck, swap_mask
+from binlog import BinaryLogWriter
+from latency import LatencyRecorder, write_latency_report
+from build_cache import source_hash, is_built, snapshot, mark_built, build_env, build_lock, launcher_missing
+from bundles import resolve_bot
+import pinning
 
 FoldAction = namedtuple('FoldAction', [])
 CallAction = namedtuple('CallAction', [])
@@ -30,6 +42,11 @@ CCARDS = lambda cards: ','.join(map(str, cards))
 PCARDS = lambda cards: '[{}]'.format(' '.join(map(str, cards)))
 PVALUE = lambda name, value: ', {} ({})'.format(name, value)
 STATUS = lambda players: ''.join([PVALUE(p.name, p.bankroll) for p in players])
+LAUNCHER_MISSING = 'build/CMakeCache.txt predates the object cache - delete it to share compiled objects'
+# every card the engine deals is one of these shared objects, looked up by its code in the IntDeck
+EVAL_CARDS = [eval7.Card(card) for card in CARDS]
+# unseeded deals and swaps draw from the engine's own generator, which in-process bots cannot advance
+SHUFFLER = random.Random()
 
 # Socket encoding scheme:
 #
@@ -51,23 +68,78 @@ STATUS = lambda players: ''.join([PVALUE(p.name, p.bankroll) for p in players])
 # The engine expects a response of K at the end of the round as an ack,
 # otherwise a response which encodes the player's action
 # Action history is sent once, including the player's actions
+#
+# Multi-table bots (async_engine.py --multitable) also understand:
+# G# the table a message belongs to, as the first clause of the message
+# Their responses start with the same G clause, and a tagged Q ends only that table
+#
+# TRANSPORT selects how the engine reaches the bot. 'tcp' and 'tcp_nodelay' append the
+# port to the run command; bots that list 'unix' or 'socketpair' under "protocol" in
+# commands.json can instead be given --unix PATH or an inherited socket as --fd N
+# Under 'tcp_nodelay' the bot is also launched with POKERBOTS_TCP_NODELAY=1, asking it
+# to disable Nagle's algorithm on its end of the connection
+#
+# Bots that list 'pipeline' under "protocol" are not queried for the K ack after a round.
+# The round's final action, O and D clauses are held back and sent after the T clause of
+# the next round's first message, or before the final Q
 
 
-def swap(player_card_index, hands, deck):
+def swap(mask, hands, deck):
     '''
-    Swaps player's card with a card from the deck.
+    Swaps the hole cards picked by the mask, in order, each for the top card of the deck.
     '''
-    card_index = player_card_index % len(hands)
-    player_index = player_card_index // len(hands)
-    random_card = deck.deal(1)
-    deck.cards.append(hands[player_index][card_index])
-    hands[player_index][card_index] = random_card[0]
+    for i in range(4):
+        if mask >> i & 1:
+            player_index, card_index = i // 2, i % 2
+            random_card = deck.deal()
+            deck.put(CARD_CODES[str(hands[player_index][card_index])])
+            hands[player_index][card_index] = EVAL_CARDS[random_card]
     return hands, deck
 
 
-class RoundState(namedtuple('_RoundState', ['button', 'street', 'pips', 'stacks', 'hands', 'deck', 'previous_state'])):
+MatchConfig = namedtuple('MatchConfig', ['player_1_name', 'player_1_path', 'player_2_name', 'player_2_path',
+                                         'num_rounds', 'starting_stack', 'big_blind', 'small_blind',
+                                         'flop_percent', 'turn_percent', 'starting_game_clock',
+                                         'enforce_game_clock', 'deal_seed'])
+
+
+def default_config(**overrides):
     '''
-    Encodes the game tree for one round of poker.
+    Returns a MatchConfig of this module's settings, which come from config.py, with the given fields replaced.
+    '''
+    return MatchConfig(PLAYER_1_NAME, PLAYER_1_PATH, PLAYER_2_NAME, PLAYER_2_PATH, NUM_ROUNDS,
+                       STARTING_STACK, BIG_BLIND, SMALL_BLIND, FLOP_PERCENT, TURN_PERCENT,
+                       STARTING_GAME_CLOCK, ENFORCE_GAME_CLOCK, DEAL_SEED)._replace(**overrides)
+
+
+def config_env(config):
+    '''
+    Returns the environment variables that give a pokerbot's skeleton the match's game parameters.
+    '''
+    return {
+        'POKERBOTS_NUM_ROUNDS': str(config.num_rounds),
+        'POKERBOTS_STARTING_STACK': str(config.starting_stack),
+        'POKERBOTS_BIG_BLIND': str(config.big_blind),
+        'POKERBOTS_SMALL_BLIND': str(config.small_blind),
+        'POKERBOTS_FLOP_PERCENT': repr(config.flop_percent),
+        'POKERBOTS_TURN_PERCENT': repr(config.turn_percent),
+    }
+
+
+def resume_env(round_num, bankroll):
+    '''
+    Returns the environment variables that tell a restarted pokerbot's skeleton the round and bankroll it resumes at.
+    '''
+    return {
+        'POKERBOTS_FIRST_ROUND': str(round_num),
+        'POKERBOTS_FIRST_BANKROLL': str(bankroll),
+    }
+
+
+class RoundState(namedtuple('_RoundState', ['button', 'street', 'pips', 'stacks', 'hands', 'deck', 'previous_state',
+                                            'config'])):
+    '''
+    Encodes the game tree for one round of poker, under the game parameters of its MatchConfig.
     '''
 
     def showdown(self):
@@ -77,9 +149,9 @@ class RoundState(namedtuple('_RoundState', ['button', 'street', 'pips', 'stacks'
         score0 = eval7.evaluate(self.deck[0] + self.hands[0])
         score1 = eval7.evaluate(self.deck[0] + self.hands[1])
         if score0 > score1:
-            delta = STARTING_STACK - self.stacks[1]
+            delta = self.config.starting_stack - self.stacks[1]
         elif score0 < score1:
-            delta = self.stacks[0] - STARTING_STACK
+            delta = self.stacks[0] - self.config.starting_stack
         else:  # split the pot
             delta = (self.stacks[0] - self.stacks[1]) // 2
         return TerminalState([delta, -delta], self)
@@ -106,7 +178,7 @@ class RoundState(namedtuple('_RoundState', ['button', 'street', 'pips', 'stacks'
         active = self.button % 2
         continue_cost = self.pips[1-active] - self.pips[active]
         max_contribution = min(self.stacks[active], self.stacks[1-active] + continue_cost)
-        min_contribution = min(max_contribution, continue_cost + max(continue_cost, BIG_BLIND))
+        min_contribution = min(max_contribution, continue_cost + max(continue_cost, self.config.big_blind))
         return (self.pips[active] + min_contribution, self.pips[active] + max_contribution)
             
     def proceed_street(self):
@@ -117,14 +189,17 @@ class RoundState(namedtuple('_RoundState', ['button', 'street', 'pips', 'stacks'
             return self.showdown()
         new_street = 3 if self.street == 0 else self.street + 1
         new_hands = self.hands.copy()
-        new_deck = eval7.Deck()
-        new_deck.cards = self.deck[1].cards.copy()
+        # deal from a fork, which shares the cards but keeps its own position, so earlier states stay replayable
+        deck = self.deck[1].fork()
         if self.street == 0 or self.street == 3:
-            for i in range(sum([len(hand) for hand in self.hands])):
-                if random.random() < (FLOP_PERCENT if self.street == 0 else TURN_PERCENT):
-                    new_hands, new_deck = swap(i, new_hands, new_deck)
-        board = self.deck[0] + new_deck.deal(3 if self.street == 0 else 1)
-        return RoundState(1, new_street, [0, 0], self.stacks, new_hands, (board, new_deck), self)
+            # a scheduled Deal, if any, rides along in the deck tuple and fixes the swap rolls
+            deal = self.deck[2] if len(self.deck) > 2 else None
+            rolls = None if deal is None else (deal.flop_rolls if self.street == 0 else deal.turn_rolls)
+            mask = swap_mask(self.config.flop_percent if self.street == 0 else self.config.turn_percent, SHUFFLER, rolls)
+            if mask:
+                new_hands, deck = swap(mask, new_hands, deck)
+        board = self.deck[0] + [EVAL_CARDS[deck.deal()] for _ in range(3 if self.street == 0 else 1)]
+        return RoundState(1, new_street, [0, 0], self.stacks, new_hands, (board, deck) + self.deck[2:], self, self.config)
 
     def proceed(self, action):
         '''
@@ -132,31 +207,151 @@ class RoundState(namedtuple('_RoundState', ['button', 'street', 'pips', 'stacks'
         '''
         active = self.button % 2
         if isinstance(action, FoldAction):
-            delta = self.stacks[0] - STARTING_STACK if active == 0 else STARTING_STACK - self.stacks[1]
+            starting_stack = self.config.starting_stack
+            delta = self.stacks[0] - starting_stack if active == 0 else starting_stack - self.stacks[1]
             return TerminalState([delta, -delta], self)
         if isinstance(action, CallAction):
             if self.button == 0:  # sb calls bb
-                return RoundState(1, 0, [BIG_BLIND] * 2, [STARTING_STACK - BIG_BLIND] * 2, self.hands, self.deck, self)
+                big_blind = self.config.big_blind
+                return RoundState(1, 0, [big_blind] * 2, [self.config.starting_stack - big_blind] * 2,
+                                  self.hands, self.deck, self, self.config)
             # both players acted
             new_pips = list(self.pips)
             new_stacks = list(self.stacks)
             contribution = new_pips[1-active] - new_pips[active]
             new_stacks[active] -= contribution
             new_pips[active] += contribution
-            state = RoundState(self.button + 1, self.street, new_pips, new_stacks, self.hands, self.deck, self)
+            state = RoundState(self.button + 1, self.street, new_pips, new_stacks, self.hands, self.deck, self, self.config)
             return state.proceed_street()
         if isinstance(action, CheckAction):
             if (self.street == 0 and self.button > 0) or self.button > 1:  # both players acted
                 return self.proceed_street()
             # let opponent act
-            return RoundState(self.button + 1, self.street, self.pips, self.stacks, self.hands, self.deck, self)
+            return RoundState(self.button + 1, self.street, self.pips, self.stacks, self.hands, self.deck, self, self.config)
         # isinstance(action, RaiseAction)
         new_pips = list(self.pips)
         new_stacks = list(self.stacks)
         contribution = action.amount - new_pips[active]
         new_stacks[active] -= contribution
         new_pips[active] += contribution
-        return RoundState(self.button + 1, self.street, new_pips, new_stacks, self.hands, self.deck, self)
+        return RoundState(self.button + 1, self.street, new_pips, new_stacks, self.hands, self.deck, self, self.config)
+
+
+class OutputCapture():
+    '''
+    Streams a pokerbot's output to its log file as it arrives, keeping within PLAYER_LOG_SIZE_LIMIT bytes.
+    The first half of the limit is written straight through. After that only the latest
+    output is held, in a ring of chunks, and written after a note of the bytes dropped.
+    The held output is also written out by sync, so a killed engine leaves the latest output on disk.
+    With append, the output goes after what the file already holds, which counts against the head.
+    '''
+    # seconds between rewrites of the held output on disk
+    sync_interval = 1.
+
+    def __init__(self, filename, append=False):
+        self.filename = os.path.abspath(filename)  # the file opens lazily, perhaps while a bot has changed directory
+        self.head_room = PLAYER_LOG_SIZE_LIMIT // 2
+        self.head_end = 0
+        self.tail_limit = PLAYER_LOG_SIZE_LIMIT - self.head_room
+        self.tail = deque()
+        self.tail_bytes = 0
+        self.tail_changed = False
+        self.synced_time = 0.
+        self.dropped_bytes = 0
+        self.log_file = None
+        self.closed = False
+        self.append = append
+        self.lock = Lock()
+
+    def open_log(self):
+        '''
+        Opens the log file, or with append reopens it at its end, keeping the output before.
+        '''
+        if self.append and os.path.exists(self.filename):
+            self.log_file = open(self.filename, 'r+b')
+            self.head_end = self.log_file.seek(0, os.SEEK_END)
+            self.head_room = max(0, self.head_room - self.head_end)
+        else:
+            self.log_file = open(self.filename, 'wb')
+
+    def put(self, data):
+        '''
+        Captures a chunk of output bytes.
+        '''
+        if not data:
+            return
+        with self.lock:
+            if self.closed:
+                return
+            if self.log_file is None:
+                self.open_log()
+            if self.head_room > 0:
+                head = data[:self.head_room]
+                self.log_file.write(head)
+                self.head_room -= len(head)
+                self.head_end += len(head)
+                data = data[len(head):]
+            if not data:
+                return
+            self.tail.append(data)
+            self.tail_bytes += len(data)
+            self.tail_changed = True
+            while self.tail_bytes > self.tail_limit:
+                excess = self.tail_bytes - self.tail_limit
+                chunk = self.tail.popleft()
+                if len(chunk) > excess:
+                    self.tail.appendleft(chunk[excess:])
+                dropped = min(len(chunk), excess)
+                self.tail_bytes -= dropped
+                self.dropped_bytes += dropped
+
+    def write(self, text):
+        '''
+        Captures printed text, so the capture can stand in for sys.stdout.
+        '''
+        self.put(text.encode())
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def write_tail(self):
+        '''
+        Rewrites the held tail of the output after the head, replacing what an earlier sync wrote there.
+        '''
+        self.log_file.seek(self.head_end)
+        if self.dropped_bytes > 0:
+            self.log_file.write('\n[{} bytes dropped]\n'.format(self.dropped_bytes).encode())
+        for chunk in self.tail:
+            self.log_file.write(chunk)
+        self.log_file.truncate()
+        self.tail_changed = False
+
+    def sync(self):
+        '''
+        Pushes the output captured so far to disk. The held tail is rewritten at most every sync_interval seconds.
+        '''
+        with self.lock:
+            if self.closed or self.log_file is None:
+                return
+            if self.tail_changed and time.perf_counter() - self.synced_time >= self.sync_interval:
+                self.write_tail()
+                self.synced_time = time.perf_counter()
+            self.log_file.flush()
+
+    def close(self):
+        '''
+        Writes the held tail of the output and closes the log file.
+        '''
+        with self.lock:
+            if self.closed:
+                return
+            if self.log_file is None:
+                self.open_log()
+            self.write_tail()
+            self.tail.clear()
+            self.log_file.close()
+            self.closed = True
 
 
 class Player():
@@ -164,21 +359,42 @@ class Player():
     Handles subprocess and socket interactions with one player's pokerbot.
     '''
 
-    def __init__(self, name, path):
+    def __init__(self, name, path, config=None):
+        self.path = resolve_bot(path)
+        self.commands = None
+        self.bot_subprocess = None
+        self.socketfile = None
+        self.cpu_tasks = None
+        self.reset(name, config if config is not None else default_config())
+
+    def reset(self, name, config):
+        '''
+        Clears the per-match state, so a running pokerbot can start a new match under the given name and MatchConfig.
+        '''
         self.name = name
-        self.path = path
-        self.game_clock = STARTING_GAME_CLOCK
+        self.config = config
+        self.game_clock = config.starting_game_clock
         self.bankroll = 0
         self.sb_bankroll = 0
         self.bb_bankroll = 0
-        self.commands = None
-        self.bot_subprocess = None
-        self.socketfile = None
-        self.bytes_queue = Queue()
+        self.first_round = 1
+        self.deltas = []
+        self.output = OutputCapture(name + '.txt')
+        self.pending_clauses = []
+        self.latency = LatencyRecorder()
 
-    def build(self):
+    def env(self):
+        '''
+        Returns the environment variables the pokerbot is launched with, including where a resumed match picks up.
+        '''
+        env = config_env(self.config)
+        if self.first_round > 1:
+            env.update(resume_env(self.first_round, self.bankroll))
+        return env
+
+    def load_commands(self):
         '''
-        Loads the commands file and builds the pokerbot.
+        Loads the pokerbot's commands file.
         '''
         try:
             with open(self.path + '/commands.json', 'r') as json_file:
@@ -194,60 +410,152 @@ class Player():
         except json.decoder.JSONDecodeError:
             print(self.path)
             print(self.name, 'commands.json misformatted')
+
+    def build(self):
+        '''
+        Loads the commands file and builds the pokerbot, unless its sources are unchanged since its last build.
+        Other engines building the same pokerbot wait for the build to finish.
+        '''
+        self.load_commands()
         if self.commands is not None and len(self.commands['build']) > 0:
+            with build_lock(self.path):
+                self.build_locked()
+
+    def build_locked(self):
+        '''
+        Builds the pokerbot while holding its build lock, unless its sources are unchanged since its last build.
+        '''
+        digest = self.build_digest()
+        if digest is not None and is_built(self.path, digest):
+            print(self.name, 'build is up to date')
+            return
+        before = snapshot(self.path) if digest is not None else None
+        try:
+            proc = subprocess.run(self.commands['build'],
+                                  stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                  cwd=self.path, timeout=BUILD_TIMEOUT, check=False, env=build_env(self.path))
+            self.output.put(proc.stdout)
+            if digest is not None and proc.returncode == 0:
+                mark_built(self.path, digest, before)
+            if launcher_missing(self.path):
+                print(self.name, LAUNCHER_MISSING)
+        except subprocess.TimeoutExpired as timeout_expired:
+            error_message = 'Timed out waiting for ' + self.name + ' to build'
+            print(error_message)
+            self.output.put(timeout_expired.stdout)
+            self.output.put(error_message.encode())
+        except (TypeError, ValueError):
+            print(self.name, 'build command misformatted')
+        except OSError:
+            print(self.name, 'build failed - check "build" in commands.json')
+
+    def build_digest(self):
+        '''
+        Returns the hash of the pokerbot's sources and build command, or None without BUILD_CACHE.
+        '''
+        if not BUILD_CACHE:
+            return None
+        try:
+            return source_hash(self.path, self.commands['build'])
+        except OSError:
+            return None
+
+    def pipelines(self):
+        '''
+        Returns whether the pokerbot takes its end-of-round clauses with its next message instead of acking them.
+        '''
+        return PIPELINE_ACKS and self.commands is not None and 'pipeline' in self.commands.get('protocol', [])
+
+    def reusable(self):
+        '''
+        Returns whether the pokerbot can be kept running for another match: it takes the N clause,
+        and it is still connected with time left, so no late response can be in flight.
+        '''
+        return (WARM_POOL and self.commands is not None and 'newgame' in self.commands.get('protocol', []) and
+                self.socketfile is not None and self.game_clock > 0. and
+                self.bot_subprocess is not None and self.bot_subprocess.poll() is None)
+
+    def transport(self):
+        '''
+        Returns the configured TRANSPORT, or plain TCP if the pokerbot does not support it.
+        '''
+        if TRANSPORT in ('unix', 'socketpair') and TRANSPORT not in self.commands.get('protocol', []):
+            return 'tcp'
+        return TRANSPORT
+
+    def launch(self, connection_args, pass_fds=()):
+        '''
+        Starts the pokerbot subprocess and a thread that collects its output.
+        '''
+        env = dict(os.environ, **self.env())
+        if self.transport() == 'tcp_nodelay':
+            env['POKERBOTS_TCP_NODELAY'] = '1'
+        proc = subprocess.Popen(self.commands['run'] + connection_args,
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                cwd=self.path, pass_fds=pass_fds, env=env)
+        self.bot_subprocess = proc
+        # function for bot listening, into the current match's log if the pokerbot is reused
+        def enqueue_output(out):
             try:
-                proc = subprocess.run(self.commands['build'],
-                                      stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-                                      cwd=self.path, timeout=BUILD_TIMEOUT, check=False)
-                self.bytes_queue.put(proc.stdout)
-            except subprocess.TimeoutExpired as timeout_expired:
-                error_message = 'Timed out waiting for ' + self.name + ' to build'
-                print(error_message)
-                self.bytes_queue.put(timeout_expired.stdout)
-                self.bytes_queue.put(error_message.encode())
-            except (TypeError, ValueError):
-                print(self.name, 'build command misformatted')
-            except OSError:
-                print(self.name, 'build failed - check "build" in commands.json')
+                for line in out:
+                    self.output.put(line)
+            except ValueError:
+                pass
+        # start a separate bot listening thread which dies with the program
+        Thread(target=enqueue_output, args=(proc.stdout,), daemon=True).start()
+
+    def connect(self, client_socket):
+        '''
+        Wraps the socket connected to the pokerbot.
+        '''
+        with client_socket:
+            client_socket.settimeout(CONNECT_TIMEOUT)
+            sock = client_socket.makefile('rw')
+            self.socketfile = sock
+            print(self.name, 'connected successfully')
 
     def run(self):
         '''
         Runs the pokerbot and establishes the socket connection.
         '''
         if self.commands is not None and len(self.commands['run']) > 0:
+            socket_dir = None
             try:
-                server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                transport = self.transport()
+                if transport == 'socketpair':
+                    engine_socket, bot_socket = socket.socketpair()
+                    with bot_socket:
+                        self.launch(['--fd', str(bot_socket.fileno())], pass_fds=(bot_socket.fileno(),))
+                    self.connect(engine_socket)
+                    return
+                server_socket = socket.socket(socket.AF_UNIX if transport == 'unix' else socket.AF_INET,
+                                              socket.SOCK_STREAM)
                 with server_socket:
-                    server_socket.bind(('', 0))
+                    if transport == 'unix':
+                        socket_dir = tempfile.mkdtemp(prefix='pokerbots-')
+                        address = os.path.join(socket_dir, self.name + '.sock')
+                        server_socket.bind(address)
+                        connection_args = ['--unix', address]
+                    else:
+                        server_socket.bind(('', 0))
+                        connection_args = [str(server_socket.getsockname()[1])]
                     server_socket.settimeout(CONNECT_TIMEOUT)
                     server_socket.listen()
-                    port = server_socket.getsockname()[1]
-                    proc = subprocess.Popen(self.commands['run'] + [str(port)],
-                                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-                                            cwd=self.path)
-                    self.bot_subprocess = proc
-                    # function for bot listening
-                    def enqueue_output(out, queue):
-                        try:
-                            for line in out:
-                                queue.put(line)
-                        except ValueError:
-                            pass
-                    # start a separate bot listening thread which dies with the program
-                    Thread(target=enqueue_output, args=(proc.stdout, self.bytes_queue), daemon=True).start()
+                    self.launch(connection_args)
                     # block until we timeout or the player connects
                     client_socket, _ = server_socket.accept()
-                    with client_socket:
-                        client_socket.settimeout(CONNECT_TIMEOUT)
-                        sock = client_socket.makefile('rw')
-                        self.socketfile = sock
-                        print(self.name, 'connected successfully')
+                    if transport == 'tcp_nodelay':
+                        client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    self.connect(client_socket)
             except (TypeError, ValueError):
                 print(self.name, 'run command misformatted')
             except OSError:
                 print(self.name, 'run failed - check "run" in commands.json')
             except socket.timeout:
                 print('Timed out waiting for', self.name, 'to connect')
+            finally:
+                if socket_dir is not None:
+                    shutil.rmtree(socket_dir, ignore_errors=True)
 
     def stop(self):
         '''
@@ -255,7 +563,7 @@ class Player():
         '''
         if self.socketfile is not None:
             try:
-                self.socketfile.write('Q\n')
+                self.socketfile.write(' '.join(self.pending_clauses + ['Q']) + '\n')
                 self.socketfile.close()
             except socket.timeout:
                 print('Timed out waiting for', self.name, 'to disconnect')
@@ -264,21 +572,21 @@ class Player():
         if self.bot_subprocess is not None:
             try:
                 outs, _ = self.bot_subprocess.communicate(timeout=CONNECT_TIMEOUT)
-                self.bytes_queue.put(outs)
+                self.output.put(outs)
             except subprocess.TimeoutExpired:
                 print('Timed out waiting for', self.name, 'to quit')
                 self.bot_subprocess.kill()
                 outs, _ = self.bot_subprocess.communicate()
-                self.bytes_queue.put(outs)
-        with open(self.name + '.txt', 'wb') as log_file:
-            bytes_written = 0
-            for output in self.bytes_queue.queue:
-                try:
-                    bytes_written += log_file.write(output)
-                    if bytes_written >= PLAYER_LOG_SIZE_LIMIT:
-                        break
-                except TypeError:
-                    pass
+                self.output.put(outs)
+        self.close_output()
+
+    def close_output(self):
+        '''
+        Finishes the pokerbot's log file, reporting any output dropped to stay within PLAYER_LOG_SIZE_LIMIT.
+        '''
+        self.output.close()
+        if self.output.dropped_bytes > 0:
+            print(self.name, 'log truncated,', self.output.dropped_bytes, 'bytes dropped')
 
     def query(self, round_state, player_message, game_log):
         '''
@@ -292,25 +600,22 @@ class Player():
                 player_message[0] = 'T{:.3f}'.format(self.game_clock)
                 message = ' '.join(player_message) + '\n'
                 del player_message[1:]  # do not send redundant action history
+                cpu_start = self.cpu_time()
                 start_time = time.perf_counter()
                 self.socketfile.write(message)
                 self.socketfile.flush()
                 clause = self.socketfile.readline().strip()
                 end_time = time.perf_counter()
-                if ENFORCE_GAME_CLOCK:
+                cpu_end = self.cpu_time()
+                self.record_latency(round_state, legal_actions, clause, end_time - start_time,
+                                    cpu_end - cpu_start if cpu_start is not None else None)
+                if self.config.enforce_game_clock:
                     self.game_clock -= end_time - start_time
                 if self.game_clock <= 0.:
                     raise socket.timeout
-                action = DECODE[clause[0]]
-                if action in legal_actions:
-                    if clause[0] == 'R':
-                        amount = int(clause[1:])
-                        min_raise, max_raise = round_state.raise_bounds()
-                        if min_raise <= amount <= max_raise:
-                            return action(amount)
-                    else:
-                        return action()
-                game_log.append(self.name + ' attempted illegal ' + action.__name__)
+                action = self.decode(clause, round_state, legal_actions, game_log)
+                if action is not None:
+                    return action
             except socket.timeout:
                 error_message = self.name + ' ran out of time'
                 game_log.append(error_message)
@@ -321,42 +626,515 @@ class Player():
                 game_log.append(error_message)
                 print(error_message)
                 self.game_clock = 0.
-            except (IndexError, KeyError, ValueError):
-                game_log.append(self.name + ' response misformatted: ' + str(clause))
         return CheckAction() if CheckAction in legal_actions else FoldAction()
 
+    def record_latency(self, round_state, legal_actions, clause, seconds, cpu_seconds=None):
+        '''
+        Records the response time of one decision. End-of-round acknowledgements are not decisions.
+        '''
+        if isinstance(round_state, RoundState):
+            self.latency.record(round_state.street, clause, RaiseAction in legal_actions, seconds, cpu_seconds)
+
+    def pin(self, cpus):
+        '''
+        Pins the running pokerbot, with every process it started, to the given CPUs and starts counting its CPU time.
+        '''
+        if self.bot_subprocess is not None and self.bot_subprocess.poll() is None:
+            self.cpu_tasks = pinning.pin(self.bot_subprocess.pid, cpus)
 
-class Game():
+    def cpu_time(self):
+        '''
+        Returns the CPU time the pinned pokerbot has used so far, in seconds, or None if it is not pinned.
+        '''
+        return pinning.cpu_seconds(self.cpu_tasks) if self.cpu_tasks is not None else None
+
+    def decode(self, clause, round_state, legal_actions, game_log):
+        '''
+        Decodes the pokerbot's response, returning None if it is illegal or misformatted.
+        '''
+        try:
+            action = DECODE[clause[0]]
+            if action in legal_actions:
+                if clause[0] == 'R':
+                    amount = int(clause[1:])
+                    min_raise, max_raise = round_state.raise_bounds()
+                    if min_raise <= amount <= max_raise:
+                        return action(amount)
+                else:
+                    return action()
+            game_log.append(self.name + ' attempted illegal ' + action.__name__)
+        except (IndexError, KeyError, ValueError):
+            game_log.append(self.name + ' response misformatted: ' + str(clause))
+        return None
+
+
+def load_bot(path, env={}, modules=('player', 'skeleton.states', 'skeleton.actions')):
+    '''
+    Imports the Player class of a Python pokerbot and its skeleton from the bot's directory,
+    returning the given modules of the bot.
+    The bot's modules are removed from sys.modules afterwards so that two bots
+    (or two copies of the same bot) never share module-level state.
+    The environment variables in env are set while the modules import, as for a launched bot.
+    '''
+    path = os.path.abspath(path)
+    local_names = {os.path.splitext(entry)[0] for entry in os.listdir(path)}
+    is_local = lambda name: name.split('.')[0] in local_names
+    shadowed = {name: module for name, module in sys.modules.items() if is_local(name)}
+    for name in shadowed:
+        del sys.modules[name]
+    cwd = os.getcwd()
+    sys.path.insert(0, path)
+    os.chdir(path)  # bots load their equity tables relative to their own directory
+    environ = {name: os.environ.get(name) for name in env}
+    os.environ.update(env)
+    try:
+        return tuple(importlib.import_module(module) for module in modules)
+    finally:
+        for name, value in environ.items():
+            if value is None:
+                del os.environ[name]
+            else:
+                os.environ[name] = value
+        os.chdir(cwd)
+        sys.path.remove(path)
+        for name in [name for name in sys.modules if is_local(name)]:
+            del sys.modules[name]
+        sys.modules.update(shadowed)
+
+
+class LocalPlayer(Player):
+    '''
+    Runs one player's Python pokerbot inside the engine process, without sockets.
+    The pokerbot sees exactly the clauses the socket protocol would carry, replayed
+    through the same steps as its skeleton Runner, so game semantics are unchanged.
+    Only the game clock skips its clause: the bot gets it rounded as the T clause would carry it.
+    '''
+
+    def __init__(self, name, path, config=None):
+        super().__init__(name, path, config)
+        self.pokerbot = None
+        self.states = None
+        self.actions = None
+        self.game_state = None
+        self.round_state = None
+        self.active = 0
+        self.round_flag = True
+
+    def build(self):
+        '''
+        Python pokerbots have nothing to build in headless mode.
+        '''
+        if not os.path.isfile(os.path.join(self.path, 'player.py')):
+            print(self.name, 'player.py not found - headless mode needs a Python bot')
+
+    def pin(self, cpus):
+        '''
+        The in-process pokerbot runs on the engine's CPU, so only its CPU time is counted.
+        '''
+        self.cpu_tasks = []
+
+    def cpu_time(self):
+        '''
+        Returns the CPU time of the engine thread, which runs the pokerbot, or None if the match is not pinned.
+        '''
+        return time.thread_time() if self.cpu_tasks is not None else None
+
+    def run(self):
+        '''
+        Imports and constructs the pokerbot in this process.
+        '''
+        try:
+            with redirect_stdout(self.output):
+                player_module, self.states, self.actions = load_bot(self.path, self.env())
+                cwd = os.getcwd()
+                os.chdir(self.path)
+                try:
+                    self.pokerbot = player_module.Player()
+                finally:
+                    os.chdir(cwd)
+            self.game_state = self.states.GameState(self.bankroll, 0., self.first_round)
+            print(self.name, 'loaded successfully')
+        except Exception:
+            self.output.write(traceback.format_exc())
+            print(self.name, 'failed to load - check player.py')
+
+    def stop(self):
+        '''
+        Finishes the pokerbot's log file.
+        '''
+        self.close_output()
+
+    def receive(self, game_clock, clauses):
+        '''
+        Reconstructs the pokerbot's view of the game tree, mirroring Runner.run in its skeleton.
+        The clauses are checked most frequent first; each starts with a distinct letter, so the order changes nothing.
+        '''
+        GameState, TerminalState, RoundState = self.states.GameState, self.states.TerminalState, self.states.RoundState
+        actions = self.actions
+        game_state = GameState(self.game_state.bankroll, game_clock, self.game_state.round_num)
+        round_state = self.round_state
+        active = self.active
+        for clause in clauses:
+            kind = clause[0]
+            if kind == 'C':
+                round_state = round_state.proceed(actions.CallAction())
+            elif kind == 'K':
+                round_state = round_state.proceed(actions.CheckAction())
+            elif kind == 'R':
+                round_state = round_state.proceed(actions.RaiseAction(int(clause[1:])))
+            elif kind == 'F':
+                round_state = round_state.proceed(actions.FoldAction())
+            elif kind == 'B':
+                round_state = RoundState(round_state.button, round_state.street, round_state.pips, round_state.stacks,
+                                         round_state.hands, clause[1:].split(','), round_state.previous_state)
+            elif kind == 'P':
+                active = int(clause[1:])
+            elif kind == 'H':
+                hands = [[], []]
+                hands[active] = clause[1:].split(',')
+                pips = [self.states.SMALL_BLIND, self.states.BIG_BLIND]
+                stacks = [self.states.STARTING_STACK - self.states.SMALL_BLIND,
+                          self.states.STARTING_STACK - self.states.BIG_BLIND]
+                round_state = RoundState(0, 0, pips, stacks, hands, [], None)
+                if self.round_flag:
+                    self.pokerbot.handle_new_round(game_state, round_state, active)
+                    self.round_flag = False
+            elif kind == 'U':
+                hands = [[], []]
+                hands[active] = clause[1:].split(',')
+                round_state = RoundState(round_state.button, round_state.street, round_state.pips, round_state.stacks,
+                                         hands, round_state.deck, round_state.previous_state)
+            elif kind == 'O':
+                # backtrack
+                round_state = round_state.previous_state
+                revised_hands = list(round_state.hands)
+                revised_hands[1-active] = clause[1:].split(',')
+                # rebuild history
+                round_state = RoundState(round_state.button, round_state.street, round_state.pips, round_state.stacks,
+                                         revised_hands, round_state.deck, round_state.previous_state)
+                round_state = TerminalState([0, 0], round_state)
+            elif kind == 'D':
+                delta = int(clause[1:])
+                deltas = [-delta, -delta]
+                deltas[active] = delta
+                round_state = TerminalState(deltas, round_state.previous_state)
+                game_state = GameState(game_state.bankroll + delta, game_state.game_clock, game_state.round_num)
+                self.pokerbot.handle_round_over(game_state, round_state, active)
+                game_state = GameState(game_state.bankroll, game_state.game_clock, game_state.round_num + 1)
+                self.round_flag = True
+            elif kind == 'T':
+                game_state = GameState(game_state.bankroll, float(clause[1:]), game_state.round_num)
+        self.game_state = game_state
+        self.round_state = round_state
+        self.active = active
+
+    def respond(self):
+        '''
+        Encodes the pokerbot's response the way its skeleton Runner would send it.
+        '''
+        if self.round_flag:  # ack the engine
+            return 'K'
+        action = self.pokerbot.get_action(self.game_state, self.round_state, self.active)
+        if isinstance(action, self.actions.FoldAction):
+            return 'F'
+        if isinstance(action, self.actions.CallAction):
+            return 'C'
+        if isinstance(action, self.actions.CheckAction):
+            return 'K'
+        return 'R' + str(action.amount)
+
+    def query(self, round_state, player_message, game_log):
+        '''
+        Requests one action from the in-process pokerbot.
+        At the end of the round, we request a CheckAction from the pokerbot.
+        '''
+        legal_actions = round_state.legal_actions() if isinstance(round_state, RoundState) else {CheckAction}
+        if self.pokerbot is not None and self.game_clock > 0.:
+            # the clock as the T clause would carry it, which round gives without formatting and parsing it
+            game_clock = round(self.game_clock, 3)
+            clauses = player_message[1:]
+            del player_message[1:]  # do not send redundant action history
+            cpu_start = self.cpu_time()
+            start_time = time.perf_counter()
+            # swapped by hand rather than with redirect_stdout, which costs a context manager per query
+            stdout, sys.stdout = sys.stdout, self.output
+            clause = None
+            try:
+                self.receive(game_clock, clauses)
+                clause = self.respond()
+            except Exception:
+                self.output.write(traceback.format_exc())
+            finally:
+                sys.stdout = stdout
+            if clause is None:
+                error_message = self.name + ' disconnected'
+                game_log.append(error_message)
+                print(error_message)
+                self.game_clock = 0.
+                self.pokerbot = None
+                return CheckAction() if CheckAction in legal_actions else FoldAction()
+            end_time = time.perf_counter()
+            cpu_end = self.cpu_time()
+            self.record_latency(round_state, legal_actions, clause, end_time - start_time,
+                                cpu_end - cpu_start if cpu_start is not None else None)
+            if self.config.enforce_game_clock:
+                self.game_clock -= end_time - start_time
+            if self.game_clock <= 0.:
+                error_message = self.name + ' ran out of time'
+                game_log.append(error_message)
+                print(error_message)
+                self.game_clock = 0.
+            else:
+                action = self.decode(clause, round_state, legal_actions, game_log)
+                if action is not None:
+                    return action
+        return CheckAction() if CheckAction in legal_actions else FoldAction()
+
+
+class BotPool():
     '''
-    Manages logging and the high-level game procedure.
+    Keeps the pokerbots of finished matches running, so later matches in this process skip
+    the build, launch and connection. A reused pokerbot is sent the finished game's last
+    clauses followed by N, and starts its next game with the next message. Pokerbots are
+    only reused for matches with the game parameters they were launched with.
     '''
 
     def __init__(self):
-        self.log = ['6.176 MIT Pokerbots - ' + PLAYER_1_NAME + ' vs ' + PLAYER_2_NAME]
+        self.idle = {}
+
+    def key(self, path, config):
+        '''
+        Returns the key of the idle pokerbots that can play a match of the given MatchConfig.
+        '''
+        return (path, tuple(sorted(config_env(config).items())))
+
+    def acquire(self, name, path, config):
+        '''
+        Returns a running player for the pokerbot at path, reusing an idle one if there is one.
+        '''
+        path = resolve_bot(path)
+        idle = self.idle.get(self.key(path, config), [])
+        if idle:
+            player = idle.pop()
+            player.reset(name, config)
+            print(name, 'reused a running pokerbot')
+            return player
+        player = Player(name, path, config)
+        player.build()
+        player.run()
+        return player
+
+    def release(self, player):
+        '''
+        Ends the player's game, keeping its pokerbot for the next match if it is reusable and stopping it otherwise.
+        '''
+        if player.reusable():
+            try:
+                player.socketfile.write(' '.join(player.pending_clauses + ['N']) + '\n')
+                player.socketfile.flush()
+                player.pending_clauses = []
+                player.close_output()
+                self.idle.setdefault(self.key(player.path, player.config), []).append(player)
+                return
+            except OSError:
+                print('Could not keep', player.name, 'running')
+        player.stop()
+
+    def close(self):
+        '''
+        Stops every idle pokerbot.
+        '''
+        for players in self.idle.values():
+            for player in players:
+                player.stop()
+        self.idle = {}
+
+
+BOT_POOL = BotPool()
+atexit.register(BOT_POOL.close)
+
+
+class GameLog():
+    '''
+    Streams the game log to its file as the game is played.
+    'full' writes every line, 'summary' only round results and errors, 'none' nothing.
+    With a binary log, the game's events are also recorded there by the Game.
+    Given the offset of a checkpoint, the log is cut back to it and continued.
+    '''
+
+    def __init__(self, filename, verbosity='full', binary=None, offset=None):
+        self.enabled = (verbosity != 'none')
+        self.detailed = (verbosity == 'full')
+        self.log_file = None
+        self.separator = ''
+        self.binary = binary
+        if self.enabled and offset is not None:
+            self.log_file = open(filename, 'r+')
+            self.log_file.truncate(offset)
+            self.log_file.seek(offset)
+            self.separator = '\n' if offset > 0 else ''
+        elif self.enabled:
+            self.log_file = open(filename, 'w')
+
+    def write(self, line):
+        '''
+        Writes one line of the game log.
+        '''
+        if self.enabled:
+            self.log_file.write(self.separator + line)
+            self.separator = '\n'
+
+    def append(self, line):
+        '''
+        Writes a line that is not derived from the game's events, such as a player error.
+        '''
+        self.write(line)
+        if self.binary is not None:
+            self.binary.text(line)
+
+    def checkpoint(self):
+        '''
+        Flushes the game log and returns the offsets of the text and binary logs to resume from.
+        '''
+        offset = None
+        if self.enabled:
+            self.log_file.flush()
+            offset = self.log_file.tell()
+        return offset, self.binary.checkpoint() if self.binary is not None else None
+
+    def close(self):
+        '''
+        Flushes and closes the game log.
+        '''
+        if self.enabled:
+            self.log_file.close()
+        if self.binary is not None:
+            self.binary.close()
+
+
+class Game():
+    '''
+    Manages logging and the high-level game procedure of one match, played under its MatchConfig.
+    With resume, the match continues from its last checkpoint, if it has one, with freshly started pokerbots.
+    Those are told the round and bankroll they resume at, but lose any other memory of the earlier rounds.
+    Pooled pokerbots cannot be restarted, so resume is refused under WARM_POOL.
+    '''
+
+    def __init__(self, log_filename=None, config=None, resume=False):
+        if resume and WARM_POOL and not HEADLESS:
+            raise ValueError('A match cannot resume with WARM_POOL, which reuses running pokerbots')
+        self.config = config if config is not None else default_config()
+        log_filename = log_filename or GAME_LOG_FILENAME + '.txt'
+        self.checkpoint_filename = os.path.splitext(log_filename)[0] + '.checkpoint.json'
+        self.checkpoint = self.load_checkpoint() if resume else None
+        offset, binary_offset, round_num = None, None, 0
+        if self.checkpoint is not None:
+            offset, binary_offset, round_num = (self.checkpoint['log_offset'], self.checkpoint['binary_offset'],
+                                                self.checkpoint['round'])
+        binary = None
+        if BINARY_LOG:
+            binary = BinaryLogWriter(os.path.splitext(log_filename)[0] + '.bin', self.config.player_1_name,
+                                     self.config.player_2_name, self.config.small_blind, self.config.big_blind,
+                                     binary_offset, round_num)
+        self.log = GameLog(log_filename, GAME_LOG_VERBOSITY, binary, offset)
+        self.latency_filename = os.path.splitext(log_filename)[0] + '.latency.json' if LATENCY_REPORT else None
+        if self.checkpoint is None:
+            self.log.write('6.176 MIT Pokerbots - ' + self.config.player_1_name + ' vs ' + self.config.player_2_name)
         self.player_messages = [[], []]
+        # the seconds spent playing the rounds, without building, launching and stopping the pokerbots
+        self.play_time = None
+        # the CPUs the engine may run on before PIN_CPUS pins it, restored once the match ends
+        self.affinity = None
+
+    def load_checkpoint(self):
+        '''
+        Reads the match's checkpoint, or returns None if it has none.
+        '''
+        try:
+            with open(self.checkpoint_filename, 'r') as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+        except FileNotFoundError:
+            print('No checkpoint found, starting the match from the first round')
+            return None
+        if checkpoint['config'] != json.loads(json.dumps(self.config._asdict())):
+            raise ValueError(self.checkpoint_filename + ' was saved by a match under a different MatchConfig')
+        return checkpoint
+
+    def save_checkpoint(self, players, round_num):
+        '''
+        Records everything needed to continue the match after the given round, with the players in their next seats.
+        The file is replaced atomically, so a match killed while saving keeps its previous checkpoint.
+        '''
+        log_offset, binary_offset = self.log.checkpoint()
+        checkpoint = {
+            'round': round_num,
+            'config': self.config._asdict(),
+            'players': [{'name': player.name, 'bankroll': player.bankroll, 'sb_bankroll': player.sb_bankroll,
+                         'bb_bankroll': player.bb_bankroll, 'game_clock': player.game_clock} for player in players],
+            'random_state': SHUFFLER.getstate() if self.config.deal_seed is None else None,
+            'log_offset': log_offset,
+            'binary_offset': binary_offset,
+        }
+        temporary = self.checkpoint_filename + '.tmp'
+        with open(temporary, 'w') as checkpoint_file:
+            json.dump(checkpoint, checkpoint_file)
+        os.replace(temporary, self.checkpoint_filename)
+
+    def restore_checkpoint(self, players):
+        '''
+        Restores the players' bankrolls, clocks and seats, and the shuffle state, from the checkpoint.
+        Must run before the pokerbots start, so their skeletons learn the round and bankroll they resume at.
+        Returns the players in their seats.
+        '''
+        by_name = {player.name: player for player in players}
+        players = [by_name[saved['name']] for saved in self.checkpoint['players']]
+        for player, saved in zip(players, self.checkpoint['players']):
+            player.bankroll = saved['bankroll']
+            player.sb_bankroll = saved['sb_bankroll']
+            player.bb_bankroll = saved['bb_bankroll']
+            player.game_clock = saved['game_clock']
+            player.first_round = self.checkpoint['round'] + 1
+            # the output of the rounds before the checkpoint is kept
+            player.output = OutputCapture(player.output.filename, append=True)
+        if self.checkpoint['random_state'] is not None:
+            version, state, gauss_next = self.checkpoint['random_state']
+            SHUFFLER.setstate((version, tuple(state), gauss_next))
+        print('Resuming the match after round', self.checkpoint['round'])
+        return players
 
     def log_round_state(self, players, round_state):
         '''
         Incorporates RoundState information into the game log and player messages.
         '''
         if round_state.street == 0 and round_state.button == 0:
-            self.log.append('{} posts the blind of {}'.format(players[0].name, SMALL_BLIND))
-            self.log.append('{} posts the blind of {}'.format(players[1].name, BIG_BLIND))
-            self.log.append('{} dealt {}'.format(players[0].name, PCARDS(round_state.hands[0])))
-            self.log.append('{} dealt {}'.format(players[1].name, PCARDS(round_state.hands[1])))
-            self.player_messages[0] = ['T0.', 'P0', 'H' + CCARDS(round_state.hands[0])]
-            self.player_messages[1] = ['T0.', 'P1', 'H' + CCARDS(round_state.hands[1])]
+            if self.log.detailed:
+                self.log.write('{} posts the blind of {}'.format(players[0].name, self.config.small_blind))
+                self.log.write('{} posts the blind of {}'.format(players[1].name, self.config.big_blind))
+                self.log.write('{} dealt {}'.format(players[0].name, PCARDS(round_state.hands[0])))
+                self.log.write('{} dealt {}'.format(players[1].name, PCARDS(round_state.hands[1])))
+            if self.log.binary is not None:
+                self.log.binary.start_round(players, round_state.hands)
+            self.player_messages[0] = ['T0.'] + players[0].pending_clauses + ['P0', 'H' + CCARDS(round_state.hands[0])]
+            self.player_messages[1] = ['T0.'] + players[1].pending_clauses + ['P1', 'H' + CCARDS(round_state.hands[1])]
+            players[0].pending_clauses = []
+            players[1].pending_clauses = []
         elif round_state.street > 0 and round_state.button == 1:
             board = round_state.deck[0]
-            self.log.append(STREET_NAMES[round_state.street - 3] + ' ' + PCARDS(board) +
-                            PVALUE(players[0].name, STARTING_STACK-round_state.stacks[0]) +
-                            PVALUE(players[1].name, STARTING_STACK-round_state.stacks[1]))
+            starting_stack = self.config.starting_stack
+            if self.log.detailed:
+                self.log.write(STREET_NAMES[round_state.street - 3] + ' ' + PCARDS(board) +
+                                PVALUE(players[0].name, starting_stack-round_state.stacks[0]) +
+                                PVALUE(players[1].name, starting_stack-round_state.stacks[1]))
+            if self.log.binary is not None:
+                self.log.binary.street(board, [starting_stack - stack for stack in round_state.stacks],
+                                       round_state.hands if round_state.street < 5 else None)
             compressed_board = 'B' + CCARDS(board)
             self.player_messages[0].append(compressed_board)
             self.player_messages[1].append(compressed_board)
             if round_state.street < 5:
-                self.log.append("{}'s hand: {}".format(players[0].name, PCARDS(round_state.hands[0])))
-                self.log.append("{}'s hand: {}".format(players[1].name, PCARDS(round_state.hands[1])))
+                if self.log.detailed:
+                    self.log.write("{}'s hand: {}".format(players[0].name, PCARDS(round_state.hands[0])))
+                    self.log.write("{}'s hand: {}".format(players[1].name, PCARDS(round_state.hands[1])))
                 self.player_messages[0].append('U' + CCARDS(round_state.hands[0]))
                 self.player_messages[1].append('U' + CCARDS(round_state.hands[1]))
 
@@ -376,7 +1154,10 @@ class Game():
         else:  # isinstance(action, RaiseAction)
             phrasing = (' bets ' if bet_override else ' raises to ') + str(action.amount)
             code = 'R' + str(action.amount)
-        self.log.append(name + phrasing)
+        if self.log.detailed:
+            self.log.write(name + phrasing)
+        if self.log.binary is not None:
+            self.log.binary.action(name, code, bet_override)
         self.player_messages[0].append(code)
         self.player_messages[1].append(code)
 
@@ -385,28 +1166,39 @@ class Game():
         Incorporates TerminalState information into the game log and player messages.
         '''
         previous_state = round_state.previous_state
+        if self.log.binary is not None:
+            self.log.binary.end_round(FoldAction not in previous_state.legal_actions(), round_state.deltas)
         if FoldAction not in previous_state.legal_actions():
-            self.log.append('{} shows {}'.format(players[0].name, PCARDS(previous_state.hands[0])))
-            self.log.append('{} shows {}'.format(players[1].name, PCARDS(previous_state.hands[1])))
+            if self.log.detailed:
+                self.log.write('{} shows {}'.format(players[0].name, PCARDS(previous_state.hands[0])))
+                self.log.write('{} shows {}'.format(players[1].name, PCARDS(previous_state.hands[1])))
             self.player_messages[0].append('O' + CCARDS(previous_state.hands[1]))
             self.player_messages[1].append('O' + CCARDS(previous_state.hands[0]))
-        self.log.append('{} awarded {}'.format(players[0].name, round_state.deltas[0]))
-        self.log.append('{} awarded {}'.format(players[1].name, round_state.deltas[1]))
+        if self.log.enabled:
+            self.log.write('{} awarded {}'.format(players[0].name, round_state.deltas[0]))
+            self.log.write('{} awarded {}'.format(players[1].name, round_state.deltas[1]))
         self.player_messages[0].append('D' + str(round_state.deltas[0]))
         self.player_messages[1].append('D' + str(round_state.deltas[1]))
 
-    def run_round(self, players):
+    def new_round(self, deal=None):
         '''
-        Runs one round of poker.
+        Deals a new round, using the scheduled Deal if one is given, and returns its RoundState.
         '''
-        deck = eval7.Deck()
-        deck.shuffle()
-        deck = ([], deck)
-        hands = [deck[1].deal(2), deck[1].deal(2)]
-        pips = [SMALL_BLIND, BIG_BLIND]
-        stacks = [STARTING_STACK - SMALL_BLIND, STARTING_STACK - BIG_BLIND]
-        round_state = RoundState(0, 0, pips, stacks, hands, deck, None)
+        if deal is None:
+            deck = ([], IntDeck.shuffled(SHUFFLER))
+        else:
+            deck = ([], IntDeck([CARD_CODES[card] for card in deal.cards]), deal)
+        hands = [[EVAL_CARDS[deck[1].deal()] for _ in range(2)] for _ in range(2)]
+        config = self.config
+        pips = [config.small_blind, config.big_blind]
+        stacks = [config.starting_stack - config.small_blind, config.starting_stack - config.big_blind]
+        return RoundState(0, 0, pips, stacks, hands, deck, None, config)
 
+    def run_round(self, players, deal=None):
+        '''
+        Runs one round of poker.
+        '''
+        round_state = self.new_round(deal)
         small_blind = round_state.button % 2
 
         while not isinstance(round_state, TerminalState):
@@ -419,12 +1211,40 @@ class Game():
             round_state = round_state.proceed(action)
         self.log_terminal_state(players, round_state)
         for player, player_message, delta, idx in zip(players, self.player_messages, round_state.deltas, range(2)):
-            player.query(round_state, player_message, self.log)
+            if player.pipelines():
+                player.pending_clauses = player_message[1:]
+            else:
+                player.query(round_state, player_message, self.log)
             if idx == small_blind:
                 player.sb_bankroll += delta
             else:
                 player.bb_bankroll += delta
             player.bankroll += delta
+            player.deltas.append(delta)
+            player.output.sync()
+
+    def pin(self, players):
+        '''
+        Pins the engine's threads to the first CPU in PIN_CPUS and each player's pokerbot to one of the next.
+        The pokerbots are children of the engine, so they are pinned only to their own CPUs.
+        '''
+        affinity = os.sched_getaffinity(0)
+        unavailable = pinning.unavailable_cpus(PIN_CPUS, affinity)
+        if unavailable:
+            print('PIN_CPUS lists CPUs', unavailable, 'the engine may not run on, not pinning')
+            return
+        self.affinity = affinity
+        pinning.pin(os.getpid(), pinning.cpu_for(PIN_CPUS, 0), descendants=False)
+        for index, player in enumerate(players, 1):
+            player.pin(pinning.cpu_for(PIN_CPUS, index))
+
+    def unpin(self):
+        '''
+        Lets the engine's threads run on the CPUs they were allowed before the match was pinned.
+        '''
+        if self.affinity is not None:
+            pinning.pin(os.getpid(), self.affinity, descendants=False)
+            self.affinity = None
 
     def run(self):
         '''
@@ -436,32 +1256,78 @@ class Game():
         print('/_/  /_/___/ /_/   /_/   \\___/_/\\_\\\\__/_/ /_.__/\\___/\\__/___/')
         print()
         print('Starting the Pokerbots engine...')
-        players = [
-            Player(PLAYER_1_NAME, PLAYER_1_PATH),
-            Player(PLAYER_2_NAME, PLAYER_2_PATH)
-        ]
-        for player in players:
-            player.build()
-            player.run()
-        for round_num in range(1, NUM_ROUNDS + 1):
-            self.log.append('')
-            self.log.append('Round #' + str(round_num) + STATUS(players))
-            self.run_round(players)
-            players = players[::-1]
-        self.log.append('')
-        self.log.append('Final' + STATUS(players))
+        config = self.config
+        seats = [(config.player_1_name, config.player_1_path), (config.player_2_name, config.player_2_path)]
+        pooled = WARM_POOL and not HEADLESS
+        first_round = 1
+        if pooled:
+            players = [BOT_POOL.acquire(name, path, config) for name, path in seats]
+        else:
+            player_class = LocalPlayer if HEADLESS else Player
+            players = [player_class(name, path, config) for name, path in seats]
+            if self.checkpoint is not None:
+                players = self.restore_checkpoint(players)
+                first_round = self.checkpoint['round'] + 1
+            for player in players:
+                player.build()
+                player.run()
+        if PIN_CPUS:
+            self.pin(players)
+        schedule = DealSchedule(config.deal_seed, config.num_rounds) if config.deal_seed is not None else None
+        play_start = time.perf_counter()
+        try:
+            for round_num in range(first_round, config.num_rounds + 1):
+                if self.log.enabled:
+                    self.log.write('')
+                    self.log.write('Round #' + str(round_num) + STATUS(players))
+                self.run_round(players, schedule.deal(round_num) if schedule is not None else None)
+                players = players[::-1]
+                # a pokerbot that crashed or ran out of time only checks or folds, so its rounds are not saved
+                if (CHECKPOINT_ROUNDS and round_num % CHECKPOINT_ROUNDS == 0 and round_num < config.num_rounds and
+                        all(player.game_clock > 0. for player in players)):
+                    self.save_checkpoint(players, round_num)
+            self.play_time = time.perf_counter() - play_start
+            self.log.write('')
+            self.log.write('Final' + STATUS(players))
+            if self.log.binary is not None:
+                self.log.binary.final(players)
+        finally:
+            self.log.close()
+            if self.latency_filename is not None:
+                write_latency_report(self.latency_filename, players)
+            self.unpin()
         print(f'{players[0].name} (SB): {players[0].sb_bankroll}')
         print(f'{players[0].name} (BB): {players[0].bb_bankroll}')
         print(f'{players[1].name} (SB): {players[1].sb_bankroll}')
         print(f'{players[1].name} (BB): {players[1].bb_bankroll}')
         for player in players:
-            player.stop()
-        name = GAME_LOG_FILENAME + '.txt'
-        print('Writing', name)
-        with open(name, 'w') as log_file:
-            log_file.write('\n'.join(self.log))
-        print(self.log[-1])
+            if player.latency.diverged:
+                print(player.name, 'had', player.latency.diverged, 'queries whose CPU and wall times diverged')
+        for player in players:
+            if pooled:
+                BOT_POOL.release(player)
+            else:
+                player.stop()
+        if all(player.game_clock > 0. for player in players):
+            if os.path.exists(self.checkpoint_filename):
+                os.remove(self.checkpoint_filename)
+        elif os.path.exists(self.checkpoint_filename):
+            print('A player failed, the last checkpoint is kept in', self.checkpoint_filename, '- rerun with --resume')
+        print('Final' + STATUS(players))
+        return players
+
+
+def parse_args():
+    '''
+    Parses whether to resume the match from its checkpoint.
+    '''
+    parser = argparse.ArgumentParser(prog='python3 engine.py')
+    parser.add_argument('--resume', action='store_true', help='Continue the match from its last checkpoint')
+    args = parser.parse_args()
+    if args.resume and WARM_POOL and not HEADLESS:
+        parser.error('--resume needs freshly started pokerbots, turn WARM_POOL off in config.py')
+    return args
 
 
 if __name__ == '__main__':
-    Game().run()
+    Game(resume=parse_args().resume).run()
@@ -0,0 +1,188 @@
+'''
+Slotted, integer-card round state for fast simulation.
+
+FastRoundState plays one round by the engine's rules behind the same
+legal_actions, raise_bounds and proceed API as engine.RoundState. Cards are
+ints indexing deals.CARDS, pips, stacks, hands and board live in fixed-size
+lists, and the round's actions are kept in a history array instead of a chain
+of previous states. proceed() updates the state in place and returns it, so an
+action allocates nothing; copy() the state first to branch. When the round
+ends, proceed() returns an engine TerminalState whose previous_state is this state.
+The game parameters come from a MatchConfig, config.py's settings by default.
+'''
+from array import array
+import random
+import eval7
+
+from engine import FoldAction, CallAction, CheckAction, RaiseAction, TerminalState, EVAL_CARDS, default_config
+from deals import CARDS, CARD_CODES, IntDeck, swap_mask
+
+# history entries are an action code in the low 2 bits, and a raise's amount above them
+FOLD, CALL, CHECK, RAISE = 0, 1, 2, 3
+
+CHECK_ONLY = frozenset({CheckAction})
+CHECK_OR_RAISE = frozenset({CheckAction, RaiseAction})
+FOLD_OR_CALL = frozenset({FoldAction, CallAction})
+FOLD_CALL_OR_RAISE = frozenset({FoldAction, CallAction, RaiseAction})
+
+
+class FastRoundState():
+    '''
+    Encodes one round of poker in place, for simulations that need many rounds quickly.
+    Deals from the given deals.Deal if there is one, otherwise shuffles with rng.
+    Plays under the game parameters of the given MatchConfig, config.py's without one.
+    '''
+    __slots__ = ['button', 'street', 'pips', 'stacks', 'hands', 'board', 'board_size',
+                 'deck', 'rolls', 'rng', 'history', 'config']
+
+    def __init__(self, deal=None, rng=random, config=None):
+        self.config = config = config if config is not None else default_config()
+        if deal is None:
+            self.deck = IntDeck.shuffled(rng)
+            self.rolls = None
+        else:
+            self.deck = IntDeck([CARD_CODES[card] for card in deal.cards])
+            self.rolls = (deal.flop_rolls, deal.turn_rolls)
+        self.rng = rng
+        self.hands = [self.deck.deal() for _ in range(4)]  # both cards of player 0, then both of player 1
+        self.board = [0] * 5
+        self.board_size = 0
+        self.button = 0
+        self.street = 0
+        self.pips = [config.small_blind, config.big_blind]
+        self.stacks = [config.starting_stack - config.small_blind, config.starting_stack - config.big_blind]
+        # 64-bit entries, so raise amounts of any realistic stack fit above the action code
+        self.history = array('Q')
+
+    def copy(self):
+        '''
+        Returns an independent copy of this state.
+        '''
+        state = FastRoundState.__new__(FastRoundState)
+        state.button = self.button
+        state.street = self.street
+        state.pips = self.pips[:]
+        state.stacks = self.stacks[:]
+        state.hands = self.hands[:]
+        state.board = self.board[:]
+        state.board_size = self.board_size
+        state.deck = self.deck.copy()
+        state.rolls = self.rolls
+        state.rng = self.rng
+        state.history = self.history[:]
+        state.config = self.config
+        return state
+
+    def hand(self, player):
+        '''
+        Returns a player's hole cards as strings.
+        '''
+        return [CARDS[self.hands[2 * player]], CARDS[self.hands[2 * player + 1]]]
+
+    def board_cards(self):
+        '''
+        Returns the board cards as strings.
+        '''
+        return [CARDS[card] for card in self.board[:self.board_size]]
+
+    def showdown(self):
+        '''
+        Compares the players' hands and computes payoffs.
+        '''
+        board = [EVAL_CARDS[card] for card in self.board[:self.board_size]]
+        score0 = eval7.evaluate(board + [EVAL_CARDS[self.hands[0]], EVAL_CARDS[self.hands[1]]])
+        score1 = eval7.evaluate(board + [EVAL_CARDS[self.hands[2]], EVAL_CARDS[self.hands[3]]])
+        starting_stack = self.config.starting_stack
+        if score0 > score1:
+            delta = starting_stack - self.stacks[1]
+        elif score0 < score1:
+            delta = self.stacks[0] - starting_stack
+        else:  # split the pot
+            delta = (self.stacks[0] - self.stacks[1]) // 2
+        return TerminalState([delta, -delta], self)
+
+    def legal_actions(self):
+        '''
+        Returns a set which corresponds to the active player's legal moves.
+        '''
+        active = self.button % 2
+        continue_cost = self.pips[1-active] - self.pips[active]
+        if continue_cost == 0:
+            # we can only raise the stakes if both players can afford it
+            bets_forbidden = (self.stacks[0] == 0 or self.stacks[1] == 0)
+            return CHECK_ONLY if bets_forbidden else CHECK_OR_RAISE
+        # continue_cost > 0
+        # similarly, re-raising is only allowed if both players can afford it
+        raises_forbidden = (continue_cost == self.stacks[active] or self.stacks[1-active] == 0)
+        return FOLD_OR_CALL if raises_forbidden else FOLD_CALL_OR_RAISE
+
+    def raise_bounds(self):
+        '''
+        Returns a tuple of the minimum and maximum legal raises.
+        '''
+        active = self.button % 2
+        continue_cost = self.pips[1-active] - self.pips[active]
+        max_contribution = min(self.stacks[active], self.stacks[1-active] + continue_cost)
+        min_contribution = min(max_contribution, continue_cost + max(continue_cost, self.config.big_blind))
+        return (self.pips[active] + min_contribution, self.pips[active] + max_contribution)
+
+    def proceed_street(self):
+        '''
+        Resets the players' pips and advances to the next round of betting, swapping hole cards on the flop and turn.
+        '''
+        if self.street == 5:
+            return self.showdown()
+        if self.street == 0 or self.street == 3:
+            rolls = None if self.rolls is None else self.rolls[0 if self.street == 0 else 1]
+            percent = self.config.flop_percent if self.street == 0 else self.config.turn_percent
+            mask = swap_mask(percent, self.rng, rolls)
+            for i in range(4):
+                if mask >> i & 1:
+                    card = self.deck.deal()
+                    self.deck.put(self.hands[i])
+                    self.hands[i] = card
+        for _ in range(3 if self.street == 0 else 1):
+            self.board[self.board_size] = self.deck.deal()
+            self.board_size += 1
+        self.street = 3 if self.street == 0 else self.street + 1
+        self.button = 1
+        self.pips[0] = self.pips[1] = 0
+        return self
+
+    def proceed(self, action):
+        '''
+        Advances the round by one action performed by the active player.
+        '''
+        active = self.button % 2
+        if isinstance(action, FoldAction):
+            self.history.append(FOLD)
+            starting_stack = self.config.starting_stack
+            delta = self.stacks[0] - starting_stack if active == 0 else starting_stack - self.stacks[1]
+            return TerminalState([delta, -delta], self)
+        if isinstance(action, CallAction):
+            self.history.append(CALL)
+            if self.button == 0:  # sb calls bb
+                self.button = 1
+                self.pips[0] = self.pips[1] = self.config.big_blind
+                self.stacks[0] = self.stacks[1] = self.config.starting_stack - self.config.big_blind
+                return self
+            # both players acted
+            contribution = self.pips[1-active] - self.pips[active]
+            self.stacks[active] -= contribution
+            self.pips[active] += contribution
+            self.button += 1
+            return self.proceed_street()
+        if isinstance(action, CheckAction):
+            self.history.append(CHECK)
+            if (self.street == 0 and self.button > 0) or self.button > 1:  # both players acted
+                return self.proceed_street()
+            # let opponent act
+            self.button += 1
+            return self
+        # isinstance(action, RaiseAction)
+        self.history.append(RAISE | action.amount << 2)
+        contribution = action.amount - self.pips[active]
+        self.stacks[active] -= contribution
+        self.pips[active] += contribution
+        self.button += 1
+        return self
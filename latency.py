@@ -0,0 +1,113 @@
+'''
+Per-decision response times of the pokerbots, summarized as percentiles.
+
+Every query a player answers during a round is recorded under the street it was
+asked on, the action the pokerbot answered with, and whether a raise was legal.
+At the end of the match the engine writes each player's summaries to a JSON
+sidecar next to the game log, so slow paths show up before they cost a timeout.
+
+In pinned matches the pokerbot's CPU time is recorded next to the wall time.
+Queries where the two diverge, because the bot waited for a core or ran threads
+in parallel, are flagged, since their wall time says little about the bot.
+'''
+import json
+
+from config import CPU_DIVERGENCE
+
+STREETS = {0: 'preflop', 3: 'flop', 4: 'turn', 5: 'river'}
+ACTION_NAMES = {'F': 'fold', 'C': 'call', 'K': 'check', 'R': 'raise'}
+# upper bounds of the histogram buckets, in milliseconds
+BUCKETS_MS = [0.1, 0.3, 1, 3, 10, 30, 100, 300, 1000, 3000]
+BUCKET_LABELS = ['<=' + str(bound) for bound in BUCKETS_MS] + ['>' + str(BUCKETS_MS[-1])]
+# differences between CPU and wall time below this many seconds are never flagged
+DIVERGENCE_FLOOR = 0.001
+# flagged queries listed in the report, the rest are only counted
+MAX_FLAGGED = 20
+
+
+def percentile(samples, fraction):
+    '''
+    Returns the sample at the given fraction of the sorted samples.
+    '''
+    return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+
+def summarize(samples):
+    '''
+    Returns the count, percentiles and histogram of response times given in seconds, in milliseconds.
+    '''
+    samples = sorted(1000. * sample for sample in samples)
+    histogram = [0] * (len(BUCKETS_MS) + 1)
+    bucket = 0
+    for sample in samples:
+        while bucket < len(BUCKETS_MS) and sample > BUCKETS_MS[bucket]:
+            bucket += 1
+        histogram[bucket] += 1
+    return {
+        'count': len(samples),
+        'mean_ms': round(sum(samples) / len(samples), 4),
+        'p50_ms': round(percentile(samples, 0.5), 4),
+        'p90_ms': round(percentile(samples, 0.9), 4),
+        'p99_ms': round(percentile(samples, 0.99), 4),
+        'max_ms': round(samples[-1], 4),
+        'histogram': {label: count for label, count in zip(BUCKET_LABELS, histogram) if count > 0},
+    }
+
+
+class LatencyRecorder():
+    '''
+    Collects one player's response times, keyed by street, action and whether a raise was legal.
+    '''
+
+    def __init__(self):
+        self.samples = {}
+        self.cpu_samples = []
+        self.count = 0
+        self.diverged = 0
+        self.flagged = []
+
+    def record(self, street, clause, raise_legal, seconds, cpu_seconds=None):
+        '''
+        Records one response, given the street it was asked on and the raw clause the pokerbot sent,
+        and the CPU time the pokerbot spent on it if it is known.
+        '''
+        key = (STREETS.get(street, str(street)), ACTION_NAMES.get(clause[:1], 'invalid'), raise_legal)
+        self.samples.setdefault(key, []).append(seconds)
+        self.count += 1
+        if cpu_seconds is None:
+            return
+        self.cpu_samples.append(cpu_seconds)
+        if abs(seconds - cpu_seconds) > max(CPU_DIVERGENCE * seconds, DIVERGENCE_FLOOR):
+            self.diverged += 1
+            if len(self.flagged) < MAX_FLAGGED:
+                self.flagged.append({'query': self.count, 'street': key[0], 'action': key[1],
+                                     'wall_ms': round(1000. * seconds, 4), 'cpu_ms': round(1000. * cpu_seconds, 4)})
+
+    def summary(self):
+        '''
+        Returns the summaries of all responses, and broken down by street, action and raise legality.
+        '''
+        groups = {'street': {}, 'action': {}, 'raise_legal': {}}
+        everything = []
+        for (street, action, raise_legal), samples in self.samples.items():
+            everything += samples
+            groups['street'].setdefault(street, []).extend(samples)
+            groups['action'].setdefault(action, []).extend(samples)
+            groups['raise_legal'].setdefault('yes' if raise_legal else 'no', []).extend(samples)
+        if not everything:
+            return {'all': None}
+        report = {'all': summarize(everything)}
+        for name, group in groups.items():
+            report[name] = {key: summarize(samples) for key, samples in sorted(group.items())}
+        if self.cpu_samples:
+            report['cpu'] = summarize(self.cpu_samples)
+            report['diverged'] = {'count': self.diverged, 'queries': self.flagged}
+        return report
+
+
+def write_latency_report(filename, players):
+    '''
+    Writes every player's latency summary to a JSON file.
+    '''
+    with open(filename, 'w') as report_file:
+        json.dump({player.name: player.latency.summary() for player in players}, report_file, indent=2)
@@ -0,0 +1,250 @@
+'''
+Round-robin league over every bot found in the given directories, rated by Bradley-Terry.
+
+Bots are the directories holding a commands.json and the .zip bundles found
+directly in each directory given. Every pair plays seeded duplicate matches,
+and the two seatings of a seed make one game, won by the bot ahead in chips.
+Ratings are fitted to the games by Bradley-Terry and reported on the Elo scale,
+with 95% intervals from resampling each pairing's games.
+
+Every match's bankrolls are cached in LEAGUE_CACHE_DIR under the hashes of both
+bots' contents, the engine's sources, the seed and the game parameters, so a
+rerun plays only the matches of new or changed bots, and a changed engine
+replays them all. Match logs stay in the --out directory of the run that played them.
+
+Usage: python league.py [DIR ...] [--exclude PATTERN ...] [--seeds N] [--rounds N] [--workers N]
+'''
+import argparse
+import fnmatch
+import hashlib
+import json
+import math
+import os
+import random
+import tempfile
+
+from build_cache import source_hash
+from bundles import bundle_hash, resolve_bot
+from config import (LEAGUE_CACHE_DIR, NUM_ROUNDS, STARTING_STACK, BIG_BLIND, SMALL_BLIND, FLOP_PERCENT, TURN_PERCENT,
+                    STARTING_GAME_CLOCK, ENFORCE_GAME_CLOCK, PIN_CPUS)
+from latency import percentile
+from pinning import worker_error
+from tournament import bot_name, run_tournament, schedule
+
+# bumped whenever a change to the cache's layout invalidates cached results
+CACHE_VERSION = 2
+# the engine's sources that decide a match's result, next to this file
+ENGINE_SOURCES = ['engine.py', 'deals.py']
+# bots that cannot play unattended
+DEFAULT_EXCLUDE = ['input_bot']
+# each pairing starts with this many virtual drawn games, so unbeaten bots get finite ratings
+PRIOR_DRAWS = 1.
+
+
+def discover(roots, exclude=()):
+    '''
+    Returns the absolute paths of the bots in the given directories, or the roots themselves if they are bots.
+    '''
+    bots = []
+    for root in roots:
+        if os.path.isfile(os.path.join(root, 'commands.json')) or root.endswith('.zip'):
+            candidates = [root]
+        else:
+            candidates = [os.path.join(root, name) for name in sorted(os.listdir(root))]
+        for path in candidates:
+            name = bot_name(path)
+            if name.startswith(('.', '_')) or any(fnmatch.fnmatch(name, pattern) for pattern in exclude):
+                continue
+            if os.path.isfile(os.path.join(path, 'commands.json')) or (path.endswith('.zip') and os.path.isfile(path)):
+                bots.append(os.path.abspath(path))
+    return bots
+
+
+def bot_hash(path):
+    '''
+    Returns the hash of a bot's contents: the bytes of a bundle, or the sources of a directory.
+    '''
+    return bundle_hash(path) if path.endswith('.zip') else source_hash(path, None)
+
+
+def engine_hash():
+    '''
+    Returns the hash of the engine's sources, so results played by an older engine are not reused.
+    '''
+    digest = hashlib.sha256()
+    for filename in ENGINE_SOURCES:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), filename), 'rb') as source_file:
+            digest.update(hashlib.sha256(source_file.read()).digest())
+    return digest.hexdigest()
+
+
+def cache_dir():
+    '''
+    Returns the absolute result cache directory. Relative settings are taken from the engine's directory.
+    '''
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.expanduser(LEAGUE_CACHE_DIR))
+
+
+def result_key(engine, hash_1, hash_2, seed, parameters):
+    '''
+    Returns the cache key of a match, given the engine's hash and the hashes of the bots in their seats.
+    '''
+    key = json.dumps([CACHE_VERSION, engine, hash_1, hash_2, seed, parameters], sort_keys=True)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def read_result(key):
+    '''
+    Returns the cached bankrolls of a match, in seat order, or None if it has not been played.
+    '''
+    try:
+        with open(os.path.join(cache_dir(), key + '.json'), 'r') as result_file:
+            return json.load(result_file)['bankrolls']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def write_result(key, bankrolls):
+    '''
+    Caches the bankrolls of a match, in seat order. The file is published atomically.
+    '''
+    os.makedirs(cache_dir(), exist_ok=True)
+    handle, temporary = tempfile.mkstemp(dir=cache_dir(), suffix='.tmp')
+    with os.fdopen(handle, 'w') as result_file:
+        json.dump({'bankrolls': bankrolls}, result_file)
+    os.replace(temporary, os.path.join(cache_dir(), key + '.json'))
+
+
+def fit_ratings(count, games, start=None, iterations=1000, tolerance=1e-9):
+    '''
+    Fits Bradley-Terry strengths by minorization-maximization and returns them as Elo ratings averaging 0.
+    games maps a pair of bot indices (i, j) to i's scores in their games: 1 for a win, 0.5 for a draw, 0 for a loss.
+    '''
+    wins = [0.] * count
+    pairs = []
+    for (i, j), scores in games.items():
+        played = len(scores) + PRIOR_DRAWS
+        won = sum(scores) + PRIOR_DRAWS / 2
+        wins[i] += won
+        wins[j] += played - won
+        pairs.append((i, j, played))
+    strengths = [10 ** (rating / 400) for rating in start] if start is not None else [1.] * count
+    for _ in range(iterations):
+        denominators = [0.] * count
+        for i, j, played in pairs:
+            share = played / (strengths[i] + strengths[j])
+            denominators[i] += share
+            denominators[j] += share
+        updated = [wins[k] / denominators[k] if denominators[k] > 0 else strengths[k] for k in range(count)]
+        scale = math.exp(sum(math.log(strength) for strength in updated) / count)
+        updated = [strength / scale for strength in updated]
+        change = max(abs(math.log(new / old)) for new, old in zip(updated, strengths))
+        strengths = updated
+        if change < tolerance:
+            break
+    return [400 * math.log10(strength) for strength in strengths]
+
+
+def bootstrap_intervals(count, games, ratings, samples, seed=0):
+    '''
+    Returns each bot's 95% rating interval, refitting the ratings to games resampled within every pairing.
+    '''
+    rng = random.Random(seed)
+    fits = [[] for _ in range(count)]
+    for _ in range(samples):
+        resampled = {pair: [rng.choice(scores) for _ in scores] for pair, scores in games.items()}
+        for k, rating in enumerate(fit_ratings(count, resampled, ratings, iterations=100, tolerance=1e-6)):
+            fits[k].append(rating)
+    return [(percentile(sorted(fit), 0.025), percentile(sorted(fit), 0.975)) if fit else (rating, rating)
+            for fit, rating in zip(fits, ratings)]
+
+
+def parse_args():
+    '''
+    Parses where to find the bots and the league layout.
+    '''
+    parser = argparse.ArgumentParser(prog='python3 league.py')
+    parser.add_argument('roots', nargs='*', default=['.'], help='Directories to search for bots, defaults to .')
+    parser.add_argument('--exclude', nargs='+', default=DEFAULT_EXCLUDE, metavar='PATTERN',
+                        help='Bot names to leave out, defaults to ' + ' '.join(DEFAULT_EXCLUDE))
+    parser.add_argument('--seeds', type=int, default=2, help='Number of duplicate seeds per pairing, defaults to 2')
+    parser.add_argument('--first-seed', type=int, default=0, help='First seed, defaults to 0')
+    parser.add_argument('--rounds', type=int, default=NUM_ROUNDS, help='Rounds per match, defaults to NUM_ROUNDS')
+    parser.add_argument('--bootstrap', type=int, default=100, help='Resamples for the rating intervals, defaults to 100')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes, defaults to all cores')
+    parser.add_argument('--out', type=str, default='league', help='Directory for per-match logs and the standings')
+    parser.add_argument('--headless', action='store_true', help='Run Python bots in-process instead of over sockets')
+    parser.add_argument('--warm', action='store_true', help='Keep bots running between the matches of each worker')
+    args = parser.parse_args()
+    error = worker_error(PIN_CPUS, args.workers)
+    if error is not None:
+        parser.error(error)
+    return args
+
+
+def main():
+    '''
+    Plays the league's uncached matches from the command line and writes standings.json.
+    '''
+    args = parse_args()
+    bots = discover(args.roots, args.exclude)
+    hashes = {bot: bot_hash(bot) for bot in bots}
+    for bot in bots:
+        resolve_bot(bot)  # extract any .zip bundles once, before the workers need them
+    parameters = {'num_rounds': args.rounds, 'starting_stack': STARTING_STACK, 'big_blind': BIG_BLIND,
+                  'small_blind': SMALL_BLIND, 'flop_percent': FLOP_PERCENT, 'turn_percent': TURN_PERCENT,
+                  'starting_game_clock': STARTING_GAME_CLOCK, 'enforce_game_clock': ENFORCE_GAME_CLOCK}
+    out_dir = os.path.abspath(args.out)
+    seeds = range(args.first_seed, args.first_seed + args.seeds)
+    specs = [spec._replace(variant=(('num_rounds', args.rounds),))
+             for spec in schedule(bots, seeds, out_dir, duplicate=True)]
+    engine = engine_hash()
+    keys = {spec.index: result_key(engine, hashes[spec.bot_a], hashes[spec.bot_b], spec.seed, parameters)
+            for spec in specs}
+    bankrolls = {spec.index: read_result(keys[spec.index]) for spec in specs}
+    unplayed = [spec for spec in specs if bankrolls[spec.index] is None]
+    print('{} bots, {} matches, {} cached, playing {} on {} workers'.format(
+        len(bots), len(specs), len(specs) - len(unplayed), len(unplayed), args.workers))
+    if unplayed:
+        for result in run_tournament(unplayed, args.workers, args.headless, args.warm):
+            spec = result.spec
+            bankrolls[spec.index] = [result.bankrolls[spec.bot_a], result.bankrolls[spec.bot_b]]
+            write_result(keys[spec.index], bankrolls[spec.index])
+    # a game is both seatings of a seed, scored for the pairing's first bot
+    index = {bot: k for k, bot in enumerate(bots)}
+    chips = {}
+    for spec in specs:
+        first, second = sorted([spec.bot_a, spec.bot_b], key=index.get)
+        own = bankrolls[spec.index][0 if spec.bot_a == first else 1]
+        per_seed = chips.setdefault((index[first], index[second]), {})
+        per_seed[spec.seed] = per_seed.get(spec.seed, 0) + own
+    games = {pair: [1. if total > 0 else 0. if total < 0 else 0.5 for total in per_seed.values()]
+             for pair, per_seed in chips.items()}
+    ratings = fit_ratings(len(bots), games)
+    intervals = bootstrap_intervals(len(bots), games, ratings, args.bootstrap, args.first_seed)
+    standings = []
+    for k, bot in enumerate(bots):
+        scores, totals = [], []
+        for (i, j), per_seed in chips.items():
+            if k in (i, j):
+                sign = 1 if k == i else -1
+                scores += [score if k == i else 1. - score for score in games[(i, j)]]
+                totals += [sign * total for total in per_seed.values()]
+        standings.append({'bot': bot_name(bot), 'path': bot, 'hash': hashes[bot], 'elo': round(ratings[k], 1),
+                          'elo_low': round(intervals[k][0], 1), 'elo_high': round(intervals[k][1], 1),
+                          'games': len(scores), 'score': sum(scores) / len(scores) if scores else 0.,
+                          'chips_per_game': sum(totals) / len(totals) if totals else 0.})
+    standings.sort(key=lambda entry: -entry['elo'])
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, 'standings.json'), 'w') as standings_file:
+        json.dump({'engine': engine, 'parameters': parameters, 'seeds': list(seeds), 'standings': standings},
+                  standings_file, indent=4)
+    print()
+    for rank, entry in enumerate(standings, 1):
+        print('{:3d}. {}: {:+.0f} [{:+.0f}, {:+.0f}], {:.0%} of {} games, {:+.1f} chips per game'.format(
+            rank, entry['bot'], entry['elo'], entry['elo_low'], entry['elo_high'], entry['score'], entry['games'],
+            entry['chips_per_game']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+'''
+CPU pinning and per-query CPU time, for bot timings that are comparable between runs.
+
+With PIN_CPUS set, the engine runs on the first CPU listed and each player's
+pokerbot on one of the next, so the bots, the engine and its output threads
+stop competing for cores. Only the engine's own threads are pinned to its CPU,
+and they get back the CPUs they were allowed before once the match ends. Every
+thread of a pokerbot, and of the processes it started, such as the binary
+behind a run.sh, is pinned once it has connected; threads started later
+inherit their creator's CPU. Parallel workers would pin their matches to the
+same CPUs, so PIN_CPUS needs a single worker.
+
+A pokerbot's CPU time is the sum of the on-CPU nanoseconds its threads report in
+/proc/<pid>/task/<tid>/schedstat. The threads are listed when the bot is pinned,
+so only those running by then are counted.
+'''
+import os
+
+
+def cpu_for(pin_cpus, index):
+    '''
+    Returns the set holding the CPU of the engine (index 0) or of a player (index 1 and up), given the PIN_CPUS list.
+    Indices past the end of the list wrap around, sharing CPUs.
+    '''
+    return {pin_cpus[index % len(pin_cpus)]}
+
+
+def unavailable_cpus(pin_cpus, allowed):
+    '''
+    Returns the CPUs in the PIN_CPUS list outside the allowed set.
+    '''
+    return sorted(set(pin_cpus) - allowed)
+
+
+def worker_error(pin_cpus, workers):
+    '''
+    Returns why the PIN_CPUS list cannot be used with the given number of worker processes, or None if it can.
+    '''
+    if pin_cpus and workers > 1:
+        return 'PIN_CPUS would pin every worker to the same CPUs, run with --workers 1 or set PIN_CPUS to None'
+    return None
+
+
+def tasks(pid, descendants=True):
+    '''
+    Returns the /proc directories of every thread of a process and, with descendants, of the processes it started.
+    '''
+    found = []
+    pending = [pid]
+    while pending:
+        process = pending.pop()
+        try:
+            tids = os.listdir('/proc/{}/task'.format(process))
+        except OSError:
+            continue
+        for tid in tids:
+            task = '/proc/{}/task/{}'.format(process, tid)
+            found.append(task)
+            if not descendants:
+                continue
+            try:
+                with open(task + '/children', 'r') as children_file:
+                    pending += [int(child) for child in children_file.read().split()]
+            except (OSError, ValueError):
+                pass
+    return found
+
+
+def pin(pid, cpus, descendants=True):
+    '''
+    Pins every thread of a process, and with descendants of the processes it started, to the given CPUs.
+    Returns the threads' /proc directories.
+    '''
+    found = tasks(pid, descendants)
+    for task in found:
+        try:
+            os.sched_setaffinity(int(os.path.basename(task)), cpus)
+        except OSError:
+            pass  # the thread has exited
+    return found
+
+
+def cpu_seconds(task_dirs):
+    '''
+    Returns the total CPU time of the given threads, in seconds.
+    '''
+    total = 0
+    for task in task_dirs:
+        try:
+            with open(task + '/schedstat', 'r') as schedstat_file:
+                total += int(schedstat_file.read().split()[0])
+        except (OSError, ValueError, IndexError):
+            pass  # the thread has exited, and its time is no longer counted
+    return total / 1e9
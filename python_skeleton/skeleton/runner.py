@@ -2,35 +2,52 @@
 The infrastructure for interacting with the engine.
 '''
 import argparse
+import os
 import socket
 from .actions import FoldAction, CallAction, CheckAction, RaiseAction
 from .states import GameState, TerminalState, RoundState
-from .states import STARTING_STACK, BIG_BLIND, SMALL_BLIND, FLOP_PERCENT, TURN_PERCENT
+from .states import STARTING_STACK, BIG_BLIND, SMALL_BLIND, FIRST_ROUND, FIRST_BANKROLL
 from .bot import Bot
 
 
+class Table():
+    '''
+    One game as seen by its pokerbot: the bot instance and the states the engine has sent so far.
+    '''
+
+    def __init__(self, pokerbot, game_state=GameState(0, 0., 1)):
+        self.pokerbot = pokerbot
+        self.game_state = game_state
+        self.round_state = None
+        self.active = 0
+        self.round_flag = True
+
+
 class Runner():
     '''
     Interacts with the engine.
     '''
 
-    def __init__(self, pokerbot, socketfile):
+    def __init__(self, pokerbot, socketfile, writefile=None):
         self.pokerbot = pokerbot
         self.socketfile = socketfile
+        self.writefile = writefile if writefile is not None else socketfile
+        self.tables = {}
+        self.unused_pokerbot = pokerbot
 
     def receive(self):
         '''
         Generator for incoming messages from the engine.
         '''
         while True:
-            packet = self.socketfile.readline().strip().split(' ')
-            if not packet:
+            line = self.socketfile.readline()
+            if not line:  # the engine closed the connection
                 break
-            yield packet
+            yield line.strip().split(' ')
 
-    def send(self, action):
+    def send(self, action, tag=None):
         '''
-        Encodes an action and sends it to the engine.
+        Encodes an action and sends it to the engine, prefixed by the table tag if there is one.
         '''
         if isinstance(action, FoldAction):
             code = 'F'
@@ -40,74 +57,113 @@ class Runner():
             code = 'K'
         else:  # isinstance(action, RaiseAction)
             code = 'R' + str(action.amount)
-        self.socketfile.write(code + '\n')
-        self.socketfile.flush()
+        if tag is not None:
+            code = tag + ' ' + code
+        self.writefile.write(code + '\n')
+        self.writefile.flush()
+
+    def new_table(self):
+        '''
+        Creates a table for a newly tagged game. The first table plays with the
+        pokerbot we were given, later tables with fresh instances of its class.
+        '''
+        pokerbot = self.unused_pokerbot if self.unused_pokerbot is not None else type(self.pokerbot)()
+        self.unused_pokerbot = None
+        return Table(pokerbot)
+
+    def play(self, table, packet):
+        '''
+        Reconstructs the game tree of one table based on the action history received from the engine.
+        Returns the response to send, or None once the game is over.
+        '''
+        game_state = table.game_state
+        round_state = table.round_state
+        active = table.active
+        for clause in packet:
+            if clause[0] == 'T':
+                game_state = GameState(game_state.bankroll, float(clause[1:]), game_state.round_num)
+            elif clause[0] == 'P':
+                active = int(clause[1:])
+            elif clause[0] == 'H':
+                hands = [[], []]
+                hands[active] = clause[1:].split(',')
+                pips = [SMALL_BLIND, BIG_BLIND]
+                stacks = [STARTING_STACK - SMALL_BLIND, STARTING_STACK - BIG_BLIND]
+                round_state = RoundState(0, 0, pips, stacks, hands, [], None)
+                if table.round_flag:
+                    table.pokerbot.handle_new_round(game_state, round_state, active)
+                    table.round_flag = False
+            elif clause[0] == 'U':
+                hands = [[], []]
+                hands[active] = clause[1:].split(',')
+                round_state = RoundState(round_state.button, round_state.street, round_state.pips, round_state.stacks,
+                                         hands, round_state.deck, round_state.previous_state)
+            elif clause[0] == 'F':
+                round_state = round_state.proceed(FoldAction())
+            elif clause[0] == 'C':
+                round_state = round_state.proceed(CallAction())
+            elif clause[0] == 'K':
+                round_state = round_state.proceed(CheckAction())
+            elif clause[0] == 'R':
+                round_state = round_state.proceed(RaiseAction(int(clause[1:])))
+            elif clause[0] == 'B':
+                round_state = RoundState(round_state.button, round_state.street, round_state.pips, round_state.stacks,
+                                         round_state.hands, clause[1:].split(','), round_state.previous_state)
+            elif clause[0] == 'O':
+                # backtrack
+                round_state = round_state.previous_state
+                revised_hands = list(round_state.hands)
+                revised_hands[1-active] = clause[1:].split(',')
+                # rebuild history
+                round_state = RoundState(round_state.button, round_state.street, round_state.pips, round_state.stacks,
+                                         revised_hands, round_state.deck, round_state.previous_state)
+                round_state = TerminalState([0, 0], round_state)
+            elif clause[0] == 'D':
+                assert isinstance(round_state, TerminalState)
+                delta = int(clause[1:])
+                deltas = [-delta, -delta]
+                deltas[active] = delta
+                round_state = TerminalState(deltas, round_state.previous_state)
+                game_state = GameState(game_state.bankroll + delta, game_state.game_clock, game_state.round_num)
+                table.pokerbot.handle_round_over(game_state, round_state, active)
+                game_state = GameState(game_state.bankroll, game_state.game_clock, game_state.round_num + 1)
+                table.round_flag = True
+            elif clause[0] == 'Q':
+                return None
+        table.game_state = game_state
+        table.round_state = round_state
+        table.active = active
+        if table.round_flag:  # ack the engine
+            return CheckAction()
+        assert active == round_state.button % 2
+        return table.pokerbot.get_action(game_state, round_state, active)
 
     def run(self):
         '''
-        Reconstructs the game tree based on the action history received from the engine.
+        Plays the engine's game, or every table of a multi-table engine.
+        Multi-table messages start with a G clause naming their table, and our
+        responses carry the same tag. A tagged Q ends that table only.
+        A message ending in N ends the game without a response, and the next
+        message starts a new game with a fresh instance of the pokerbot's class.
         '''
-        game_state = GameState(0, 0., 1)
-        round_state = None
-        active = 0
-        round_flag = True
+        untagged = Table(self.pokerbot, GameState(FIRST_BANKROLL, 0., FIRST_ROUND))
         for packet in self.receive():
-            for clause in packet:
-                if clause[0] == 'T':
-                    game_state = GameState(game_state.bankroll, float(clause[1:]), game_state.round_num)
-                elif clause[0] == 'P':
-                    active = int(clause[1:])
-                elif clause[0] == 'H':
-                    hands = [[], []]
-                    hands[active] = clause[1:].split(',')
-                    pips = [SMALL_BLIND, BIG_BLIND]
-                    stacks = [STARTING_STACK - SMALL_BLIND, STARTING_STACK - BIG_BLIND]
-                    round_state = RoundState(0, 0, pips, stacks, hands, [], None)
-                    if round_flag:
-                        self.pokerbot.handle_new_round(game_state, round_state, active)
-                        round_flag = False
-                elif clause[0] == 'U':
-                    hands = [[], []]
-                    hands[active] = clause[1:].split(',')
-                    round_state = RoundState(round_state.button, round_state.street, round_state.pips, round_state.stacks,
-                                             hands, round_state.deck, round_state.previous_state)
-                elif clause[0] == 'F':
-                    round_state = round_state.proceed(FoldAction())
-                elif clause[0] == 'C':
-                    round_state = round_state.proceed(CallAction())
-                elif clause[0] == 'K':
-                    round_state = round_state.proceed(CheckAction())
-                elif clause[0] == 'R':
-                    round_state = round_state.proceed(RaiseAction(int(clause[1:])))
-                elif clause[0] == 'B':
-                    round_state = RoundState(round_state.button, round_state.street, round_state.pips, round_state.stacks,
-                                             round_state.hands, clause[1:].split(','), round_state.previous_state)
-                elif clause[0] == 'O':
-                    # backtrack
-                    round_state = round_state.previous_state
-                    revised_hands = list(round_state.hands)
-                    revised_hands[1-active] = clause[1:].split(',')
-                    # rebuild history
-                    round_state = RoundState(round_state.button, round_state.street, round_state.pips, round_state.stacks,
-                                             revised_hands, round_state.deck, round_state.previous_state)
-                    round_state = TerminalState([0, 0], round_state)
-                elif clause[0] == 'D':
-                    assert isinstance(round_state, TerminalState)
-                    delta = int(clause[1:])
-                    deltas = [-delta, -delta]
-                    deltas[active] = delta
-                    round_state = TerminalState(deltas, round_state.previous_state)
-                    game_state = GameState(game_state.bankroll + delta, game_state.game_clock, game_state.round_num)
-                    self.pokerbot.handle_round_over(game_state, round_state, active)
-                    game_state = GameState(game_state.bankroll, game_state.game_clock, game_state.round_num + 1)
-                    round_flag = True
-                elif clause[0] == 'Q':
-                    return
-            if round_flag:  # ack the engine
-                self.send(CheckAction())
+            if packet[0][:1] == 'G':
+                tag = packet[0]
+                if tag not in self.tables:
+                    self.tables[tag] = self.new_table()
+                action = self.play(self.tables[tag], packet[1:])
+                if action is None:
+                    del self.tables[tag]
+                else:
+                    self.send(action, tag)
+            elif packet[-1] == 'N':
+                self.play(untagged, packet[:-1])  # deliver the last round's result
+                untagged = Table(type(self.pokerbot)())
             else:
-                assert active == round_state.button % 2
-                action = self.pokerbot.get_action(game_state, round_state, active)
+                action = self.play(untagged, packet)
+                if action is None:
+                    return
                 self.send(action)
 
 
@@ -117,7 +173,9 @@ def parse_args():
     '''
     parser = argparse.ArgumentParser(prog='python3 player.py')
     parser.add_argument('--host', type=str, default='localhost', help='Host to connect to, defaults to localhost')
-    parser.add_argument('port', type=int, help='Port on host to connect to')
+    parser.add_argument('--unix', type=str, default=None, help='Unix domain socket to connect to instead of a port')
+    parser.add_argument('--fd', type=int, default=None, help='Inherited socket descriptor to use instead of a port')
+    parser.add_argument('port', type=int, nargs='?', help='Port on host to connect to')
     return parser.parse_args()
 
 def run_bot(pokerbot, args):
@@ -126,12 +184,25 @@ def run_bot(pokerbot, args):
     '''
     assert isinstance(pokerbot, Bot)
     try:
-        sock = socket.create_connection((args.host, args.port))
+        if args.fd is not None:
+            sock = socket.socket(fileno=args.fd)
+        elif args.unix is not None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(args.unix)
+        else:
+            sock = socket.create_connection((args.host, args.port))
+            # the engine asks for Nagle's algorithm to be disabled only under its tcp_nodelay transport
+            if os.environ.get('POKERBOTS_TCP_NODELAY') == '1':
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
     except OSError:
-        print('Could not connect to {}:{}'.format(args.host, args.port))
+        print('Could not connect to {}'.format(args.unix or args.fd or '{}:{}'.format(args.host, args.port)))
         return
-    socketfile = sock.makefile('rw')
-    runner = Runner(pokerbot, socketfile)
+    # writing through a shared 'rw' file would discard messages it has already read ahead,
+    # and a multi-table engine sends ahead, so reads and writes get separate files
+    socketfile = sock.makefile('r')
+    writefile = sock.makefile('w')
+    runner = Runner(pokerbot, socketfile, writefile)
     runner.run()
     socketfile.close()
+    writefile.close()
     sock.close()
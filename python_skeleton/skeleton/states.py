@@ -2,17 +2,22 @@
 Encapsulates game and round state information for the player.
 '''
 from collections import namedtuple
+import os
 from .actions import FoldAction, CallAction, CheckAction, RaiseAction
 
 GameState = namedtuple('GameState', ['bankroll', 'game_clock', 'round_num'])
 TerminalState = namedtuple('TerminalState', ['deltas', 'previous_state'])
 
-FLOP_PERCENT = 0.1
-TURN_PERCENT = 0.05
-NUM_ROUNDS = 1000
-STARTING_STACK = 200
-BIG_BLIND = 2
-SMALL_BLIND = 1
+# the engine passes the match's game parameters if they differ from the standard variant
+FLOP_PERCENT = float(os.environ.get('POKERBOTS_FLOP_PERCENT', 0.1))
+TURN_PERCENT = float(os.environ.get('POKERBOTS_TURN_PERCENT', 0.05))
+NUM_ROUNDS = int(os.environ.get('POKERBOTS_NUM_ROUNDS', 1000))
+STARTING_STACK = int(os.environ.get('POKERBOTS_STARTING_STACK', 200))
+BIG_BLIND = int(os.environ.get('POKERBOTS_BIG_BLIND', 2))
+SMALL_BLIND = int(os.environ.get('POKERBOTS_SMALL_BLIND', 1))
+# a match resumed from a checkpoint restarts its pokerbots at the round and bankroll it picks up from
+FIRST_ROUND = int(os.environ.get('POKERBOTS_FIRST_ROUND', 1))
+FIRST_BANKROLL = int(os.environ.get('POKERBOTS_FIRST_BANKROLL', 0))
 
 
 class RoundState(namedtuple('_RoundState', ['button', 'street', 'pips', 'stacks', 'hands', 'deck', 'previous_state'])):
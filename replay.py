@@ -0,0 +1,253 @@
+'''
+Replays a recorded match to one Python pokerbot, in-process, without an opponent or sockets.
+
+The game log is turned back into the messages the engine sent the chosen
+player: its T, P and H clauses, the action history, the B, U and O clauses and
+the D deltas, acked or pipelined as the bot's commands.json asks. The messages
+are fed through the bot's own skeleton Runner, which reads them from a stand-in
+for its socket file, so the bot is driven exactly as in a live match. Each of its
+decisions is timed and reported next to the action in the log.
+
+The game log must be a 'full' gamelog.txt, or a binary gamelog.bin, of a match
+played with config.py's game parameters. Decisions after the logged player ran
+out of time or disconnected were never sent, so the replay stops there.
+
+Usage: python replay.py GAMELOG BOT [--player NAME] [--csv FILE] [--profile FILE]
+'''
+from collections import namedtuple
+from contextlib import redirect_stdout
+import argparse
+import cProfile
+import csv
+import json
+import os
+import pstats
+import time
+
+import engine
+from binlog import open_log, render
+from latency import percentile
+
+# one message to the player, and the response the log records for it: an action code, or None for acks
+Query = namedtuple('Query', ['round_num', 'street', 'clauses', 'logged'])
+Decision = namedtuple('Decision', ['round_num', 'street', 'logged', 'response', 'seconds'])
+ACTION_CODES = {'folds': 'F', 'calls': 'C', 'checks': 'K'}
+STREET_CARDS = {'Flop': 3, 'Turn': 4, 'River': 5}
+
+
+def read_lines(filename):
+    '''
+    Returns the lines of a text game log, or of a binary one rendered as text.
+    '''
+    if filename.endswith('.bin'):
+        return list(render(open_log(filename)))
+    with open(filename, 'r') as log_file:
+        return log_file.read().split('\n')
+
+
+def split_name(line, names):
+    '''
+    Returns the player a log line is about and the rest of the line, or (None, line).
+    '''
+    for name in names:
+        if line.startswith(name + ' ') or line.startswith(name + "'s "):
+            return name, line[len(name):]
+    return None, line
+
+
+def cards(text):
+    '''
+    Converts bracketed log cards, like '[As Kd]', into clause cards, like 'As,Kd'.
+    '''
+    return ','.join(text[text.index('[') + 1:text.rindex(']')].split())
+
+
+def queries(lines, name, pipelined):
+    '''
+    Yields every message the engine sent the named player during the logged match, in order.
+    '''
+    names = lines[0].split(' - ', 1)[1].split(' vs ')
+    if name not in names:
+        raise ValueError('{} did not play in this match, the players are {}'.format(name, ' and '.join(names)))
+    messages = {player: ['T'] for player in names}
+    pending = []
+    round_num, street, awards = 0, 0, 0
+    for line in lines[1:]:
+        if line.startswith('Round #'):
+            round_num = int(line[len('Round #'):line.index(',')])
+            street, awards = 0, 0
+            seats = [player for player in sorted(names, key=lambda player: line.index(', ' + player + ' ('))]
+            for seat, player in enumerate(seats):
+                messages[player] = ['T'] + (pending if player == name else []) + ['P' + str(seat)]
+            pending = []
+            continue
+        if line.split(' ', 1)[0] in STREET_CARDS:
+            street = STREET_CARDS[line.split(' ', 1)[0]]
+            for player in names:
+                messages[player].append('B' + cards(line))
+            continue
+        player, rest = split_name(line, names)
+        if player is None:
+            continue
+        if rest.startswith(' dealt '):
+            messages[player].append('H' + cards(rest))
+        elif rest.startswith("'s hand: "):
+            messages[player].append('U' + cards(rest))
+        elif rest.startswith(' shows '):
+            for other in names:
+                if other != player:
+                    messages[other].append('O' + cards(rest))
+        elif rest.startswith(' awarded '):
+            messages[player].append('D' + rest.split()[-1])
+            awards += 1
+            if awards == 2:
+                if pipelined:
+                    pending = messages[name][1:]
+                else:
+                    yield Query(round_num, street, messages[name], None)
+                messages = {player: ['T'] for player in names}
+        elif rest.strip() in ('ran out of time', 'disconnected'):
+            if player == name:
+                return
+        else:
+            words = rest.split()
+            if words[0] in ACTION_CODES:
+                code = ACTION_CODES[words[0]]
+            elif words[0] in ('raises', 'bets'):
+                code = 'R' + words[-1]
+            else:
+                continue  # blinds, and the engine's notes on illegal or misformatted responses
+            if player == name:
+                yield Query(round_num, street, messages[name], code)
+                messages[name] = ['T']
+            for other in names:
+                messages[other].append(code)
+    yield Query(round_num, street, pending + ['Q'], None)
+
+
+class ScriptedSocket():
+    '''
+    Stands in for a Runner's socket file: hands it the scripted messages and times its responses.
+    The T clause is filled in from a game clock charged with the bot's time, as the engine would.
+    '''
+
+    def __init__(self, script, game_clock):
+        self.script = iter(script)
+        self.game_clock = game_clock
+        self.current = None
+        self.sent_time = 0.
+        self.decisions = []
+
+    def readline(self):
+        '''
+        Returns the next message, or an empty line once the script is over.
+        '''
+        self.current = next(self.script, None)
+        if self.current is None:
+            return ''
+        clauses = list(self.current.clauses)
+        if clauses[0] == 'T':
+            clauses[0] = 'T{:.3f}'.format(self.game_clock)
+        self.sent_time = time.perf_counter()
+        return ' '.join(clauses) + '\n'
+
+    def write(self, text):
+        '''
+        Records the response to the current message.
+        '''
+        seconds = time.perf_counter() - self.sent_time
+        self.game_clock -= seconds
+        self.decisions.append(Decision(self.current.round_num, self.current.street, self.current.logged,
+                                       text.strip(), seconds))
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def replay(lines, name, path, profile=None):
+    '''
+    Plays the named player's messages from the log lines to the Python pokerbot at path.
+    Returns its decisions. A given cProfile.Profile records the replay.
+    '''
+    path = os.path.abspath(path)
+    config = engine.default_config()
+    with open(os.path.join(path, 'commands.json'), 'r') as json_file:
+        protocol = json.load(json_file).get('protocol', [])
+    socketfile = ScriptedSocket(queries(lines, name, engine.PIPELINE_ACKS and 'pipeline' in protocol),
+                                config.starting_game_clock)
+    output = engine.OutputCapture(name + '.replay.txt')
+    cwd = os.getcwd()
+    try:
+        with redirect_stdout(output):
+            player_module, runner_module = engine.load_bot(path, engine.config_env(config),
+                                                           ('player', 'skeleton.runner'))
+            os.chdir(path)  # as if launched by the engine from its own directory
+            runner = runner_module.Runner(player_module.Player(), socketfile)
+            if profile is not None:
+                profile.enable()
+            try:
+                runner.run()
+            finally:
+                if profile is not None:
+                    profile.disable()
+    finally:
+        os.chdir(cwd)
+        output.close()
+    return socketfile.decisions
+
+
+def parse_args():
+    '''
+    Parses the game log, the bot to replay it to, and the reports to write.
+    '''
+    parser = argparse.ArgumentParser(prog='python3 replay.py')
+    parser.add_argument('log', help='A full gamelog.txt or a gamelog.bin')
+    parser.add_argument('bot', help="Python bot directory to replay the player's messages to")
+    parser.add_argument('--player', type=str, default=None, help='Logged player whose messages to replay, defaults to the first')
+    parser.add_argument('--csv', type=str, default=None, help='Write every decision, logged action and time to this file')
+    parser.add_argument('--profile', type=str, default=None, help='Profile the replay and write the stats to this file')
+    parser.add_argument('--slowest', type=int, default=10, help='Number of slowest decisions to list, defaults to 10')
+    return parser.parse_args()
+
+
+def main():
+    '''
+    Replays a game log from the command line and summarizes the bot's decisions and their times.
+    '''
+    args = parse_args()
+    lines = read_lines(args.log)
+    if not any(' dealt [' in line for line in lines):
+        raise SystemExit(args.log + ' has no hole cards - replay needs a full game log')
+    name = args.player if args.player is not None else lines[0].split(' - ', 1)[1].split(' vs ')[0]
+    profile = cProfile.Profile() if args.profile is not None else None
+    decisions = replay(lines, name, args.bot, profile)
+    actions = [decision for decision in decisions if decision.logged is not None]
+    if args.csv is not None:
+        with open(args.csv, 'w', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(['round', 'street', 'logged', 'response', 'ms'])
+            for decision in actions:
+                writer.writerow([decision.round_num, decision.street, decision.logged, decision.response,
+                                 round(1000. * decision.seconds, 4)])
+    if not actions:
+        print('No decisions to replay for', name)
+        return
+    samples = sorted(decision.seconds for decision in actions)
+    agreeing = sum(1 for decision in actions if decision.response == decision.logged)
+    print('{} decisions of {} replayed, {} ({:.1%}) as logged'.format(len(actions), name, agreeing,
+                                                                     agreeing / len(actions)))
+    print('ms per decision: mean {:.3f}, p50 {:.3f}, p90 {:.3f}, p99 {:.3f}, max {:.3f}'.format(
+        1000. * sum(samples) / len(samples), 1000. * percentile(samples, 0.5), 1000. * percentile(samples, 0.9),
+        1000. * percentile(samples, 0.99), 1000. * samples[-1]))
+    print('Slowest decisions:')
+    for decision in sorted(actions, key=lambda decision: -decision.seconds)[:args.slowest]:
+        print('  round {}, street {}: {} (logged {}) in {:.3f} ms'.format(
+            decision.round_num, decision.street, decision.response, decision.logged, 1000. * decision.seconds))
+    if profile is not None:
+        profile.dump_stats(args.profile)
+        pstats.Stats(profile).sort_stats('cumulative').print_stats(20)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+'''
+Head-to-head comparison of two bots that stops as soon as the result is clear.
+
+Matches between A and B run in parallel on consecutive seeds, and every round's
+bankroll delta of A feeds a sequential probability ratio test of H0, A is no
+better than B, against H1, A is better by --margin bb/100. The test uses the
+normal approximation with the variance estimated from the rounds so far, and
+stops once its log-likelihood ratio leaves the bounds set by --alpha and --beta.
+Results are taken in seed order, so the matches that happen to finish first
+never bias the decision. Once the test decides, every worker is killed along
+with the pokerbots it started, so no compute is spent on matches still running.
+With --duplicate each seed is also played with the
+seats exchanged, and a round's sample is the mean of A's deltas in both
+seatings, which cancels most of the card luck.
+
+Usage: python sprt.py BOT_A BOT_B [--margin BB100] [--alpha A] [--beta B] [--duplicate] [--workers N]
+'''
+from collections import deque
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import signal
+import traceback
+
+from bundles import resolve_bot
+from config import BIG_BLIND, NUM_ROUNDS, PIN_CPUS
+from pinning import worker_error
+from tournament import MatchSpec, bot_name, play_match
+
+# rounds observed before the test may stop, so the variance estimate has settled
+MIN_SAMPLES = 100
+ACCEPT_H1, ACCEPT_H0 = 'H1', 'H0'
+
+
+class SPRT():
+    '''
+    Sequential probability ratio test of a zero mean against a given mean, for samples of unknown variance.
+    '''
+
+    def __init__(self, effect, alpha=0.05, beta=0.05):
+        self.effect = effect
+        self.lower = math.log(beta / (1 - alpha))
+        self.upper = math.log((1 - beta) / alpha)
+        self.count = 0
+        self.total = 0.
+        self.total_squares = 0.
+
+    def add(self, sample):
+        '''
+        Records one sample.
+        '''
+        self.count += 1
+        self.total += sample
+        self.total_squares += sample * sample
+
+    def mean(self):
+        '''
+        Returns the mean of the samples so far.
+        '''
+        return self.total / self.count if self.count else 0.
+
+    def llr(self):
+        '''
+        Returns the log-likelihood ratio of H1 against H0 for the samples so far.
+        '''
+        if self.count < 2:
+            return 0.
+        mean = self.mean()
+        variance = (self.total_squares - self.count * mean * mean) / (self.count - 1)
+        if variance <= 0:
+            return 0.
+        return self.count * self.effect * (mean - self.effect / 2) / variance
+
+    def decision(self):
+        '''
+        Returns ACCEPT_H1 or ACCEPT_H0 once the test is decided, None until then.
+        '''
+        if self.count < MIN_SAMPLES:
+            return None
+        llr = self.llr()
+        if llr >= self.upper:
+            return ACCEPT_H1
+        if llr <= self.lower:
+            return ACCEPT_H0
+        return None
+
+
+def seed_specs(bot_a, bot_b, seed, rounds, out_dir, duplicate):
+    '''
+    Lists the matches played on one seed: A against B, and with duplicate the mirror.
+    '''
+    variant = (('num_rounds', rounds),)
+    seatings = [(bot_a, bot_b), (bot_b, bot_a)] if duplicate else [(bot_a, bot_b)]
+    return [MatchSpec(seed, first, second, seed, os.path.join(out_dir, 's{}_{}_vs_{}'.format(
+        seed, bot_name(first), bot_name(second))), variant) for first, second in seatings]
+
+
+def round_samples(results, bot_a):
+    '''
+    Returns A's per-round samples from one seed's results, averaging the seatings of a duplicate seed.
+    '''
+    per_seating = [result.deltas[bot_a] for result in results]
+    return [sum(deltas) / len(deltas) for deltas in zip(*per_seating)]
+
+
+def play_matches(tasks, results, headless, warm):
+    '''
+    Plays the matches it is sent until it gets None. Runs in a worker process.
+    The worker leads its own process group, which the pokerbots it starts join, so killing the group stops them all.
+    '''
+    os.setpgrp()
+    for spec in iter(tasks.get, None):
+        try:
+            results.put((spec, play_match(spec, headless, warm), None))
+        except Exception:
+            results.put((spec, None, traceback.format_exc()))
+
+
+def stop_worker(process):
+    '''
+    Kills a worker process and every pokerbot it started.
+    '''
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        process.kill()  # the worker has not made its process group yet, so it has started no pokerbots
+    process.join()
+
+
+def run_sprt(test, bot_a, bot_b, args):
+    '''
+    Plays seeds in parallel and feeds their rounds to the test, in seed order, until it decides or the budget runs out.
+    Returns the decision and the number of rounds played to reach it.
+    '''
+    out_dir = os.path.abspath(args.out)
+    per_seed = 2 if args.duplicate else 1
+    max_seeds = max(1, args.max_rounds // (args.rounds * per_seed))
+    in_flight = deque()
+    finished = {}
+    next_seed = args.first_seed
+    rounds_played = 0
+    decision = None
+    tasks, results = multiprocessing.Queue(), multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=play_matches, args=(tasks, results, args.headless, args.warm),
+                                       daemon=True) for _ in range(args.workers)]
+    for worker in workers:
+        worker.start()
+    try:
+        while decision is None:
+            while (len(in_flight) * per_seed < max(args.workers, per_seed) and
+                   next_seed < args.first_seed + max_seeds):
+                specs = seed_specs(bot_a, bot_b, next_seed, args.rounds, out_dir, args.duplicate)
+                for spec in specs:
+                    tasks.put(spec)
+                in_flight.append((next_seed, specs))
+                next_seed += 1
+            if not in_flight:
+                break
+            seed, specs = in_flight.popleft()
+            while any(spec not in finished for spec in specs):
+                spec, result, error = results.get()
+                if error is not None:
+                    raise RuntimeError('match {} failed:\n{}'.format(spec.log_dir, error))
+                finished[spec] = result
+            for sample in round_samples([finished.pop(spec) for spec in specs], bot_a):
+                test.add(sample)
+                rounds_played += per_seed
+                decision = test.decision()
+                if decision is not None:
+                    break
+            print('Seed {} done: {} rounds, {:+.1f} bb/100, LLR {:.2f} in [{:.2f}, {:.2f}]'.format(
+                seed, rounds_played, 100. * test.mean() / BIG_BLIND, test.llr(), test.lower, test.upper))
+    finally:
+        # the matches still running once the test decides are wasted compute, so they are killed, not awaited
+        for worker in workers:
+            stop_worker(worker)
+    return decision, rounds_played
+
+
+def parse_args():
+    '''
+    Parses the two bots and the test's parameters.
+    '''
+    parser = argparse.ArgumentParser(prog='python3 sprt.py')
+    parser.add_argument('bot_a', help='Bot directory or .zip bundle under test')
+    parser.add_argument('bot_b', help='Bot directory or .zip bundle to compare against')
+    parser.add_argument('--margin', type=float, default=5., help='The bb/100 by which A is better under H1, defaults to 5')
+    parser.add_argument('--alpha', type=float, default=0.05, help='Chance of accepting H1 when A is no better, defaults to 0.05')
+    parser.add_argument('--beta', type=float, default=0.05, help='Chance of accepting H0 when A is better by the margin, defaults to 0.05')
+    parser.add_argument('--rounds', type=int, default=NUM_ROUNDS, help='Rounds per match, defaults to NUM_ROUNDS')
+    parser.add_argument('--max-rounds', type=int, default=100 * NUM_ROUNDS, help='Give up undecided after this many rounds')
+    parser.add_argument('--first-seed', type=int, default=0, help='First seed, defaults to 0')
+    parser.add_argument('--duplicate', action='store_true', help='Replay every deal schedule with the seats exchanged')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes, defaults to all cores')
+    parser.add_argument('--out', type=str, default='sprt', help='Directory for per-match logs and the result')
+    parser.add_argument('--headless', action='store_true', help='Run Python bots in-process instead of over sockets')
+    parser.add_argument('--warm', action='store_true', help='Keep bots running between the matches of each worker')
+    args = parser.parse_args()
+    error = worker_error(PIN_CPUS, args.workers)
+    if error is not None:
+        parser.error(error)
+    return args
+
+
+def main():
+    '''
+    Runs the comparison from the command line and writes sprt.json.
+    '''
+    args = parse_args()
+    bot_a, bot_b = os.path.abspath(args.bot_a), os.path.abspath(args.bot_b)
+    for bot in (bot_a, bot_b):
+        resolve_bot(bot)  # extract any .zip bundles once, before the workers need them
+    test = SPRT(args.margin * BIG_BLIND / 100., args.alpha, args.beta)
+    decision, rounds_played = run_sprt(test, bot_a, bot_b, args)
+    name_a, name_b = bot_name(bot_a), bot_name(bot_b)
+    print()
+    if decision == ACCEPT_H1:
+        print('{} is better than {} by {} bb/100 (H1 accepted)'.format(name_a, name_b, args.margin))
+    elif decision == ACCEPT_H0:
+        print('{} is not better than {} by {} bb/100 (H0 accepted)'.format(name_a, name_b, args.margin))
+    else:
+        print('Undecided after the round budget')
+    print('{} rounds played, {:+.2f} bb/100 observed'.format(rounds_played, 100. * test.mean() / BIG_BLIND))
+    os.makedirs(args.out, exist_ok=True)
+    with open(os.path.join(args.out, 'sprt.json'), 'w') as result_file:
+        json.dump({'bot_a': name_a, 'bot_b': name_b, 'margin_bb100': args.margin, 'alpha': args.alpha,
+                   'beta': args.beta, 'decision': decision, 'rounds': rounds_played,
+                   'mean_bb100': 100. * test.mean() / BIG_BLIND, 'llr': test.llr(),
+                   'bounds': [test.lower, test.upper]}, result_file, indent=4)
+
+
+if __name__ == '__main__':
+    main()
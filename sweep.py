@@ -0,0 +1,202 @@
+'''
+Sweeps game-variant parameters over a field of bots.
+
+Every cell of the grid is one variant of the game, with some of FLOP_PERCENT,
+TURN_PERCENT, STARTING_STACK, the blinds or NUM_ROUNDS replaced. The tournament
+schedule is played in every cell, on the same seeds, so cells differ only by
+their parameters. The engine passes each cell's parameters to the bots as
+POKERBOTS_* environment variables, but only skeletons that read them (the
+current python_skeleton and cpp_skeleton) pick them up; a bot that hard-codes a
+swept parameter would play a different game than the engine, so the sweep
+refuses to start when a bot's sources name a swept parameter without its
+POKERBOTS_ variable.
+
+The results table holds one row per cell and pairing: the first bot's mean
+bankroll per seed, with both seatings of a seed added together under
+--duplicate, and its 95% confidence interval across seeds.
+
+Usage: python sweep.py BOT [BOT ...] --grid NAME=V1,V2 [NAME=V1,V2 ...] [--seeds N] [--duplicate] [--workers N]
+'''
+import argparse
+import csv
+import itertools
+import math
+import os
+
+from bundles import resolve_bot
+import config
+from pinning import worker_error
+from tournament import bot_name, run_tournament, schedule
+
+# the game parameters a sweep may vary, and their types
+PARAMETERS = {
+    'num_rounds': int,
+    'starting_stack': int,
+    'big_blind': int,
+    'small_blind': int,
+    'flop_percent': float,
+    'turn_percent': float,
+}
+# source files searched for a bot's game parameters
+SOURCE_EXTENSIONS = ('.py', '.h', '.hpp', '.cpp', '.java')
+# two-sided 95% quantiles of Student's t distribution, by degrees of freedom
+T_95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+        2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+        2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+
+
+def parse_grid(entries):
+    '''
+    Parses NAME=V1,V2 entries into a list of (name, values) axes.
+    '''
+    axes = []
+    for entry in entries:
+        name, _, values = entry.partition('=')
+        name = name.strip().lower()
+        if name not in PARAMETERS or not values:
+            raise argparse.ArgumentTypeError('bad grid entry {!r}, expected NAME=V1,V2 with NAME one of {}'.format(
+                entry, ', '.join(PARAMETERS)))
+        axes.append((name, [PARAMETERS[name](value) for value in values.split(',')]))
+    return axes
+
+
+def cells(axes):
+    '''
+    Lists every combination of the axes' values, as tuples of (name, value) pairs.
+    '''
+    names = [name for name, _ in axes]
+    return [tuple(zip(names, values)) for values in itertools.product(*(values for _, values in axes))]
+
+
+def swept_parameters(axes):
+    '''
+    Lists the parameters some cell of the grid moves away from config.py's value.
+    '''
+    return [name for name, values in axes if any(value != getattr(config, name.upper()) for value in values)]
+
+
+def hard_coded(bot_dir, names):
+    '''
+    Lists the parameters a bot's sources name without reading their POKERBOTS_ environment variable.
+    '''
+    sources = []
+    for root, _, files in os.walk(bot_dir):
+        for filename in files:
+            if filename.endswith(SOURCE_EXTENSIONS):
+                with open(os.path.join(root, filename), errors='replace') as source:
+                    sources.append(source.read())
+    sources = '\n'.join(sources)
+    return [name for name in names if name.upper() in sources and 'POKERBOTS_' + name.upper() not in sources]
+
+
+def cell_label(cell):
+    '''
+    Returns a directory name for a cell.
+    '''
+    return '_'.join('{}-{}'.format(name, value) for name, value in cell) or 'default'
+
+
+def confidence_interval(samples):
+    '''
+    Returns the mean of the samples and the half-width of its 95% confidence interval.
+    '''
+    mean = sum(samples) / len(samples)
+    if len(samples) < 2:
+        return mean, float('nan')
+    variance = sum((sample - mean) ** 2 for sample in samples) / (len(samples) - 1)
+    quantile = T_95[len(samples) - 2] if len(samples) - 1 <= len(T_95) else 1.96
+    return mean, quantile * math.sqrt(variance / len(samples))
+
+
+def tabulate(results):
+    '''
+    Turns match results into table rows, one per cell and pairing, in the order the matches were scheduled.
+    '''
+    totals = {}
+    for result in results:
+        first, second = sorted([result.spec.bot_a, result.spec.bot_b], key=bot_name)
+        per_seed = totals.setdefault((result.spec.variant, first, second), {})
+        per_seed[result.spec.seed] = per_seed.get(result.spec.seed, 0) + result.bankrolls[first]
+    rows = []
+    for (cell, first, second), per_seed in totals.items():
+        mean, half_width = confidence_interval(list(per_seed.values()))
+        row = dict(cell)
+        row.update({
+            'bot': bot_name(first),
+            'opponent': bot_name(second),
+            'seeds': len(per_seed),
+            'mean': round(mean, 2),
+            'ci_low': round(mean - half_width, 2),
+            'ci_high': round(mean + half_width, 2),
+        })
+        rows.append(row)
+    return rows
+
+
+def parse_args():
+    '''
+    Parses the bots, the parameter grid and the tournament layout of every cell.
+    '''
+    parser = argparse.ArgumentParser(prog='python3 sweep.py')
+    parser.add_argument('bots', nargs='+', help='Bot directories or .zip bundles')
+    parser.add_argument('--grid', nargs='+', required=True, metavar='NAME=V1,V2',
+                        help='Parameter values to sweep, NAME one of ' + ', '.join(PARAMETERS))
+    parser.add_argument('--challenger', type=str, default=None, help='Only play this bot against the rest of the field')
+    parser.add_argument('--seeds', type=int, default=4, help='Number of seeded matches per pairing and cell, defaults to 4')
+    parser.add_argument('--first-seed', type=int, default=0, help='First seed, defaults to 0')
+    parser.add_argument('--duplicate', action='store_true', help='Replay every deal schedule with the seats exchanged')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes, defaults to all cores')
+    parser.add_argument('--out', type=str, default='sweep', help='Directory for per-match logs and results.csv')
+    parser.add_argument('--headless', action='store_true', help='Run Python bots in-process instead of over sockets')
+    parser.add_argument('--warm', action='store_true', help='Keep bots running between the matches of each worker')
+    args = parser.parse_args()
+    error = worker_error(config.PIN_CPUS, args.workers)
+    if error is not None:
+        parser.error(error)
+    try:
+        args.grid = parse_grid(args.grid)
+    except (argparse.ArgumentTypeError, ValueError) as error:
+        parser.error(str(error))
+    return args
+
+
+def main():
+    '''
+    Runs a sweep from the command line and writes results.csv.
+    '''
+    args = parse_args()
+    bots = [os.path.abspath(bot) for bot in args.bots]
+    challenger = os.path.abspath(args.challenger) if args.challenger is not None else None
+    if challenger is not None and challenger not in bots:
+        bots.append(challenger)
+    swept = swept_parameters(args.grid)
+    for bot in bots:
+        bot_dir = resolve_bot(bot)  # extract any .zip bundles once, before the workers need them
+        ignored = hard_coded(bot_dir, swept)
+        if ignored:
+            raise SystemExit('{} hard-codes {}, which its skeleton does not read from POKERBOTS_* variables; '
+                             'port the env-reading states.py or constants.h from python_skeleton or cpp_skeleton'.format(
+                                 bot_name(bot), ', '.join(name.upper() for name in ignored)))
+    out_dir = os.path.abspath(args.out)
+    seeds = range(args.first_seed, args.first_seed + args.seeds)
+    specs = []
+    for cell in cells(args.grid):
+        for spec in schedule(bots, seeds, os.path.join(out_dir, cell_label(cell)), challenger, args.duplicate):
+            specs.append(spec._replace(index=len(specs), variant=cell))
+    print('Scheduling', len(specs), 'matches on', args.workers, 'workers')
+    results = run_tournament(specs, args.workers, args.headless, args.warm)
+    rows = tabulate(results)
+    fields = [name for name, _ in args.grid] + ['bot', 'opponent', 'seeds', 'mean', 'ci_low', 'ci_high']
+    with open(os.path.join(out_dir, 'results.csv'), 'w', newline='') as results_file:
+        writer = csv.DictWriter(results_file, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+    print()
+    for row in rows:
+        print('{}: {} vs {}: {:.1f} [{:.1f}, {:.1f}] over {} seeds'.format(
+            ', '.join('{}={}'.format(name, row[name]) for name, _ in args.grid),
+            row['bot'], row['opponent'], row['mean'], row['ci_low'], row['ci_high'], row['seeds']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+'''
+Runs many engine matches in parallel and merges their bankrolls into one summary.
+
+Every match runs in its own worker process and its own log directory, so the
+gamelog and the A.txt/B.txt player logs of concurrent matches never collide.
+Each Player binds an ephemeral port (port 0), so concurrent matches never
+compete for the same socket either. The seed of a match fixes its deal schedule;
+with --duplicate every schedule is also replayed with the seats exchanged.
+A bot is a directory or a .zip bundle, which is extracted once into BOT_CACHE_DIR.
+
+Usage: python tournament.py BOT [BOT ...] [--challenger BOT] [--seeds N] [--duplicate] [--workers N]
+'''
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stdout
+import argparse
+import itertools
+import json
+import os
+
+from bundles import resolve_bot
+from config import PIN_CPUS
+from pinning import worker_error
+
+# a variant holds (MatchConfig field, value) pairs that replace config.py's game parameters for the match
+MatchSpec = namedtuple('MatchSpec', ['index', 'bot_a', 'bot_b', 'seed', 'log_dir', 'variant'], defaults=[()])
+# deltas holds each bot's per-round bankroll changes, in round order
+MatchResult = namedtuple('MatchResult', ['spec', 'bankrolls', 'deltas'])
+
+
+def bot_name(path):
+    '''
+    Returns the short name of a bot, taken from its directory.
+    '''
+    return os.path.basename(os.path.normpath(path))
+
+
+def schedule(bots, seeds, out_dir, challenger=None, duplicate=False):
+    '''
+    Lists one match for every pair of bots and every seed.
+    With a challenger, only its pairings against the rest of the field are played.
+    With duplicate, each match is followed by its mirror on the same deals.
+    '''
+    if challenger is not None:
+        pairs = [(challenger, bot) for bot in bots if bot != challenger]
+    else:
+        pairs = list(itertools.combinations(bots, 2))
+    specs = []
+    for (bot_a, bot_b), seed in itertools.product(pairs, seeds):
+        for seating in ([(bot_a, bot_b), (bot_b, bot_a)] if duplicate else [(bot_a, bot_b)]):
+            index = len(specs)
+            log_dir = os.path.join(out_dir, '{:04d}_{}_vs_{}_s{}'.format(
+                index, bot_name(seating[0]), bot_name(seating[1]), seed))
+            specs.append(MatchSpec(index, seating[0], seating[1], seed, log_dir))
+    return specs
+
+
+def play_match(spec, headless=False, warm=False):
+    '''
+    Plays one match inside its own log directory. Runs in a worker process.
+    With warm, the worker keeps pokerbots that support it running for its next matches.
+    '''
+    import engine
+    os.makedirs(spec.log_dir, exist_ok=True)
+    os.chdir(spec.log_dir)
+    engine.HEADLESS = headless
+    engine.WARM_POOL = warm
+    config = engine.default_config(player_1_path=spec.bot_a, player_2_path=spec.bot_b, deal_seed=spec.seed,
+                                   **dict(spec.variant))
+    with open('engine.txt', 'w') as engine_output, redirect_stdout(engine_output):
+        players = engine.Game(config=config).run()
+    names = {config.player_1_name: spec.bot_a, config.player_2_name: spec.bot_b}
+    return MatchResult(spec, {names[player.name]: player.bankroll for player in players},
+                       {names[player.name]: player.deltas for player in players})
+
+
+def summarize(results):
+    '''
+    Merges per-match bankrolls into per-bot and per-pairing totals.
+    Both seatings of a pairing count towards the same total, so duplicate
+    matches on a schedule add up to one card-luck-free result.
+    Totals are keyed by the bots' paths, so bots sharing a directory name stay apart; entries hold the short names.
+    '''
+    bots = {}
+    pairings = {}
+    for result in results:
+        for bot, bankroll in result.bankrolls.items():
+            entry = bots.setdefault(bot, {'name': bot_name(bot), 'matches': 0, 'bankroll': 0})
+            entry['matches'] += 1
+            entry['bankroll'] += bankroll
+        first, second = sorted([result.spec.bot_a, result.spec.bot_b])
+        entry = pairings.setdefault('{} vs {}'.format(first, second),
+                                    {'name': '{} vs {}'.format(bot_name(first), bot_name(second)),
+                                     'matches': 0, 'bankroll': 0})
+        entry['matches'] += 1
+        entry['bankroll'] += result.bankrolls[first]
+    for entry in itertools.chain(bots.values(), pairings.values()):
+        entry['mean'] = entry['bankroll'] / entry['matches']
+    return {'bots': bots, 'pairings': pairings}
+
+
+def run_tournament(specs, workers=None, headless=False, warm=False):
+    '''
+    Fans the scheduled matches out over a process pool and collects their results.
+    '''
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(play_match, spec, headless, warm) for spec in specs]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            print('Match {} done: {}'.format(result.spec.index, ', '.join(
+                '{} ({})'.format(bot_name(bot), bankroll) for bot, bankroll in result.bankrolls.items())))
+    results.sort(key=lambda result: result.spec.index)
+    return results
+
+
+def parse_args():
+    '''
+    Parses the bots to play and the tournament layout.
+    '''
+    parser = argparse.ArgumentParser(prog='python3 tournament.py')
+    parser.add_argument('bots', nargs='+', help='Bot directories or .zip bundles')
+    parser.add_argument('--challenger', type=str, default=None, help='Only play this bot against the rest of the field')
+    parser.add_argument('--seeds', type=int, default=1, help='Number of seeded matches per pairing, defaults to 1')
+    parser.add_argument('--first-seed', type=int, default=0, help='First seed, defaults to 0')
+    parser.add_argument('--duplicate', action='store_true', help='Replay every deal schedule with the seats exchanged')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes, defaults to all cores')
+    parser.add_argument('--out', type=str, default='tournament', help='Directory for per-match logs and the summary')
+    parser.add_argument('--headless', action='store_true', help='Run Python bots in-process instead of over sockets')
+    parser.add_argument('--warm', action='store_true', help='Keep bots running between the matches of each worker')
+    args = parser.parse_args()
+    error = worker_error(PIN_CPUS, args.workers)
+    if error is not None:
+        parser.error(error)
+    return args
+
+
+def main():
+    '''
+    Runs a tournament from the command line and writes summary.json.
+    '''
+    args = parse_args()
+    bots = [os.path.abspath(bot) for bot in args.bots]
+    challenger = os.path.abspath(args.challenger) if args.challenger is not None else None
+    if challenger is not None and challenger not in bots:
+        bots.append(challenger)
+    for bot in bots:
+        resolve_bot(bot)  # extract any .zip bundles once, before the workers need them
+    out_dir = os.path.abspath(args.out)
+    seeds = range(args.first_seed, args.first_seed + args.seeds)
+    specs = schedule(bots, seeds, out_dir, challenger, args.duplicate)
+    print('Scheduling', len(specs), 'matches on', args.workers, 'workers')
+    results = run_tournament(specs, args.workers, args.headless, args.warm)
+    summary = summarize(results)
+    summary['matches'] = [{'log_dir': result.spec.log_dir, 'seed': result.spec.seed,
+                           'bankrolls': result.bankrolls} for result in results]
+    with open(os.path.join(out_dir, 'summary.json'), 'w') as summary_file:
+        json.dump(summary, summary_file, indent=4)
+    print()
+    for entry in sorted(summary['bots'].values(), key=lambda entry: -entry['bankroll']):
+        print('{}: {} over {} matches ({:.1f} per match)'.format(entry['name'], entry['bankroll'], entry['matches'],
+                                                                 entry['mean']))
+
+
+if __name__ == '__main__':
+    main()